@@ -0,0 +1,104 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Startup time of every entry point, each measured in a fresh interpreter:
+#   import   python -c "import <module>"   (module-level import cost)
+#   help     python code/<script> --help   (argparse scripts only)
+# plus the first UMAP + HDBSCAN call, which shows whether the numba cache is warm.
+
+OUTPUT_PATH = "data/benchmarks/startup_times.csv"
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+ENTRY_POINTS = [
+    "garbage_filter",
+    "phase3_selection",
+    "phase4_split_by_rank",
+    "phase5_semantic_pipeline",
+    "phase5_voice_assignment_multi",
+    "phase5_voice_fingerprints",
+    "phase6_ai_positioning_index",
+    "phase7_visual_garbage_comparison",
+    "phase7_visual_interactive_map",
+    "phase7_visual_umap_map",
+    "phase7_visual_voice_and_index",
+    "llm_validation_sample",
+    "corpus_profiler",
+    "inspect_metadata",
+    "embedding_store",
+    "snapshot_store",
+    "warmup",
+]
+
+JIT_SNIPPET = (
+    "import numpy as np; from clustering import reduce_and_cluster; "
+    "reduce_and_cluster(np.random.default_rng(0).normal(size=(300, 384)).astype(np.float32))"
+)
+
+
+def _time_command(cmd, repeats: int) -> list:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [CODE_DIR, os.environ.get("PYTHONPATH")])))
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0:
+            # e.g. an optional dependency that is not installed here
+            last = result.stderr.strip().splitlines()[-1:] or ["unknown error"]
+            print(f"[WARN] {' '.join(cmd[1:])} failed: {last[0]}")
+            return []
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def _row(entry_point, check, times) -> dict:
+    return {
+        "entry_point": entry_point,
+        "check": check,
+        "median_s": round(float(np.median(times)), 3) if times else np.nan,
+        "min_s": round(min(times), 3) if times else np.nan,
+    }
+
+
+def _uses_argparse(module: str) -> bool:
+    with open(os.path.join(CODE_DIR, f"{module}.py"), encoding="utf-8") as f:
+        return "argparse" in f.read()
+
+
+def benchmark(entry_points=ENTRY_POINTS, repeats: int = 3, jit: bool = True) -> pd.DataFrame:
+    rows = []
+    for module in entry_points:
+        checks = [("import", [sys.executable, "-c", f"import {module}"])]
+        if _uses_argparse(module):
+            checks.append(("help", [sys.executable, os.path.join(CODE_DIR, f"{module}.py"), "--help"]))
+        for kind, cmd in checks:
+            rows.append(_row(module, kind, _time_command(cmd, repeats)))
+            print(f"[INFO] {module:<34} {kind:<10} {rows[-1]['median_s']:.2f}s")
+
+    if jit:
+        rows.append(_row("clustering.reduce_and_cluster", "first_call",
+                         _time_command([sys.executable, "-c", JIT_SNIPPET], repeats)))
+        print(f"[INFO] {'clustering.reduce_and_cluster':<34} {'first_call':<10} {rows[-1]['median_s']:.2f}s")
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the startup time of each pipeline entry point.")
+    parser.add_argument("--repeats", type=int, default=3, help="Fresh interpreters per check (default: 3)")
+    parser.add_argument("--no_jit", action="store_true", help="Skip the first UMAP + HDBSCAN call")
+    parser.add_argument("--output", default=OUTPUT_PATH, help=f"Output CSV (default: {OUTPUT_PATH})")
+    args = parser.parse_args()
+
+    report = benchmark(repeats=args.repeats, jit=not args.no_jit)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    report.to_csv(args.output, index=False)
+    print(f"✅ Startup benchmark saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.optimize import linear_sum_assignment
+
+from data_loader import load_table
+from phase5_voice_assignment_multi import (CLUSTER_TOPIC_LABELS, CLUSTER_VOICES, SCOPE_COLUMN, cluster_scope,
+                                           detect_prefix, label_key)
+from snapshot_store import content_hash
+
+# Carry topic / voice labels from a labelled clustering run to a new one.
+#
+# 1) contingency of shared documents (by content hash) between old and new
+#    cluster ids -> Jaccard overlap; optionally centroid cosine from the embedding stores
+# 2) Hungarian matching (linear_sum_assignment) on the combined score
+# 3) every new cluster gets a status:
+#      matched  labels carried over from its match
+#      split    unmatched, but most of its documents come from one old cluster
+#               (a piece of it; provisional labels from that cluster)
+#      merged   matched, but also absorbed most of another old cluster
+#      new      nothing to carry over
+#    split / merged / new are listed for human review in the JSON cluster map,
+#    which phase5_voice_assignment_multi.py --cluster_map reads instead of the dicts.
+
+MIN_JACCARD = 0.3     # accept a match with this much membership overlap ...
+MIN_COSINE = 0.95     # ... or, without shared documents, this centroid similarity
+SPLIT_SHARE = 0.5     # share of a cluster's documents that marks a split / merge
+CENTROID_WEIGHT = 0.5
+REVIEW_STATUSES = ["split", "merged", "new"]
+
+
+def cluster_labels_of(df: pd.DataFrame, prefix: str) -> pd.DataFrame:
+    """topic_label / voice per cluster_id: from the file's own columns, else the phase 5 dicts."""
+    cluster_ids = df["cluster_id"].fillna(-1).astype(int)
+    ids = sorted(pd.unique(cluster_ids))
+    out = pd.DataFrame(index=pd.Index(ids, name="cluster_id"), columns=["topic_label", "voice"], dtype=object)
+    for col, maps in [("topic_label", CLUSTER_TOPIC_LABELS), ("voice", CLUSTER_VOICES)]:
+        if col in df.columns:
+            first = df[col].astype(object).groupby(cluster_ids).first()
+            out[col] = first.reindex(out.index).astype(object)
+        else:
+            mapping = maps.get(label_key(prefix, cluster_scope(df)), {})
+            out[col] = [mapping.get(i) for i in ids]
+    return out.where(out.notna(), None)
+
+
+def centroids(labels: np.ndarray, embeddings: np.ndarray, n_clusters: int) -> np.ndarray:
+    """Unit-length mean embedding per cluster (rows with label < 0 are ignored)."""
+    rows = np.flatnonzero(labels >= 0)
+    member = sp.csr_matrix((np.ones(len(rows)), (labels[rows], rows)), shape=(n_clusters, len(labels)))
+    sums = np.asarray(member @ embeddings)
+    return sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+
+
+def _first_positions(hashes) -> pd.Series:
+    pos = pd.Series(np.arange(len(hashes)), index=pd.Index(hashes))
+    return pos[~pos.index.duplicated()]
+
+
+def reconcile(prev_ids, new_ids, prev_hashes, new_hashes, prev_emb=None, new_emb=None,
+              min_jaccard: float = MIN_JACCARD, min_cosine: float = MIN_COSINE) -> pd.DataFrame:
+    """
+    One row per new cluster (noise excluded): previous_id (or -1), status,
+    jaccard, cosine, parent (largest old source cluster) and its share.
+    """
+    prev_ids, new_ids = np.asarray(prev_ids, dtype=np.int64), np.asarray(new_ids, dtype=np.int64)
+    p_clusters = np.unique(prev_ids[prev_ids >= 0])
+    n_clusters = np.unique(new_ids[new_ids >= 0])
+    p_code = np.searchsorted(p_clusters, prev_ids)
+    n_code = np.searchsorted(n_clusters, new_ids)
+    P, N = len(p_clusters), len(n_clusters)
+
+    # documents present in both runs -> contingency table in one bincount
+    prev_pos = _first_positions(prev_hashes)
+    new_pos = _first_positions(new_hashes)
+    common = prev_pos.index.intersection(new_pos.index)
+    pi, ni = prev_pos.loc[common].to_numpy(), new_pos.loc[common].to_numpy()
+    keep = (prev_ids[pi] >= 0) & (new_ids[ni] >= 0)
+    flat = p_code[pi[keep]] * N + n_code[ni[keep]]
+    cont = np.bincount(flat, minlength=P * N).reshape(P, N).astype(np.float64)
+
+    size_p = np.bincount(p_code[prev_ids >= 0], minlength=P).astype(np.float64)
+    size_n = np.bincount(n_code[new_ids >= 0], minlength=N).astype(np.float64)
+    jaccard = cont / np.maximum(size_p[:, None] + size_n[None, :] - cont, 1)
+
+    if prev_emb is not None and new_emb is not None:
+        if len(prev_emb) != len(prev_ids) or len(new_emb) != len(new_ids):
+            raise ValueError(f"Embeddings ({len(prev_emb)}, {len(new_emb)}) do not match the runs' rows "
+                             f"({len(prev_ids)}, {len(new_ids)}); pass the stores written with these CSVs.")
+        cp = centroids(np.where(prev_ids >= 0, p_code, -1), np.asarray(prev_emb, dtype=np.float32), P)
+        cn = centroids(np.where(new_ids >= 0, n_code, -1), np.asarray(new_emb, dtype=np.float32), N)
+        cosine = cp @ cn.T
+        score = (1 - CENTROID_WEIGHT) * jaccard + CENTROID_WEIGHT * cosine
+    else:
+        cosine = np.full((P, N), np.nan)
+        score = jaccard
+
+    rows, cols = linear_sum_assignment(-score) if P and N else (np.array([], int), np.array([], int))
+    accepted = (jaccard[rows, cols] >= min_jaccard) | (np.nan_to_num(cosine[rows, cols]) >= min_cosine)
+    match_of_new = np.full(N, -1)
+    match_of_new[cols[accepted]] = rows[accepted]
+
+    # where each new cluster's shared documents came from
+    parent = cont.argmax(axis=0) if P else np.zeros(N, dtype=int)
+    parent_share = cont[parent, np.arange(N)] / np.maximum(size_n, 1) if P else np.zeros(N)
+    # share of each old cluster that ended up in each new cluster
+    absorbed = cont / np.maximum(size_p[:, None], 1)
+
+    records = []
+    for j in range(N):
+        i = match_of_new[j]
+        if i >= 0:
+            others = absorbed[:, j].copy()
+            others[i] = 0
+            status = "merged" if (others >= SPLIT_SHARE).any() else "matched"
+            prev_id = int(p_clusters[i])
+        elif P and parent_share[j] >= SPLIT_SHARE:
+            status, prev_id = "split", int(p_clusters[parent[j]])
+        else:
+            status, prev_id = "new", -1
+        k = i if i >= 0 else (parent[j] if P else None)
+        records.append({
+            "cluster_id": int(n_clusters[j]),
+            "previous_id": prev_id,
+            "status": status,
+            "size": int(size_n[j]),
+            "jaccard": round(float(jaccard[k, j]), 4) if k is not None else 0.0,
+            "cosine": round(float(cosine[k, j]), 4) if k is not None and not np.isnan(cosine[k, j]) else None,
+            "parent_id": int(p_clusters[parent[j]]) if P else -1,
+            "parent_share": round(float(parent_share[j]), 4) if P else 0.0,
+        })
+    return pd.DataFrame(records, columns=["cluster_id", "previous_id", "status", "size", "jaccard", "cosine",
+                                          "parent_id", "parent_share"])
+
+
+def build_cluster_map(result: pd.DataFrame, prev_labels: pd.DataFrame, prefix: str, previous: str,
+                      new: str) -> dict:
+    """JSON-able cluster map: labels carried forward + the clusters that need review."""
+    clusters = {}
+    for row in result.itertuples(index=False):
+        carried = row.previous_id if row.previous_id >= 0 and row.previous_id in prev_labels.index else None
+        clusters[str(row.cluster_id)] = {
+            "previous_id": int(row.previous_id),
+            "status": row.status,
+            "topic_label": prev_labels.loc[carried, "topic_label"] if carried is not None else None,
+            "voice": prev_labels.loc[carried, "voice"] if carried is not None else None,
+            "size": int(row.size),
+            "jaccard": float(row.jaccard),
+            "cosine": None if pd.isna(row.cosine) else float(row.cosine),
+        }
+    # noise keeps its label
+    if -1 in prev_labels.index:
+        clusters["-1"] = {"previous_id": -1, "status": "matched",
+                          "topic_label": prev_labels.loc[-1, "topic_label"], "voice": prev_labels.loc[-1, "voice"]}
+    return {
+        "prefix": prefix,
+        "previous": previous,
+        "new": new,
+        "clusters": clusters,
+        "review": sorted((int(k) for k, v in clusters.items() if v["status"] in REVIEW_STATUSES)),
+    }
+
+
+def load_cluster_map(path: str) -> dict:
+    """cluster_id (int) -> {"topic_label", "voice", "status", ...} from a reconciliation JSON."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return {int(k): v for k, v in data["clusters"].items()}
+
+
+def cluster_map_labels(clusters: dict) -> tuple:
+    """(topic_map, voice_map) of a loaded cluster map: cluster_id -> label, for the labelled clusters only."""
+    topic_map = {cid: c["topic_label"] for cid, c in clusters.items() if c.get("topic_label")}
+    voice_map = {cid: c["voice"] for cid, c in clusters.items() if c.get("voice")}
+    return topic_map, voice_map
+
+
+def _embeddings(path):
+    if not path:
+        return None
+    from embedding_store import EmbeddingStore
+
+    return EmbeddingStore.load(path).decode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Match the clusters of a new phase 5 run to a labelled previous run.")
+    parser.add_argument("--previous", required=True,
+                        help="Labelled previous run: *_with_voice.csv (or *_semantic.csv, labels from the dicts)")
+    parser.add_argument("--new", required=True, help="New *_semantic.csv")
+    parser.add_argument("--previous_embeddings", default=None, help="Embedding store of the previous run (optional)")
+    parser.add_argument("--new_embeddings", default=None, help="Embedding store of the new run (optional)")
+    parser.add_argument("--prefix", default=None, help="Dataset prefix (default: from --new)")
+    parser.add_argument("--min_jaccard", type=float, default=MIN_JACCARD, help=f"Default: {MIN_JACCARD}")
+    parser.add_argument("--min_cosine", type=float, default=MIN_COSINE, help=f"Default: {MIN_COSINE}")
+    parser.add_argument("--output", default=None, help="Cluster map JSON (default: next to --new, <prefix>_cluster_map.json)")
+    args = parser.parse_args()
+
+    prefix = args.prefix or detect_prefix(args.new)
+    columns = ["Title", "content_text", "cluster_id", "topic_label", "voice", SCOPE_COLUMN]
+    prev = load_table(args.previous, columns=columns)
+    new = load_table(args.new, columns=columns)
+    print(f"[INFO] Previous: {len(prev)} rows from {args.previous}; new: {len(new)} rows from {args.new}")
+
+    result = reconcile(prev["cluster_id"].fillna(-1), new["cluster_id"].fillna(-1),
+                       content_hash(prev).to_numpy(), content_hash(new).to_numpy(),
+                       _embeddings(args.previous_embeddings), _embeddings(args.new_embeddings),
+                       args.min_jaccard, args.min_cosine)
+    cluster_map = build_cluster_map(result, cluster_labels_of(prev, prefix), prefix, args.previous, args.new)
+
+    output = args.output or os.path.join(os.path.dirname(args.new), f"{prefix}_cluster_map.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(cluster_map, f, indent=2, ensure_ascii=False)
+
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(result.to_string(index=False))
+    print(f"\n[INFO] {(result['status'] == 'matched').sum()} matched, "
+          + ", ".join(f"{(result['status'] == s).sum()} {s}" for s in REVIEW_STATUSES))
+    if cluster_map["review"]:
+        print(f"[WARN] Review clusters {cluster_map['review']} in {output} (new or changed since the previous run).")
+    print(f"✅ Saved cluster map to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+from runtime_cache import configure_caches
+
+# UMAP + HDBSCAN as used by phase5_semantic_pipeline.py, plus a multi-seed
+# consensus mode that measures how stable each document's cluster is.
+# umap / hdbscan (and their numba kernels) are imported on first use only.
+
+UMAP_SEED = 42
+CONSENSUS_THRESHOLD = 0.5  # co-clustered in at least half of the runs
+
+# two-stage (scalable) mode
+MICRO_CLUSTERS = 2000          # upper bound; small inputs get n // 5
+MICRO_BATCH_SIZE = 4096
+MICRO_EPOCHS = 2               # passes of partial_fit over the blocks
+MIN_CENTROIDS = 5              # smallest HDBSCAN cluster / neighbourhood, in centroids
+SCALABLE_MIN_ROWS = 5000       # below this the exact path is cheap and agrees better
+
+
+def reduce_projection(embeddings, seed=UMAP_SEED, n_neighbors=15):
+    """UMAP to 2D (cosine). Returns (emb_2d, reducer)."""
+    configure_caches()
+    import umap.umap_ as umap
+
+    reducer = umap.UMAP(
+        n_components=2,
+        n_neighbors=n_neighbors,
+        min_dist=0.1,
+        metric="cosine",
+        random_state=seed,
+    )
+    return reducer.fit_transform(embeddings), reducer
+
+
+def reduce_and_cluster(embeddings, seed=UMAP_SEED, n_neighbors=15, min_cluster_size=10, min_samples=5,
+                       return_models=False):
+    """
+    UMAP to 2D (cosine), then HDBSCAN on the projection. Returns (emb_2d, labels),
+    or (emb_2d, labels, reducer, clusterer) with return_models=True; the
+    clusterer then keeps the prediction data needed to place new points.
+    """
+    emb_2d, reducer = reduce_projection(embeddings, seed, n_neighbors)
+    labels, clusterer = cluster_projection(emb_2d, min_cluster_size, min_samples, prediction_data=return_models)
+    if return_models:
+        return emb_2d, labels, reducer, clusterer
+    return emb_2d, labels
+
+
+def cluster_projection(emb_2d, min_cluster_size=10, min_samples=5, prediction_data=False):
+    """HDBSCAN on a 2D projection. Returns (labels, clusterer)."""
+    import hdbscan
+
+    clusterer = hdbscan.HDBSCAN(
+        min_cluster_size=min_cluster_size,
+        min_samples=min_samples,
+        metric="euclidean",
+        cluster_selection_method="eom",
+        prediction_data=prediction_data,
+    )
+    return clusterer.fit_predict(emb_2d), clusterer
+
+
+# ---------- two-stage (scalable) ----------
+def _blocks(source, block_size=MICRO_BATCH_SIZE):
+    """(start, float32 block) over an EmbeddingStore or an in-memory array."""
+    if hasattr(source, "iter_blocks"):
+        yield from source.iter_blocks(block_size)
+        return
+    x = np.asarray(source)
+    for start in range(0, len(x), block_size):
+        yield start, np.asarray(x[start:start + block_size], dtype=np.float32)
+
+
+def _unit(block):
+    return block / np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-12)
+
+
+def scalable_clustering(source, n_micro=None, seed=UMAP_SEED, n_neighbors=15, min_cluster_size=10,
+                        min_samples=5, epochs=MICRO_EPOCHS, batch_size=MICRO_BATCH_SIZE):
+    """
+    Two-stage clustering for large corpora.
+
+    1) Over-cluster the (unit-normalized) embeddings with MiniBatchKMeans,
+       streaming partial_fit over blocks of the embedding store.
+    2) UMAP + HDBSCAN on the micro-cluster centroids, with the cluster size
+       limits converted from documents to centroids; clusters whose centroids
+       hold fewer than min_cluster_size documents (by weight) become noise.
+    3) Every document takes its micro-cluster's label; its 2D position is the
+       UMAP transform of the document itself.
+
+    Returns (emb_2d, labels, micro_labels) with the same cluster_id semantics
+    as reduce_and_cluster (-1 = noise).
+    """
+    configure_caches()
+    import hdbscan
+    import umap.umap_ as umap
+    from sklearn.cluster import MiniBatchKMeans
+
+    n = source.n if hasattr(source, "iter_blocks") else len(source)
+    n_micro = n_micro or min(MICRO_CLUSTERS, max(n // 5, 2))
+    if n_micro >= n:
+        raise ValueError(f"n_micro={n_micro} must be smaller than the number of documents ({n}).")
+
+    # 1) streaming mini-batch k-means, initialised (k-means++) on rows drawn from the whole input:
+    #    stores are in file order, so the first block alone may cover one institution or topic
+    kmeans = MiniBatchKMeans(n_clusters=n_micro, batch_size=batch_size, random_state=seed, n_init=1)
+    block_size = max(batch_size, n_micro)
+    init_rows = np.sort(np.random.default_rng(seed).choice(n, size=min(n, max(3 * n_micro, batch_size)),
+                                                           replace=False))
+    init = source.decode(init_rows) if hasattr(source, "iter_blocks") else np.asarray(source)[init_rows]
+    kmeans.partial_fit(_unit(np.asarray(init, dtype=np.float32)))
+    for _ in range(epochs):
+        for _, block in _blocks(source, block_size):
+            kmeans.partial_fit(_unit(block))
+    micro = np.concatenate([kmeans.predict(_unit(block)) for _, block in _blocks(source, block_size)])
+    weights = np.bincount(micro, minlength=n_micro)
+    used = np.flatnonzero(weights)
+    centroids = kmeans.cluster_centers_[used]
+
+    # 2) UMAP + HDBSCAN on the centroids; sizes are counted in documents (the centroid weights)
+    reducer = umap.UMAP(n_components=2, n_neighbors=min(n_neighbors, len(used) - 1), min_dist=0.1,
+                        metric="cosine", random_state=seed)
+    cent_2d = reducer.fit_transform(centroids)
+
+    mean_weight = n / len(used)
+    clusterer = hdbscan.HDBSCAN(
+        min_cluster_size=max(MIN_CENTROIDS, int(round(min_cluster_size / mean_weight))),
+        min_samples=max(MIN_CENTROIDS, int(round(min_samples / mean_weight))),
+        metric="euclidean",
+        cluster_selection_method="eom",
+    )
+    cent_labels = np.full(n_micro, -1)
+    cent_labels[used] = clusterer.fit_predict(cent_2d)
+
+    # clusters that hold fewer than min_cluster_size documents become noise; renumber the rest
+    sizes = np.bincount(cent_labels[used][cent_labels[used] >= 0],
+                        weights=weights[used][cent_labels[used] >= 0])
+    keep = np.flatnonzero(sizes >= min_cluster_size)
+    relabel = np.full(len(sizes) + 1, -1)
+    relabel[keep] = np.arange(len(keep))
+    cent_labels = relabel[cent_labels]  # -1 indexes the trailing -1
+
+    # 3) map back to the documents
+    labels = cent_labels[micro]
+    emb_2d = np.concatenate([reducer.transform(block) for _, block in _blocks(source, block_size)])
+    return emb_2d, labels, micro
+
+
+def clustering_agreement(labels_a, labels_b) -> dict:
+    """Adjusted Rand index / NMI between two labelings, plus how often both agree on noise."""
+    from sklearn.metrics import adjusted_rand_score, normalized_mutual_info_score
+
+    a, b = np.asarray(labels_a), np.asarray(labels_b)
+    return {
+        "ari": round(float(adjusted_rand_score(a, b)), 4),
+        "nmi": round(float(normalized_mutual_info_score(a, b)), 4),
+        "noise_agreement": round(float(np.mean((a < 0) == (b < 0))), 4),
+        "clusters_a": int(len(set(a[a >= 0]))),
+        "clusters_b": int(len(set(b[b >= 0]))),
+    }
+
+
+# ---------- parallel seeds ----------
+_WORKER_EMBEDDINGS = None
+
+
+def _init_worker(path):
+    global _WORKER_EMBEDDINGS
+    _WORKER_EMBEDDINGS = np.load(path, mmap_mode="r")
+
+
+def _run_seed(job):
+    seed, params = job
+    emb_2d, labels = reduce_and_cluster(np.asarray(_WORKER_EMBEDDINGS), seed=seed, **params)
+    return seed, emb_2d, labels
+
+
+def run_seeds(embeddings, seeds, workers=1, **params) -> dict:
+    """
+    Run reduce_and_cluster once per seed across a process pool.
+
+    Each seeded UMAP is single-threaded, so the runs themselves are spread
+    over the workers. Embeddings reach the workers through a memory-mapped
+    .npy file instead of being pickled per task.
+    Returns {seed: (emb_2d, labels)}.
+    """
+    if workers <= 1:
+        return {s: reduce_and_cluster(embeddings, seed=s, **params) for s in seeds}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "embeddings.npy")
+        np.save(path, np.asarray(embeddings, dtype=np.float32))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(path,)) as pool:
+            results = pool.map(_run_seed, [(s, params) for s in seeds])
+            return {seed: (emb_2d, labels) for seed, emb_2d, labels in results}
+
+
+# ---------- consensus ----------
+#
+# Documents with the same label in every run (the same label signature) have the
+# same co-association with everything else, so the consensus works on the distinct
+# signatures ("atoms") and never materializes the n x n document matrix: a cluster
+# of s documents adds (atoms in it)^2 entries instead of s^2.
+
+def co_association(label_runs) -> tuple:
+    """
+    (atoms, co): atoms[i] is the signature index of document i; co is the sparse
+    m x m share of runs in which two signatures share a (non-noise) cluster. The
+    diagonal is the share of runs in which a signature is clustered at all.
+    """
+    runs = np.stack([np.asarray(labels) for labels in label_runs], axis=1)
+    signatures, atoms = np.unique(runs, axis=0, return_inverse=True)
+    atoms = atoms.ravel()
+    m = len(signatures)
+    total = sp.csr_matrix((m, m), dtype=np.float32)
+    for labels in signatures.T:
+        rows = np.flatnonzero(labels >= 0)
+        member = sp.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, labels[rows])),
+            shape=(m, labels.max() + 1 if len(rows) else 0),
+        )
+        total = total + member @ member.T
+    return atoms, (total / runs.shape[1]).tocsr()
+
+
+def consensus_labels(atoms, co_assoc: sp.csr_matrix, min_cluster_size=10, threshold=CONSENSUS_THRESHOLD):
+    """
+    Consensus cluster id per document. Signatures clustered in fewer than
+    `threshold` of the runs are noise; the rest are linked where they share a
+    cluster in at least `threshold` of the runs, and each connected component is
+    cut by average linkage at the same threshold, so distinct clusters joined
+    only through a few bridging documents are not chained together. Clusters
+    smaller than min_cluster_size documents become noise (-1); the rest are
+    numbered by descending size.
+    """
+    from scipy.cluster.hierarchy import fcluster, linkage
+    from scipy.spatial.distance import squareform
+
+    atoms = np.asarray(atoms)
+    m = co_assoc.shape[0]
+    clustered = co_assoc.diagonal() >= threshold
+    graph = co_assoc.multiply(co_assoc >= threshold).tocsr()
+    _, comp = connected_components(graph, directed=False)
+
+    group = np.full(m, -1)
+    n_groups = 0
+    for c in np.unique(comp[clustered]):
+        members = np.flatnonzero((comp == c) & clustered)
+        if len(members) == 1:
+            group[members] = n_groups
+            n_groups += 1
+            continue
+        dist = 1.0 - co_assoc[members][:, members].toarray()
+        np.fill_diagonal(dist, 0.0)
+        cut = fcluster(linkage(squareform(dist, checks=False), method="average"),
+                       t=1.0 - threshold + 1e-9, criterion="distance")
+        group[members] = n_groups + cut - 1
+        n_groups += cut.max()
+
+    doc_group = group[atoms]
+    sizes = np.bincount(doc_group[doc_group >= 0], minlength=n_groups)
+    keep = np.flatnonzero(sizes >= min_cluster_size)
+    order = keep[np.argsort(-sizes[keep], kind="stable")]
+    relabel = np.full(n_groups + 1, -1)
+    relabel[order] = np.arange(len(order))
+    return relabel[doc_group]  # doc_group -1 maps to the trailing -1
+
+
+def stability_scores(atoms, co_assoc: sp.csr_matrix, labels, label_runs) -> np.ndarray:
+    """
+    Per-document stability in [0, 1].
+
+    Clustered documents: mean co-association with the other members of their
+    consensus cluster. Noise documents: share of runs in which they were noise.
+    """
+    atoms = np.asarray(atoms)
+    labels = np.asarray(labels)
+    n = len(labels)
+    scores = np.zeros(n)
+
+    rows = np.flatnonzero(labels >= 0)
+    if len(rows):
+        # documents per (signature, consensus cluster)
+        member = sp.csr_matrix((np.ones(len(rows)), (atoms[rows], labels[rows])),
+                               shape=(co_assoc.shape[0], labels.max() + 1))
+        with_cluster = np.asarray((co_assoc @ member)[atoms[rows], labels[rows]]).ravel()
+        self_assoc = co_assoc.diagonal()[atoms[rows]]
+        sizes = np.bincount(labels[rows])[labels[rows]]
+        scores[rows] = np.where(sizes > 1, (with_cluster - self_assoc) / np.maximum(sizes - 1, 1), 0.0)
+
+    noise = labels < 0
+    scores[noise] = np.mean([np.asarray(run)[noise] < 0 for run in label_runs], axis=0)
+    return scores
+
+
+def consensus_clustering(embeddings, n_seeds=10, workers=1, base_seed=UMAP_SEED,
+                         n_neighbors=15, min_cluster_size=10, min_samples=5):
+    """
+    Multi-seed consensus: returns (emb_2d of the base seed, consensus labels,
+    per-document stability, {seed: labels}).
+    """
+    seeds = [base_seed + i for i in range(n_seeds)]
+    runs = run_seeds(embeddings, seeds, workers=workers, n_neighbors=n_neighbors,
+                     min_cluster_size=min_cluster_size, min_samples=min_samples)
+    label_runs = [runs[s][1] for s in seeds]
+
+    atoms, co_assoc = co_association(label_runs)
+    labels = consensus_labels(atoms, co_assoc, min_cluster_size=min_cluster_size)
+    stability = stability_scores(atoms, co_assoc, labels, label_runs)
+    return runs[base_seed][0], labels, stability, {s: runs[s][1] for s in seeds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the two-stage clustering with the exact UMAP + HDBSCAN path.")
+    parser.add_argument("--store", required=True,
+                        help="Embedding store directory (e.g. data/semantic/hype_top50_embeddings)")
+    parser.add_argument("--n_micro", type=int, default=None, help="Micro-clusters (default: min(2000, n // 5))")
+    parser.add_argument("--n_neighbors", type=int, default=15)
+    parser.add_argument("--min_cluster_size", type=int, default=10)
+    parser.add_argument("--min_samples", type=int, default=5)
+    args = parser.parse_args()
+
+    from embedding_store import EmbeddingStore
+
+    store = EmbeddingStore.load(args.store)
+    params = dict(n_neighbors=args.n_neighbors, min_cluster_size=args.min_cluster_size,
+                  min_samples=args.min_samples)
+    print(f"[INFO] {store.n} x {store.dim} embeddings ({store.encoding}) from {args.store}")
+
+    start = time.perf_counter()
+    _, exact = reduce_and_cluster(store.decode(), **params)
+    t_exact = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, fast, micro = scalable_clustering(store, n_micro=args.n_micro, **params)
+    t_fast = time.perf_counter() - start
+
+    print(f"[INFO] exact:     {t_exact:.1f}s")
+    print(f"[INFO] two-stage: {t_fast:.1f}s ({micro.max() + 1} micro-clusters)")
+    for key, value in clustering_agreement(exact, fast).items():
+        print(f"  {key:<16} {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import argparse
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from sketches import HyperLogLog, QuantileSketch, TopKSketch, hash_values
+
+DATA_PATH = "data/ganis_phase2_clean.csv"
+CHUNK_SIZE = 5000
+
+# Heavy-hitter columns (keywords_list is split into its ';'-separated terms)
+TOPK_COLUMNS = ["Labels", "the_country", "the_domain", "keywords_list"]
+TERM_COLUMNS = {"keywords_list": ";"}
+
+# Columns we report quantiles for
+QUANTILE_COLUMNS = ["raw_word_count", "char_entropy", "lang_score"]
+QUANTILES = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+
+
+class ColumnProfile:
+    """Bounded-memory statistics for one column, mergeable across shards."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rows = 0
+        self.nulls = 0
+        self.distinct = HyperLogLog()
+        self.numeric = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.quantiles = QuantileSketch() if name in QUANTILE_COLUMNS else None
+        self.topk = TopKSketch() if name in TOPK_COLUMNS else None
+
+    def update(self, col: pd.Series):
+        self.rows += len(col)
+        values = col.dropna()
+        self.nulls += len(col) - len(values)
+        if values.empty:
+            return
+
+        self.distinct.add_hashes(hash_values(values.values))
+
+        if values.dtype.kind in "iufb" or self.quantiles is not None:
+            nums = pd.to_numeric(values, errors="coerce").dropna().astype(np.float64)
+        else:
+            nums = pd.Series(dtype=np.float64)
+        if not nums.empty:
+            self.numeric += len(nums)
+            self.total += float(nums.sum())
+            self.total_sq += float((nums ** 2).sum())
+            if self.quantiles is not None:
+                self.quantiles.add(nums.values)
+
+        if self.topk is not None:
+            sep = TERM_COLUMNS.get(self.name)
+            if sep:
+                terms = values.astype(str).str.split(sep).explode().str.strip()
+                self.topk.add(terms[terms != ""])
+            else:
+                self.topk.add(values)
+
+    def merge(self, other: "ColumnProfile"):
+        self.rows += other.rows
+        self.nulls += other.nulls
+        self.distinct.merge(other.distinct)
+        self.numeric += other.numeric
+        self.total += other.total
+        self.total_sq += other.total_sq
+        if self.quantiles is not None and other.quantiles is not None:
+            self.quantiles.merge(other.quantiles)
+        if self.topk is not None and other.topk is not None:
+            self.topk.merge(other.topk)
+        return self
+
+    def summary(self) -> dict:
+        row = {
+            "column": self.name,
+            "rows": self.rows,
+            "nulls": self.nulls,
+            "distinct_approx": self.distinct.count(),
+        }
+        if self.numeric:
+            mean = self.total / self.numeric
+            var = max(self.total_sq / self.numeric - mean ** 2, 0.0)
+            row["mean"] = round(mean, 4)
+            row["std"] = round(float(np.sqrt(var)), 4)
+        if self.quantiles is not None and self.quantiles.n:
+            row["min"] = self.quantiles.min
+            for q, v in zip(QUANTILES, self.quantiles.quantiles(QUANTILES)):
+                row[f"p{int(q * 100):02d}"] = round(v, 4)
+            row["max"] = self.quantiles.max
+        return row
+
+
+class CorpusProfile:
+    """Per-column profiles for a corpus (or a shard of one)."""
+
+    def __init__(self):
+        self.columns = {}
+        self.chunks = 0
+
+    def update(self, chunk: pd.DataFrame):
+        self.chunks += 1
+        for name in chunk.columns:
+            if name not in self.columns:
+                self.columns[name] = ColumnProfile(name)
+            self.columns[name].update(chunk[name])
+
+    def merge(self, other: "CorpusProfile"):
+        self.chunks += other.chunks
+        for name, prof in other.columns.items():
+            if name in self.columns:
+                self.columns[name].merge(prof)
+            else:
+                self.columns[name] = prof
+        return self
+
+    def summary(self) -> pd.DataFrame:
+        return pd.DataFrame([p.summary() for p in self.columns.values()]).set_index("column")
+
+    def top(self, column: str, k: int = 20) -> pd.DataFrame:
+        prof = self.columns.get(column)
+        if prof is None or prof.topk is None:
+            raise KeyError(f"No top-k sketch for column '{column}'.")
+        return prof.topk.top(k)
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(path: str) -> "CorpusProfile":
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+def profile_csv(path: str, chunksize: int = CHUNK_SIZE) -> CorpusProfile:
+    """Stream a CSV in chunks and build its profile."""
+    profile = CorpusProfile()
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        profile.update(chunk)
+    return profile
+
+
+def print_report(profile: CorpusProfile, k: int):
+    with pd.option_context("display.max_rows", None, "display.max_columns", None,
+                           "display.width", 250):
+        print("\n=== Column profile ===")
+        print(profile.summary())
+
+        for col in TOPK_COLUMNS:
+            if col in profile.columns:
+                label = f"{col} terms" if col in TERM_COLUMNS else col
+                print(f"\n=== Top {k} {label} ===")
+                print(profile.top(col, k).to_string(index=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming corpus profiler (bounded memory).")
+    parser.add_argument("--input", nargs="*", default=[],
+                        help=f"CSV shard(s) to profile (default: {DATA_PATH} if nothing else is given)")
+    parser.add_argument("--merge", nargs="*", default=[],
+                        help="Saved profile files to merge into the report")
+    parser.add_argument("--save", default=None,
+                        help="Write the (merged) profile to this file for later merging")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE,
+                        help=f"Rows read per chunk (default: {CHUNK_SIZE})")
+    parser.add_argument("--top", type=int, default=20,
+                        help="Number of heavy hitters to print per column (default: 20)")
+    args = parser.parse_args()
+
+    inputs = args.input or ([] if args.merge else [DATA_PATH])
+    profile = CorpusProfile()
+
+    for path in inputs:
+        print(f"[INFO] Profiling {path} in chunks of {args.chunksize} rows ...")
+        profile.merge(profile_csv(path, args.chunksize))
+
+    for path in args.merge:
+        print(f"[INFO] Merging saved profile {path} ...")
+        profile.merge(CorpusProfile.load(path))
+
+    if args.save:
+        profile.save(args.save)
+        print(f"[INFO] Saved profile to {args.save}")
+
+    print_report(profile, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Shared, memory-lean loader for every phase.
+#
+# The column schema is derived from data/column_descriptions_country_tables_v2.csv:
+#   category  low-cardinality labels (countries, institutions, domains, Labels, ...)
+#   text      long free text -> Arrow-backed strings when pyarrow is installed
+#   score     THE score columns -> float32
+#   integer   counts / ids / ranks -> smallest integer type that fits
+# Columns added by the pipeline itself (entropy, voice, cluster ids, ...) are
+# listed in DERIVED_SCHEMA.
+
+# anchored to the repo root, so the dtypes do not depend on the working directory
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "data", "column_descriptions_country_tables_v2.csv")
+
+DERIVED_SCHEMA = {
+    "char_entropy": "float",
+    "ttr": "float",
+    "word_count": "integer",
+    "is_boilerplate": "bool",
+    "the_rank_num": "integer",
+    "text_for_embedding": "text",
+    "word_count_calc": "integer",
+    "umap_x": "float",
+    "umap_y": "float",
+    "cluster_id": "integer",
+    "cluster_stability": "float",
+    "cluster_scope": "category",
+    "topic_label": "category",
+    "voice": "category",
+}
+
+# description keywords -> kind (first match wins, checked in this order)
+_DESCRIPTION_RULES = [
+    ("float", ["confidence score"]),
+    ("text", ["url of the webpage", "page title", "textual content", "most frequent",
+              "semicolon-separated", "name of the parsed source file"]),
+    ("score", ["score for the institution", "'industry income' score"]),
+    ("integer", ["number of", "id of", "numeric id", "rank", "total number"]),
+    ("category", ["name", "country", "language code", "indicator", "domain", "label",
+                  "ratio"]),
+]
+
+
+def has_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+TEXT_DTYPE = "string[pyarrow]" if has_pyarrow() else object
+
+
+def _kind_from_description(description: str) -> str:
+    desc = str(description).lower()
+    for kind, keywords in _DESCRIPTION_RULES:
+        if any(k in desc for k in keywords):
+            return kind
+    return "text"
+
+
+def load_schema(path: str = SCHEMA_PATH) -> dict:
+    """column name -> kind (category / text / score / integer / float / bool)."""
+    schema = {}
+    if os.path.exists(path):
+        desc = pd.read_csv(path)
+        schema = {row.column_name: _kind_from_description(row.description) for row in desc.itertuples()}
+    else:
+        print(f"[WARN] Column descriptions not found at {path}; only the derived columns get lean dtypes.")
+    schema.update(DERIVED_SCHEMA)
+    return schema
+
+
+SCHEMA = load_schema()
+
+
+def read_dtypes(columns=None) -> dict:
+    """dtype mapping for pd.read_csv (numerics are downcast after reading, NaNs permitting)."""
+    dtypes = {}
+    for col, kind in SCHEMA.items():
+        if columns is not None and col not in columns:
+            continue
+        if kind == "category":
+            dtypes[col] = "category"
+        elif kind == "text":
+            dtypes[col] = TEXT_DTYPE
+    return dtypes
+
+
+def optimize_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert a frame (e.g. read from Excel) to the lean schema in place and return it."""
+    for col in df.columns:
+        kind = SCHEMA.get(col)
+        series = df[col]
+        if kind == "category" and series.dtype != "category":
+            df[col] = series.astype("category")
+        elif kind == "text" and series.dtype == object:
+            df[col] = series.astype(TEXT_DTYPE)
+        elif kind == "score":
+            df[col] = pd.to_numeric(series, errors="coerce").astype(np.float32)
+        elif kind == "integer":
+            num = pd.to_numeric(series, errors="coerce")
+            if num.isna().sum() > series.isna().sum():
+                # non-numeric values (e.g. "201–250" ranks): keep them, as categories
+                df[col] = series.astype("category")
+            elif num.notna().all() and (num % 1 == 0).all():
+                df[col] = pd.to_numeric(num.astype(np.int64), downcast="integer")
+            else:
+                df[col] = pd.to_numeric(num, downcast="float")
+    return df
+
+
+def _read_kwargs(path, columns):
+    usecols = None if columns is None else (lambda c: c in set(columns))
+    return {"usecols": usecols, "dtype": read_dtypes(columns)}
+
+
+def load_table(path, columns=None) -> pd.DataFrame:
+    """
+    Load a CSV / Excel / Parquet table with the lean schema.
+    `columns` projects the read to a subset of columns (missing ones are ignored).
+    """
+    path = str(path)
+    if path.endswith((".xlsx", ".xls")):
+        df = pd.read_excel(path, usecols=(lambda c: c in set(columns)) if columns else None)
+    elif path.endswith(".parquet"):
+        if columns is not None:
+            import pyarrow.parquet as pq
+
+            names = pq.ParquetFile(path).schema_arrow.names
+            columns = [c for c in names if c in set(columns)]
+        df = pd.read_parquet(path, columns=columns)
+    else:
+        df = pd.read_csv(path, **_read_kwargs(path, columns))
+    return optimize_dtypes(df)
+
+
+def iter_table(path, chunksize: int, columns=None):
+    """Stream a CSV (or Parquet, by row batches) in chunks, each with the lean schema."""
+    if str(path).endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(str(path))
+        names = None if columns is None else [c for c in pf.schema_arrow.names if c in set(columns)]
+        for batch in pf.iter_batches(batch_size=chunksize, columns=names):
+            yield optimize_dtypes(batch.to_pandas())
+        return
+    for chunk in pd.read_csv(str(path), chunksize=chunksize, **_read_kwargs(path, columns)):
+        yield optimize_dtypes(chunk)
+
+
+def memory_mb(df: pd.DataFrame) -> float:
+    """Deep in-memory size of a frame in MB."""
+    return df.memory_usage(deep=True).sum() / 1e6
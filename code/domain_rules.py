@@ -0,0 +1,205 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_loader import load_table
+
+# Domain blacklist rules, matched with a trie over reversed host labels
+# (uk -> ac -> example -> news). Rule syntax, one per line in domain_blacklist.txt:
+#
+#   example.ac.uk         example.ac.uk and every subdomain (news.example.ac.uk, ...)
+#   *.example.ac.uk       subdomains of example.ac.uk only
+#   news.*.ac.uk          '*' stands for exactly one label
+#   =example.ac.uk        example.ac.uk only, no subdomains
+#
+# Rules are checked against the host of `url` and against `the_domain`; each
+# distinct value is matched once and the result is mapped back onto the column.
+
+BLACKLIST_PATH = "data/domain_blacklist.txt"
+REPORT_PATH = "data/domain_garbage_report.csv"
+MATCH_COLUMNS = ["url", "the_domain"]
+
+# blacklist candidates: hosts with enough pages where most pages are garbage
+MIN_DOCS = 5
+MIN_GARBAGE_RATE = 0.8
+
+_SUBTREE = "$subtree"   # rule matches this node and everything below it
+_EXACT = "$exact"       # rule matches this node only
+
+HOST_RE = r"^(?:[a-zA-Z][a-zA-Z0-9+.-]*://)?(?:[^@/?#]*@)?([^/:?#]+)"
+
+
+def normalize_host(value) -> str:
+    host = str(value).strip().lower().rstrip(".")
+    return host[4:] if host.startswith("www.") else host
+
+
+class DomainTrie:
+    """Reversed-label trie of blacklist rules."""
+
+    def __init__(self, rules=()):
+        self.root = {}
+        self.rules = []
+        for rule in rules:
+            self.add(rule)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def add(self, rule: str):
+        rule = rule.strip().lower()
+        exact = rule.startswith("=")
+        labels = normalize_host(rule.lstrip("=")).split(".")
+        if not labels or any(not label for label in labels):
+            raise ValueError(f"Invalid domain rule '{rule}'.")
+        if labels[0] == "*" and not exact:
+            # '*.example.ac.uk': at least one more label below example.ac.uk
+            labels = labels[1:]
+            flag = "$below"
+        else:
+            flag = _EXACT if exact else _SUBTREE
+        node = self.root
+        for label in reversed(labels):
+            node = node.setdefault(label, {})
+        node[flag] = rule
+        self.rules.append(rule)
+
+    def match(self, host) -> str:
+        """The first rule that matches host, or None."""
+        if host is None or (isinstance(host, float) and np.isnan(host)):
+            return None
+        labels = normalize_host(host).split(".")[::-1]
+        return self._match(self.root, labels, 0)
+
+    def _match(self, node, labels, depth):
+        if _SUBTREE in node:
+            return node[_SUBTREE]
+        if depth == len(labels):
+            return node.get(_EXACT)
+        if "$below" in node:
+            return node["$below"]
+        for key in (labels[depth], "*"):
+            child = node.get(key)
+            if child is not None:
+                found = self._match(child, labels, depth + 1)
+                if found:
+                    return found
+        return None
+
+    def match_column(self, values: pd.Series) -> pd.Series:
+        """Matched rule per row (None if no rule matches), one trie lookup per distinct value."""
+        codes, uniques = pd.factorize(values.astype(object).where(values.notna(), None))
+        matched = np.array([self.match(u) for u in uniques] + [None], dtype=object)
+        return pd.Series(matched[codes], index=values.index)  # code -1 (missing) -> None
+
+
+def read_rules(path: str = BLACKLIST_PATH) -> list:
+    """Rules from a blacklist file; empty lines and '#' comments are ignored."""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line.split("#", 1)[0].strip() for line in f]
+    return [line for line in lines if line]
+
+
+def url_hosts(urls: pd.Series) -> pd.Series:
+    """Host part of each URL (lowercase, without 'www.')."""
+    hosts = urls.astype(object).where(urls.notna(), None).astype(str).str.extract(HOST_RE, expand=False)
+    hosts = hosts.str.lower().str.rstrip(".").str.replace(r"^www\.", "", regex=True)
+    return hosts.where(urls.notna(), None)
+
+
+def blacklist_matches(df: pd.DataFrame, trie: DomainTrie, columns=MATCH_COLUMNS) -> pd.Series:
+    """Matched rule per row over the url host and the_domain (None = not blacklisted)."""
+    matched = pd.Series(None, index=df.index, dtype=object)
+    for col in columns:
+        if col not in df.columns:
+            continue
+        values = url_hosts(df[col]) if col == "url" else df[col]
+        matched = matched.where(matched.notna(), trie.match_column(values))
+    return matched
+
+
+def domain_garbage_report(df: pd.DataFrame, by: str = "host", min_words=None, min_entropy=None,
+                          min_ttr=None) -> pd.DataFrame:
+    """
+    Garbage rate per host (or any column), in one groupby pass. A page counts as
+    garbage when it fails any garbage_filter threshold or is flagged as boilerplate.
+    Needs the char_entropy / ttr / word_count / is_boilerplate columns from garbage_filter.py.
+    """
+    from garbage_filter import MIN_CHAR_ENTROPY, MIN_TTR, MIN_WORDS
+
+    min_words = MIN_WORDS if min_words is None else min_words
+    min_entropy = MIN_CHAR_ENTROPY if min_entropy is None else min_entropy
+    min_ttr = MIN_TTR if min_ttr is None else min_ttr
+
+    keys = url_hosts(df["url"]) if by == "host" else df[by].astype(object)
+    flags = pd.DataFrame({
+        "short": (df["word_count"] < min_words).to_numpy(),
+        "low_entropy": (df["char_entropy"] < min_entropy).to_numpy(),
+        "low_ttr": (df["ttr"] < min_ttr).to_numpy(),
+        "boilerplate": df["is_boilerplate"].astype(bool).to_numpy(),
+    }, index=df.index)
+    flags["garbage"] = flags.any(axis=1)
+    flags["char_entropy"] = df["char_entropy"].to_numpy()
+    flags[by] = keys.fillna("<unknown>").to_numpy()
+
+    report = flags.groupby(by, sort=False).agg(
+        docs=("garbage", "size"),
+        garbage_rate=("garbage", "mean"),
+        short_rate=("short", "mean"),
+        low_entropy_rate=("low_entropy", "mean"),
+        low_ttr_rate=("low_ttr", "mean"),
+        boilerplate_rate=("boilerplate", "mean"),
+        mean_char_entropy=("char_entropy", "mean"),
+    )
+    return report.sort_values(["garbage_rate", "docs"], ascending=False).round(4)
+
+
+def propose_candidates(report: pd.DataFrame, min_docs: int = MIN_DOCS, min_rate: float = MIN_GARBAGE_RATE,
+                       trie: DomainTrie = None) -> pd.DataFrame:
+    """Hosts worth blacklisting that no existing rule covers yet."""
+    cand = report[(report["docs"] >= min_docs) & (report["garbage_rate"] >= min_rate)]
+    if trie is not None and len(trie):
+        cand = cand[[trie.match(h) is None for h in cand.index]]
+    return cand
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank hosts by garbage rate and propose blacklist rules.")
+    parser.add_argument("--report", default=REPORT_PATH,
+                        help=f"Garbage report written by garbage_filter.py (default: {REPORT_PATH})")
+    parser.add_argument("--input", default=None,
+                        help="Instead of --report: compute the report from a CSV with url + char_entropy, "
+                             "ttr, word_count, is_boilerplate")
+    parser.add_argument("--by", default="host", help="With --input: group by 'host' (url host) or a column")
+    parser.add_argument("--min_docs", type=int, default=MIN_DOCS, help=f"Default: {MIN_DOCS}")
+    parser.add_argument("--min_rate", type=float, default=MIN_GARBAGE_RATE, help=f"Default: {MIN_GARBAGE_RATE}")
+    parser.add_argument("--blacklist", default=BLACKLIST_PATH, help=f"Existing rules (default: {BLACKLIST_PATH})")
+    parser.add_argument("--output", default=None, help="Optional CSV for the full report")
+    args = parser.parse_args()
+
+    if args.input:
+        df = load_table(args.input, columns=["url", "the_domain", "char_entropy", "ttr", "word_count",
+                                             "is_boilerplate"])
+        report = domain_garbage_report(df, by=args.by)
+    elif os.path.exists(args.report):
+        report = pd.read_csv(args.report, index_col=0)
+    else:
+        print(f"ERROR: {args.report} not found. Run garbage_filter.py first or pass --input.")
+        return
+    if args.output:
+        report.to_csv(args.output)
+        print(f"[INFO] Saved garbage report ({len(report)} groups) to {args.output}")
+
+    cand = propose_candidates(report, args.min_docs, args.min_rate, DomainTrie(read_rules(args.blacklist)))
+    print(f"[INFO] {len(cand)} blacklist candidate(s) (>= {args.min_docs} docs, garbage rate >= {args.min_rate}):")
+    for host, row in cand.iterrows():
+        print(f"{host:<45} # {int(row.docs)} docs, garbage {row.garbage_rate:.0%}, "
+              f"boilerplate {row.boilerplate_rate:.0%}, low entropy {row.low_entropy_rate:.0%}")
+
+
+if __name__ == "__main__":
+    main()
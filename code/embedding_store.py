@@ -0,0 +1,311 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# On-disk embedding store: <dir>/meta.json + one .npy file per array, so the
+# codes can be memory-mapped instead of loaded.
+#
+#   float32  4 bytes / dim   exact reference
+#   float16  2 bytes / dim
+#   int8     1 byte / dim    per-dimension scalar quantization (min / scale)
+#   pq       1 byte / subspace, product quantization with 256 centroids per subspace
+
+ENCODINGS = ["float32", "float16", "int8", "pq"]
+
+PQ_SUBSPACES = 48      # 384-dim MiniLM vectors -> 8 dims per subspace, 48 bytes / vector
+PQ_CENTROIDS = 256
+PQ_TRAIN_ROWS = 20000
+BLOCK_SIZE = 8192      # rows decoded / scored at once
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+class EmbeddingStore:
+    """Embedding matrix in one of ENCODINGS, with distance kernels that work on the codes."""
+
+    def __init__(self, encoding: str, arrays: dict, meta: dict):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown encoding '{encoding}'. Use one of {ENCODINGS}.")
+        self.encoding = encoding
+        self.arrays = arrays
+        self.meta = meta
+        self.codes = arrays["codes"]
+        self.n, self.dim = len(self.codes), int(meta["dim"])
+
+    # ---------- building ----------
+    @classmethod
+    def from_embeddings(cls, embeddings, encoding: str = "int8", pq_subspaces: int = PQ_SUBSPACES,
+                        seed: int = 42, **meta) -> "EmbeddingStore":
+        x = np.asarray(embeddings, dtype=np.float32)
+        n, dim = x.shape
+        arrays = {}
+
+        if encoding == "float32":
+            arrays["codes"] = x
+        elif encoding == "float16":
+            arrays["codes"] = x.astype(np.float16)
+        elif encoding == "int8":
+            lo, hi = x.min(axis=0), x.max(axis=0)
+            scale = np.maximum(hi - lo, 1e-12) / 255.0
+            arrays["codes"] = (np.round((x - lo) / scale) - 128).astype(np.int8)
+            arrays["scale"] = scale.astype(np.float32)
+            arrays["offset"] = (lo + 128 * scale).astype(np.float32)
+        elif encoding == "pq":
+            if dim % pq_subspaces:
+                raise ValueError(f"dim={dim} is not divisible by pq_subspaces={pq_subspaces}.")
+            arrays["codebooks"], arrays["codes"] = cls._train_pq(x, pq_subspaces, seed)
+        else:
+            raise ValueError(f"Unknown encoding '{encoding}'. Use one of {ENCODINGS}.")
+
+        store = cls(encoding, arrays, dict(meta, dim=dim, n=n, encoding=encoding))
+        # norms of the reconstructed vectors, for cosine scores on the codes
+        store.arrays["norms"] = np.concatenate(
+            [np.linalg.norm(block, axis=1) for _, block in store.iter_blocks()]
+        ).astype(np.float32) if n else np.empty(0, np.float32)
+        return store
+
+    @staticmethod
+    def _train_pq(x: np.ndarray, m: int, seed: int):
+        from sklearn.cluster import KMeans
+
+        n, dim = x.shape
+        sub = dim // m
+        rng = np.random.default_rng(seed)
+        train = x[rng.choice(n, size=min(n, PQ_TRAIN_ROWS), replace=False)]
+        # small inputs: keep several rows per centroid so k-means stays meaningful
+        k = min(PQ_CENTROIDS, max(len(train) // 8, 1))
+
+        codebooks = np.zeros((m, PQ_CENTROIDS, sub), dtype=np.float32)
+        codes = np.zeros((n, m), dtype=np.uint8)
+        for j in range(m):
+            part = slice(j * sub, (j + 1) * sub)
+            km = KMeans(n_clusters=k, n_init=1, random_state=seed).fit(train[:, part])
+            codebooks[j, :k] = km.cluster_centers_
+            for start in range(0, n, BLOCK_SIZE):
+                codes[start:start + BLOCK_SIZE, j] = km.predict(x[start:start + BLOCK_SIZE, part])
+        return codebooks, codes
+
+    # ---------- persistence ----------
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for fname in os.listdir(path):
+            if fname.endswith(".npy"):
+                os.remove(os.path.join(path, fname))  # arrays of a previous store in this directory
+        for name, arr in self.arrays.items():
+            np.save(os.path.join(path, f"{name}.npy"), arr)
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "EmbeddingStore":
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {}
+        for fname in os.listdir(path):
+            if fname.endswith(".npy"):
+                arrays[fname[:-4]] = np.load(os.path.join(path, fname), mmap_mode="r" if mmap else None)
+        return cls(meta["encoding"], arrays, meta)
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(a.nbytes for a in self.arrays.values()))
+
+    # ---------- decoding ----------
+    def _decode_codes(self, codes: np.ndarray) -> np.ndarray:
+        if self.encoding in ("float32", "float16"):
+            return np.asarray(codes, dtype=np.float32)
+        if self.encoding == "int8":
+            return codes.astype(np.float32) * self.arrays["scale"] + self.arrays["offset"]
+        books = self.arrays["codebooks"]
+        m = books.shape[0]
+        return books[np.arange(m), codes.astype(np.int64)].reshape(len(codes), -1)
+
+    def decode(self, rows=None) -> np.ndarray:
+        """float32 reconstruction of all (or the given) rows, e.g. as UMAP input."""
+        if rows is not None:
+            return self._decode_codes(np.asarray(self.codes[np.asarray(rows)]))
+        return np.concatenate([block for _, block in self.iter_blocks()]) if self.n \
+            else np.empty((0, self.dim), np.float32)
+
+    def iter_blocks(self, block_size: int = BLOCK_SIZE):
+        """Yield (start, float32 block) without decoding the whole matrix at once."""
+        for start in range(0, self.n, block_size):
+            yield start, self._decode_codes(np.asarray(self.codes[start:start + block_size]))
+
+    # ---------- kernels ----------
+    def inner_products(self, query: np.ndarray, start: int = 0, stop: int = None) -> np.ndarray:
+        """q · x for rows [start, stop), computed on the codes."""
+        q = np.asarray(query, dtype=np.float32)
+        codes = np.asarray(self.codes[start:stop])
+        if self.encoding in ("float32", "float16"):
+            return codes.astype(np.float32) @ q
+        if self.encoding == "int8":
+            # x = code * scale + offset  ->  q·x = code·(q * scale) + q·offset
+            return codes.astype(np.float32) @ (q * self.arrays["scale"]) + float(q @ self.arrays["offset"])
+        # PQ asymmetric distance: lookup table of q_sub · centroid per subspace
+        books = self.arrays["codebooks"]
+        m, _, sub = books.shape
+        table = np.einsum("mks,ms->mk", books, q.reshape(m, sub))
+        return table[np.arange(m), codes.astype(np.int64)].sum(axis=1)
+
+    def cosine(self, query: np.ndarray) -> np.ndarray:
+        q = _normalize(np.asarray(query, dtype=np.float32)[None, :])[0]
+        scores = np.concatenate([
+            self.inner_products(q, s, s + BLOCK_SIZE) for s in range(0, self.n, BLOCK_SIZE)
+        ]) if self.n else np.empty(0, np.float32)
+        return scores / np.maximum(np.asarray(self.arrays["norms"]), 1e-12)
+
+    def search(self, queries, k: int = 10, rerank=None, rerank_factor: int = 4):
+        """
+        Top-k cosine neighbours for each query row.
+
+        rerank: optional exact embeddings (float32 array or float32 EmbeddingStore);
+        the top k * rerank_factor quantized candidates are re-scored exactly.
+        Returns (indices, scores), both of shape (n_queries, k).
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        k = min(k, self.n)
+        n_cand = min(self.n, k * rerank_factor) if rerank is not None else k
+        out_idx = np.zeros((len(queries), k), dtype=np.int64)
+        out_score = np.zeros((len(queries), k), dtype=np.float32)
+
+        for i, q in enumerate(queries):
+            scores = self.cosine(q)
+            cand = np.argpartition(-scores, n_cand - 1)[:n_cand]
+            if rerank is not None:
+                exact = rerank.decode(cand) if isinstance(rerank, EmbeddingStore) else np.asarray(rerank)[cand]
+                cand_scores = _normalize(exact) @ _normalize(q[None, :])[0]
+            else:
+                cand_scores = scores[cand]
+            order = np.argsort(-cand_scores, kind="stable")[:k]
+            out_idx[i], out_score[i] = cand[order], cand_scores[order]
+        return out_idx, out_score
+
+    def centroid(self, rows=None) -> np.ndarray:
+        """Mean vector of the given rows, computed from the codes."""
+        codes = np.asarray(self.codes if rows is None else self.codes[np.asarray(rows)])
+        if self.encoding in ("float32", "float16"):
+            return codes.astype(np.float32).mean(axis=0)
+        if self.encoding == "int8":
+            return codes.astype(np.float32).mean(axis=0) * self.arrays["scale"] + self.arrays["offset"]
+        # PQ: centroid = per-subspace code frequencies x codebook
+        books = self.arrays["codebooks"]
+        m, k, _ = books.shape
+        freq = np.stack([np.bincount(codes[:, j], minlength=k) for j in range(m)]) / max(len(codes), 1)
+        return np.einsum("mk,mks->ms", freq, books).reshape(-1)
+
+
+class EmbeddingWriter:
+    """
+    Append embedding blocks straight to disk and finish as a float32 / float16
+    store, so the full matrix is never held in memory (out-of-core phase 5).
+    """
+
+    def __init__(self, path: str, encoding: str = "float32", **meta):
+        if encoding not in ("float32", "float16"):
+            raise ValueError(f"EmbeddingWriter streams float32 or float16 codes, not '{encoding}'.")
+        os.makedirs(path, exist_ok=True)
+        for fname in os.listdir(path):
+            if fname.endswith(".npy"):
+                os.remove(os.path.join(path, fname))  # arrays of a previous store in this directory
+        self.path, self.encoding, self.meta = path, encoding, meta
+        self.dtype = np.dtype(encoding)
+        self.raw_path = os.path.join(path, "codes.raw")
+        self._file = open(self.raw_path, "wb")
+        self.n, self.dim = 0, None
+        self._norms, self._doc_ids = [], []
+
+    def append(self, block, doc_ids=None):
+        codes = np.asarray(block, dtype=np.float32).astype(self.dtype)
+        if self.dim is None:
+            self.dim = codes.shape[1]
+        elif codes.shape[1] != self.dim:
+            raise ValueError(f"Block has dim {codes.shape[1]}, expected {self.dim}.")
+        codes.tofile(self._file)
+        self._norms.append(np.linalg.norm(codes.astype(np.float32), axis=1).astype(np.float32))
+        if doc_ids is not None:
+            self._doc_ids.append(np.asarray(doc_ids).astype(str))
+        self.n += len(codes)
+
+    def close(self) -> EmbeddingStore:
+        """Write codes.npy (copied block-wise from the raw file), norms and meta; return the memory-mapped store."""
+        self._file.close()
+        dim = self.dim or 0
+        codes = np.lib.format.open_memmap(os.path.join(self.path, "codes.npy"), mode="w+",
+                                          dtype=self.dtype, shape=(self.n, dim))
+        if self.n:
+            raw = np.memmap(self.raw_path, dtype=self.dtype, mode="r", shape=(self.n, dim))
+            for start in range(0, self.n, BLOCK_SIZE):
+                codes[start:start + BLOCK_SIZE] = raw[start:start + BLOCK_SIZE]
+            del raw
+        codes.flush()
+        del codes
+        os.remove(self.raw_path)
+
+        np.save(os.path.join(self.path, "norms.npy"),
+                np.concatenate(self._norms) if self._norms else np.empty(0, np.float32))
+        if self._doc_ids and sum(map(len, self._doc_ids)) == self.n:
+            np.save(os.path.join(self.path, "doc_ids.npy"), np.concatenate(self._doc_ids))
+        with open(os.path.join(self.path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(dict(self.meta, dim=dim, n=self.n, encoding=self.encoding), f, indent=2)
+        return EmbeddingStore.load(self.path)
+
+
+def _neighbours(results, q_idx, k: int) -> list:
+    """Top-k neighbour sets without the query row itself (wherever it ranks, e.g. behind duplicates)."""
+    return [set([j for j in row if j != q][:k]) for row, q in zip(results, q_idx)]
+
+
+def tradeoff_report(embeddings, k: int = 10, n_queries: int = 200, encodings=None,
+                    seed: int = 42) -> pd.DataFrame:
+    """Recall@k (vs exact float32 cosine) and memory for each encoding."""
+    x = np.asarray(embeddings, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    q_idx = rng.choice(len(x), size=min(n_queries, len(x)), replace=False)
+    exact = EmbeddingStore.from_embeddings(x, "float32")
+    truth, _ = exact.search(x[q_idx], k + 1)
+    truth = _neighbours(truth, q_idx, k)
+
+    rows = []
+    for enc in encodings or ENCODINGS:
+        store = EmbeddingStore.from_embeddings(x, enc, seed=seed)
+        found, _ = store.search(x[q_idx], k + 1)
+        reranked, _ = store.search(x[q_idx], k + 1, rerank=exact)
+        recall = np.mean([len(f & t) / k for f, t in zip(_neighbours(found, q_idx, k), truth)])
+        recall_rr = np.mean([len(f & t) / k for f, t in zip(_neighbours(reranked, q_idx, k), truth)])
+        rows.append({
+            "encoding": enc,
+            "bytes": store.nbytes,
+            "bytes_per_vector": round(store.nbytes / len(x), 1),
+            "compression_vs_float32": round(exact.nbytes / store.nbytes, 2),
+            f"recall@{k}": round(float(recall), 4),
+            f"recall@{k}_reranked": round(float(recall_rr), 4),
+        })
+    return pd.DataFrame(rows).set_index("encoding")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the recall / memory trade-off of a stored embedding set.")
+    parser.add_argument("--store", required=True,
+                        help="Embedding store directory (e.g. data/semantic/hype_top50_embeddings)")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours for recall@k (default: 10)")
+    parser.add_argument("--queries", type=int, default=200, help="Number of query rows (default: 200)")
+    args = parser.parse_args()
+
+    store = EmbeddingStore.load(args.store)
+    print(f"[INFO] Loaded {store.n} x {store.dim} embeddings ({store.encoding}) from {args.store}")
+    if store.encoding != "float32":
+        print("[WARN] Store is already quantized; recall is measured against its reconstruction.")
+    report = tradeoff_report(store.decode(), k=args.k, n_queries=args.queries)
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
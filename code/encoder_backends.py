@@ -0,0 +1,158 @@
+import argparse
+import os
+import time
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from runtime_cache import configure_caches
+
+# Sentence encoder backends for phase 5:
+#
+#   torch       SentenceTransformer in FP32 (the reference)
+#   onnx        the same model exported once to ONNX and run with ONNX Runtime
+#   onnx-int8   that graph with dynamic int8 quantization (weights int8, activations
+#               quantized on the fly), exported once
+#
+# Exports live under <SENTENCE_TRANSFORMERS_HOME>/onnx/<model>, next to the model cache.
+# The onnx backends need `pip install sentence-transformers[onnx]` (optimum + onnxruntime).
+# `python code/encoder_backends.py` measures speed, cosine agreement with the torch
+# embeddings and downstream cluster agreement on the phase 4 subsets.
+
+BACKENDS = ["torch", "onnx", "onnx-int8"]
+QUANTIZATION = "avx2"   # dynamic int8 config: arm64, avx2, avx512 or avx512_vnni
+BENCHMARK_INPUTS = [
+    "data/ganis_hype_top50.csv",
+    "data/ganis_hype_ge1000.csv",
+    "data/ganis_control_top50.csv",
+    "data/ganis_control_ge1000.csv",
+]
+BENCHMARK_OUTPUT = "data/benchmarks/encoder_backends.csv"
+BENCHMARK_DOCS = 500    # documents per subset
+
+
+def export_dir(model_name: str) -> str:
+    return os.path.join(os.environ["SENTENCE_TRANSFORMERS_HOME"], "onnx", model_name.replace("/", "__"))
+
+
+def _onnx_kwargs(threads):
+    kwargs = {"provider": "CPUExecutionProvider"}
+    if threads:
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        kwargs["session_options"] = options
+    return kwargs
+
+
+@lru_cache(maxsize=4)
+def load_encoder(model_name: str, backend: str = "torch", threads: int = None, quantization: str = QUANTIZATION):
+    """
+    SentenceTransformer for the given backend, from the persistent caches (torch /
+    onnxruntime are only imported here); loaded once per process.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}'. Use one of {BACKENDS}.")
+    configure_caches()
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        if threads:
+            import torch
+
+            torch.set_num_threads(threads)
+        return SentenceTransformer(model_name)
+
+    local = export_dir(model_name)
+    if not os.path.exists(os.path.join(local, "onnx", "model.onnx")):
+        # first use: export the FP32 graph once
+        print(f"[INFO] Exporting {model_name} to ONNX in {local} ...")
+        SentenceTransformer(model_name, backend="onnx", model_kwargs=_onnx_kwargs(None)).save(local)
+
+    kwargs = _onnx_kwargs(threads)
+    if backend == "onnx-int8":
+        file_name = f"onnx/model_qint8_{quantization}.onnx"
+        if not os.path.exists(os.path.join(local, file_name)):
+            from sentence_transformers import export_dynamic_quantized_onnx_model
+
+            print(f"[INFO] Quantizing {model_name} (dynamic int8, {quantization}) ...")
+            export_dynamic_quantized_onnx_model(SentenceTransformer(local, backend="onnx"), quantization, local)
+        kwargs["file_name"] = file_name
+    return SentenceTransformer(local, backend="onnx", model_kwargs=kwargs)
+
+
+def cosine_agreement(reference: np.ndarray, candidate: np.ndarray) -> np.ndarray:
+    """Row-wise cosine similarity between two embeddings of the same documents."""
+    a = reference / np.maximum(np.linalg.norm(reference, axis=1, keepdims=True), 1e-12)
+    b = candidate / np.maximum(np.linalg.norm(candidate, axis=1, keepdims=True), 1e-12)
+    return np.einsum("ij,ij->i", a, b)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare encoder backends against the torch FP32 reference.")
+    parser.add_argument("--model_name", default="all-MiniLM-L6-v2")
+    parser.add_argument("--backends", nargs="+", default=BACKENDS[1:], choices=BACKENDS,
+                        help="Backends to compare with torch (default: onnx onnx-int8)")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads (default: library default)")
+    parser.add_argument("--inputs", nargs="+", default=BENCHMARK_INPUTS, help="Phase 4 subsets")
+    parser.add_argument("--max_docs", type=int, default=BENCHMARK_DOCS, help=f"Docs per subset (default: {BENCHMARK_DOCS})")
+    parser.add_argument("--batch_size", type=int, default=16)
+    parser.add_argument("--output", default=BENCHMARK_OUTPUT, help=f"Default: {BENCHMARK_OUTPUT}")
+    args = parser.parse_args()
+
+    from clustering import clustering_agreement, reduce_and_cluster
+    from data_loader import load_table
+    from phase5_semantic_pipeline import build_text_field
+
+    encoders = {b: load_encoder(args.model_name, b, args.threads) for b in ["torch"] + args.backends}
+    for encoder in encoders.values():
+        encoder.encode(["warm-up"])
+
+    rows = []
+    for path in args.inputs:
+        if not os.path.exists(path):
+            print(f"WARNING: File {path} not found. Skipping.")
+            continue
+        df = load_table(path, columns=["Title", "content_text"]).head(args.max_docs)
+        texts = df.apply(build_text_field, axis=1).tolist()
+        print(f"[INFO] {path}: {len(texts)} documents")
+
+        results = {}
+        for backend, encoder in encoders.items():
+            start = time.perf_counter()
+            emb = encoder.encode(texts, batch_size=args.batch_size, show_progress_bar=False)
+            seconds = time.perf_counter() - start
+            _, labels = reduce_and_cluster(emb)
+            results[backend] = (np.asarray(emb, dtype=np.float32), labels, seconds)
+
+        ref_emb, ref_labels, ref_seconds = results["torch"]
+        for backend, (emb, labels, seconds) in results.items():
+            cos = cosine_agreement(ref_emb, emb)
+            rows.append({
+                "input": os.path.basename(path),
+                "backend": backend,
+                "docs": len(texts),
+                "seconds": round(seconds, 3),
+                "docs_per_s": round(len(texts) / seconds, 1),
+                "speedup": round(ref_seconds / seconds, 2),
+                "cosine_mean": round(float(cos.mean()), 5),
+                "cosine_min": round(float(cos.min()), 5),
+                **{k: v for k, v in clustering_agreement(ref_labels, labels).items() if k in ("ari", "nmi")},
+            })
+
+    if not rows:
+        print("ERROR: No inputs found.")
+        return
+    out = pd.DataFrame(rows)
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    out.to_csv(args.output, index=False)
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(out.to_string(index=False))
+    print(f"\n✅ Saved encoder benchmark to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
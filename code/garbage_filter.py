@@ -1,18 +1,31 @@
+import argparse
 import math
+import os
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 
 import numpy as np
 import pandas as pd
 
+from data_loader import load_table, memory_mb
+from domain_rules import REPORT_PATH as DOMAIN_REPORT_PATH, domain_garbage_report
+
 # -------- CONFIG --------
 RAW_DATA_PATH = "data/Final_table_results.xlsx"
 OUTPUT_PATH = "data/ganis_phase2_clean.csv"
+FUNNEL_PATH = "data/garbage_filter_funnel.csv"  # read by phase7_visual_garbage_comparison.py
 
 # thresholds – chosen based on std dev analysis (approx 1.5 std devs below mean)
 MIN_WORDS = 50          # Increased from 30 to 50 (30 is often just a header/footer)
 MIN_CHAR_ENTROPY = 4.0  # Increased from 3.5 to 4.0 (Garbage is usually < 3.8)
 MIN_TTR = 0.25
 
+# threshold grids for the sensitivity sweep (the thresholds above are always included)
+SWEEP_MIN_WORDS = [20, 30, 40, 50, 75, 100, 150]
+SWEEP_MIN_CHAR_ENTROPY = [3.5, 3.6, 3.7, 3.8, 3.9, 4.0, 4.1, 4.2]
+SWEEP_MIN_TTR = [0.10, 0.15, 0.20, 0.25, 0.30, 0.35]
+
 # boilerplate keywords (lowercase)
 BOILERPLATE_KEYWORDS = [
     "cookie", "cookies", "cookie settings", "privacy policy",
@@ -21,6 +34,15 @@ BOILERPLATE_KEYWORDS = [
     "all rights reserved"
 ]
 
+# language filter
+LANGUAGE = "en"
+MIN_LANG_SCORE = 0.8
+
+# columns the filter chain reads (everything else stays in the parent process)
+BOILERPLATE_COLUMNS = ["content_text", "Title", "top_bigrams", "top_trigrams"]
+TEXT_COLUMNS = BOILERPLATE_COLUMNS + ["lang_detected"]
+NUMERIC_COLUMNS = ["lang_score", "raw_word_count"]
+
 def calculate_text_entropy(text: str) -> float:
     """
     Calculates Character-level Shannon entropy in bits.
@@ -47,76 +69,396 @@ def type_token_ratio(text: str) -> float:
 def contains_boilerplate(row) -> bool:
     """Check content_text, Title, bigrams, trigrams for boilerplate phrases."""
     fields = []
-    for col in ["content_text", "Title", "top_bigrams", "top_trigrams"]:
+    for col in BOILERPLATE_COLUMNS:
         if col in row and isinstance(row[col], str):
             fields.append(row[col].lower())
     joined = " ".join(fields)
     return any(kw in joined for kw in BOILERPLATE_KEYWORDS)
 
 
+# -------- SHARDED EXECUTION --------
+class FrameColumns:
+    """The filter inputs read straight from the frame (serial path, no copy)."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.n_rows = len(df)
+
+    def has(self, col) -> bool:
+        return col in self.df.columns
+
+    def text(self, col, start, stop) -> list:
+        values = self.df[col].iloc[start:stop]
+        return [None if miss else str(v) for v, miss in zip(values, values.isna().to_numpy())]
+
+    def numeric(self, col, start, stop) -> np.ndarray:
+        return pd.to_numeric(self.df[col].iloc[start:stop], errors="coerce").to_numpy(np.float64)
+
+
+class SharedColumns:
+    """
+    Columnar copy of the filter inputs in shared memory.
+
+    Text columns are stored as one UTF-8 byte buffer plus int64 offsets (and a
+    null mask); numeric columns as float64 arrays. Workers attach by name and
+    read only their row range, so no DataFrame is ever pickled.
+    """
+
+    def __init__(self, n_rows, blocks, owner=False):
+        self.n_rows = n_rows
+        self.blocks = blocks  # name -> (SharedMemory, dtype, length)
+        self.owner = owner
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "SharedColumns":
+        blocks = {}
+
+        def alloc(key, dtype, n):
+            dtype = np.dtype(dtype)
+            shm = shared_memory.SharedMemory(create=True, size=max(n * dtype.itemsize, 1))
+            blocks[key] = (shm, dtype.str, n)
+            return np.ndarray((n,), dtype=dtype, buffer=shm.buf)
+
+        def put(key, arr):
+            alloc(key, arr.dtype, len(arr))[:] = arr
+
+        for col in TEXT_COLUMNS:
+            if col not in df.columns:
+                continue
+            values = df[col]
+            nulls = values.isna().to_numpy()
+            encoded = [b"" if miss else str(v).encode("utf-8") for v, miss in zip(values, nulls)]
+            offsets = alloc(f"{col}:offsets", np.int64, len(encoded) + 1)
+            offsets[0] = 0
+            np.cumsum([len(b) for b in encoded], out=offsets[1:])
+            # copied piece by piece, so the text is held once in shared memory (no joined copy)
+            data = alloc(f"{col}:data", np.uint8, int(offsets[-1]))
+            for i, b in enumerate(encoded):
+                data[offsets[i]:offsets[i + 1]] = np.frombuffer(b, dtype=np.uint8)
+            del encoded, data, offsets
+            put(f"{col}:nulls", nulls)
+
+        for col in NUMERIC_COLUMNS:
+            if col in df.columns:
+                put(f"{col}:values", pd.to_numeric(df[col], errors="coerce").to_numpy(np.float64))
+
+        return cls(len(df), blocks, owner=True)
+
+    def spec(self) -> dict:
+        """Picklable description used by workers to attach."""
+        return {
+            "n_rows": self.n_rows,
+            "blocks": {k: (shm.name, dtype, n) for k, (shm, dtype, n) in self.blocks.items()},
+        }
+
+    @classmethod
+    def attach(cls, spec: dict) -> "SharedColumns":
+        blocks = {}
+        for key, (name, dtype, n) in spec["blocks"].items():
+            blocks[key] = (shared_memory.SharedMemory(name=name), dtype, n)
+        return cls(spec["n_rows"], blocks)
+
+    def _array(self, key):
+        shm, dtype, n = self.blocks[key]
+        return np.ndarray((n,), dtype=np.dtype(dtype), buffer=shm.buf)
+
+    def has(self, col) -> bool:
+        return f"{col}:values" in self.blocks or f"{col}:nulls" in self.blocks
+
+    def text(self, col, start, stop) -> list:
+        data = self._array(f"{col}:data")
+        offsets = self._array(f"{col}:offsets")
+        nulls = self._array(f"{col}:nulls")
+        return [
+            None if nulls[i] else bytes(data[offsets[i]:offsets[i + 1]]).decode("utf-8")
+            for i in range(start, stop)
+        ]
+
+    def numeric(self, col, start, stop) -> np.ndarray:
+        return self._array(f"{col}:values")[start:stop].copy()
+
+    def close(self):
+        for shm, _, _ in self.blocks.values():
+            shm.close()
+            if self.owner:
+                shm.unlink()
+
+
+def moments(values: np.ndarray) -> tuple:
+    """(n, mean, M2) of a shard, mergeable with merge_moments."""
+    n = len(values)
+    if n == 0:
+        return 0, 0.0, 0.0
+    mean = float(values.mean())
+    return n, mean, float(((values - mean) ** 2).sum())
+
+
+def merge_moments(parts) -> tuple:
+    """Combine per-shard (n, mean, M2) into global (n, mean, sample std)."""
+    n, mean, m2 = 0, 0.0, 0.0
+    for nb, mean_b, m2_b in parts:
+        if nb == 0:
+            continue
+        delta = mean_b - mean
+        total = n + nb
+        mean += delta * nb / total
+        m2 += m2_b + delta ** 2 * n * nb / total
+        n = total
+    std = math.sqrt(m2 / (n - 1)) if n > 1 else float("nan")
+    return n, mean, std
+
+
+def filter_shard(cols, start: int, stop: int) -> dict:
+    """
+    Run the full phase 2 filter chain on rows [start, stop).
+    Returns per-row stage masks and stats plus the shard's entropy moments.
+    """
+    n = stop - start
+    content = cols.text("content_text", start, stop)
+
+    # language filter + null cleanup
+    keep = np.array([t is not None for t in content])
+    if cols.has("lang_detected"):
+        keep &= np.array([lang == LANGUAGE for lang in cols.text("lang_detected", start, stop)])
+    if cols.has("lang_score"):
+        keep &= cols.numeric("lang_score", start, stop) >= MIN_LANG_SCORE
+    rows = np.flatnonzero(keep)
+
+    # text statistics
+    entropy = np.full(n, np.nan)
+    ttr = np.full(n, np.nan)
+    entropy[rows] = [calculate_text_entropy(content[i]) for i in rows]
+    ttr[rows] = [type_token_ratio(content[i]) for i in rows]
+    if cols.has("raw_word_count"):
+        word_count = cols.numeric("raw_word_count", start, stop)
+    else:
+        word_count = np.array([len(t.split()) if t is not None else 0 for t in content], dtype=np.float64)
+
+    # low-information filters
+    lowinfo = keep & (word_count >= MIN_WORDS) & (entropy >= MIN_CHAR_ENTROPY) & (ttr >= MIN_TTR)
+
+    # boilerplate flag (for every language-filtered row, so the sweep can use it)
+    fields = {col: cols.text(col, start, stop) if cols.has(col) else [None] * n
+              for col in BOILERPLATE_COLUMNS}
+    boiler = np.zeros(n, dtype=bool)
+    for i in rows:
+        boiler[i] = contains_boilerplate({col: fields[col][i] for col in BOILERPLATE_COLUMNS})
+
+    return {
+        "start": start,
+        "passed_lang": keep,
+        "char_entropy": entropy,
+        "ttr": ttr,
+        "word_count": word_count,
+        "passed_lowinfo": lowinfo,
+        "is_boilerplate": boiler,
+        "entropy_moments": moments(entropy[rows]),
+    }
+
+
+_WORKER_SPEC = None
+
+
+def _init_worker(spec):
+    global _WORKER_SPEC
+    _WORKER_SPEC = spec
+
+
+def _run_shard(bounds):
+    # attached per shard and closed again, so workers never hold the segments open
+    cols = SharedColumns.attach(_WORKER_SPEC)
+    try:
+        return filter_shard(cols, *bounds)
+    finally:
+        cols.close()
+
+
+def run_filter_chain(df: pd.DataFrame, workers: int = 1, shard_size: int = None) -> dict:
+    """
+    Run the filter chain over row-range shards (in a process pool when
+    workers > 1) and concatenate the results in the original row order.
+    Only the parallel path copies the inputs into shared memory; the serial
+    path reads the frame directly.
+    """
+    if shard_size is None:
+        shard_size = max(math.ceil(len(df) / max(workers * 4, 1)), 1)
+    bounds = [(s, min(s + shard_size, len(df))) for s in range(0, len(df), shard_size)]
+
+    if workers > 1 and len(bounds) > 1:
+        cols = SharedColumns.from_frame(df)
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(cols.spec(),)) as pool:
+                parts = list(pool.map(_run_shard, bounds))
+        finally:
+            cols.close()
+    else:
+        cols = FrameColumns(df)
+        parts = [filter_shard(cols, s, e) for s, e in bounds]
+
+    parts.sort(key=lambda p: p["start"])
+    merged = {key: np.concatenate([p[key] for p in parts]) if parts else np.empty(0)
+              for key in ["passed_lang", "char_entropy", "ttr", "word_count",
+                          "passed_lowinfo", "is_boilerplate"]}
+    merged["entropy_stats"] = merge_moments(p["entropy_moments"] for p in parts)
+    print(f"[INFO] Filter chain ran on {len(bounds)} shard(s) with {workers} worker(s).")
+    return merged
+
+
+# -------- THRESHOLD SWEEP --------
+def _passing_bins(values: np.ndarray, grid: np.ndarray) -> np.ndarray:
+    """Number of (sorted) grid thresholds each value passes (value >= threshold)."""
+    bins = np.searchsorted(grid, values, side="right")
+    bins[np.isnan(values)] = 0
+    return bins
+
+
+def _survivors(hist: np.ndarray) -> np.ndarray:
+    """Reverse cumulative sums over every axis: rows passing each threshold combination."""
+    for axis in range(hist.ndim):
+        hist = np.flip(np.cumsum(np.flip(hist, axis), axis=axis), axis)
+    return hist[(slice(1, None),) * hist.ndim]
+
+
+def sweep_thresholds(word_count, entropy, ttr, is_boilerplate,
+                     words_grid=None, entropy_grid=None, ttr_grid=None) -> pd.DataFrame:
+    """
+    Evaluate every (MIN_WORDS, MIN_CHAR_ENTROPY, MIN_TTR) combination in one pass.
+
+    Each row is binned once against the sorted grids; a 3-D histogram plus
+    reverse cumulative sums then gives the surviving row count for every
+    combination and every funnel stage (words -> entropy -> TTR -> boilerplate)
+    without re-filtering.
+    """
+    grids = [
+        np.unique(np.append(words_grid if words_grid is not None else SWEEP_MIN_WORDS, MIN_WORDS)),
+        np.unique(np.append(entropy_grid if entropy_grid is not None else SWEEP_MIN_CHAR_ENTROPY,
+                            MIN_CHAR_ENTROPY)),
+        np.unique(np.append(ttr_grid if ttr_grid is not None else SWEEP_MIN_TTR, MIN_TTR)),
+    ]
+    values = [np.asarray(v, dtype=np.float64) for v in (word_count, entropy, ttr)]
+    bins = [_passing_bins(v, g) for v, g in zip(values, grids)]
+    shape = tuple(len(g) + 1 for g in grids)
+
+    flat = np.ravel_multi_index(bins, shape)
+    hist = np.bincount(flat, minlength=np.prod(shape)).reshape(shape)
+    boilerplate = np.asarray(is_boilerplate, dtype=bool)
+    hist_clean = np.bincount(flat[~boilerplate], minlength=np.prod(shape)).reshape(shape)
+
+    after_words = _survivors(hist.sum(axis=(1, 2)))
+    after_entropy = _survivors(hist.sum(axis=2))
+    after_ttr = _survivors(hist)
+    after_boiler = _survivors(hist_clean)
+
+    w, e, t = np.meshgrid(*[np.arange(len(g)) for g in grids], indexing="ij")
+    funnel = pd.DataFrame({
+        "min_words": grids[0][w.ravel()],
+        "min_char_entropy": grids[1][e.ravel()],
+        "min_ttr": grids[2][t.ravel()],
+        "initial": len(flat),
+        "after_min_words": after_words[w.ravel()],
+        "after_min_char_entropy": after_entropy[w.ravel(), e.ravel()],
+        "after_min_ttr": after_ttr.ravel(),
+        "after_boilerplate": after_boiler.ravel(),
+    })
+    funnel["is_default"] = (
+        (funnel["min_words"] == MIN_WORDS)
+        & np.isclose(funnel["min_char_entropy"], MIN_CHAR_ENTROPY)
+        & np.isclose(funnel["min_ttr"], MIN_TTR)
+    )
+    return funnel
+
+
 # -------- MAIN PIPELINE --------
-def main():
+def main(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes for the sharded filter chain (default: 1, 0 = all cores)")
+    parser.add_argument("--shard_size", type=int, default=None,
+                        help="Rows per shard (default: rows / (4 * workers))")
+    parser.add_argument("--sweep", action="store_true",
+                        help="Only run the threshold sweep: print the funnel grid and "
+                             "skip writing the cleaned dataset")
+    parser.add_argument("--scorer", default=None,
+                        help="Learned garbage scorer bundle (garbage_scorer.py train) applied as an "
+                             "extra stage after the rule-based filters")
+    parser.add_argument("--garbage_threshold", type=float, default=None,
+                        help="Drop pages with garbage_score >= this (default: the bundle's threshold)")
+    args = parser.parse_args(args)
+    workers = args.workers or os.cpu_count() or 1
+
     print("Loading data...")
     try:
-        df = pd.read_excel(RAW_DATA_PATH)
+        df = load_table(RAW_DATA_PATH)
     except FileNotFoundError:
         print(f"ERROR: Could not find {RAW_DATA_PATH}. Please check your data folder.")
         return
-
-    # keep only English pages with decent language score
-    if "lang_detected" in df.columns:
-        df = df[df["lang_detected"] == "en"]
-    if "lang_score" in df.columns:
-        df = df[df["lang_score"] >= 0.8]
-
-    # basic null cleanup
-    df = df.dropna(subset=["content_text"])
+    print(f"[INFO] Loaded {len(df)} rows ({memory_mb(df):.1f} MB in memory).")
 
     print("Calculating text statistics (entropy, TTR)...")
-    df["char_entropy"] = df["content_text"].astype(str).apply(calculate_text_entropy)
-    df["ttr"] = df["content_text"].astype(str).apply(type_token_ratio)
+    result = run_filter_chain(df, workers=workers, shard_size=args.shard_size)
+
+    df["char_entropy"] = result["char_entropy"]
+    df["ttr"] = result["ttr"]
 
     # use existing word count if present, otherwise compute
     if "raw_word_count" in df.columns:
         df["word_count"] = df["raw_word_count"]
     else:
-        df["word_count"] = df["content_text"].astype(str).apply(
-            lambda t: len(t.split())
-        )
+        df["word_count"] = result["word_count"].astype(np.int64)
+    df["is_boilerplate"] = result["is_boilerplate"]
+
+    # keep only English pages with decent language score (+ basic null cleanup)
+    df = df[result["passed_lang"]]
+    passed_lowinfo = result["passed_lowinfo"][result["passed_lang"]]
 
     print("-" * 40)
     print(f"Initial Dataset Size: {len(df)}")
-    
+
     # --- SENSITIVITY ANALYSIS ---
-    mean_ent = df["char_entropy"].mean()
-    std_ent = df["char_entropy"].std()
+    # global stats merged from the per-shard moments
+    _, mean_ent, std_ent = result["entropy_stats"]
     print(f"STATS: Mean Entropy: {mean_ent:.2f} +/- {std_ent:.2f}")
     print(f"THRESHOLD JUSTIFICATION: Setting MIN_CHAR_ENTROPY to {MIN_CHAR_ENTROPY}")
     print(f"(Targeting texts approx {(mean_ent - MIN_CHAR_ENTROPY)/std_ent:.1f} std devs below mean)")
     print("-" * 40)
 
-    # low-information filters
-    mask_words = df["word_count"] >= MIN_WORDS
-    mask_entropy = df["char_entropy"] >= MIN_CHAR_ENTROPY
-    mask_ttr = df["ttr"] >= MIN_TTR
+    # threshold sweep: every grid combination from the stats computed once
+    funnel = sweep_thresholds(df["word_count"], df["char_entropy"], df["ttr"], df["is_boilerplate"])
+    funnel.to_csv(FUNNEL_PATH, index=False)
+    print(f"Saved threshold sweep funnel ({len(funnel)} settings) to {FUNNEL_PATH}")
 
-    df_lowinfo_removed = df[mask_words & mask_entropy & mask_ttr]
+    # garbage rate per url host -> blacklist candidates (see domain_rules.py)
+    if "url" in df.columns:
+        domain_garbage_report(df).to_csv(DOMAIN_REPORT_PATH)
+        print(f"Saved per-host garbage report to {DOMAIN_REPORT_PATH}")
+    if args.sweep:
+        ranked = funnel.sort_values("after_boilerplate", ascending=False)
+        print(ranked.to_string(index=False))
+        return
+
+    # low-information filters
+    df_lowinfo_removed = df[passed_lowinfo]
     dropped_count = len(df) - len(df_lowinfo_removed)
     print(f"Low-Info Filter Removed: {dropped_count} rows")
 
     # boilerplate removal
     print("Flagging boilerplate pages...")
-
-    # Make explicit copy to avoid SettingWithCopyWarning
-    df_lowinfo_removed = df_lowinfo_removed.copy()
-
-    df_lowinfo_removed["is_boilerplate"] = df_lowinfo_removed.apply(
-        contains_boilerplate, axis=1
-    )
     df_clean = df_lowinfo_removed[~df_lowinfo_removed["is_boilerplate"]]
 
     boilerplate_count = len(df_lowinfo_removed) - len(df_clean)
     print(f"Boilerplate Filter Removed: {boilerplate_count} rows")
+
+    # optional learned stage: catches the garbage the thresholds let through
+    if args.scorer:
+        from garbage_scorer import SCORE_COLUMN, GarbageScorer
+
+        scorer = GarbageScorer.load(args.scorer)
+        threshold = scorer.threshold if args.garbage_threshold is None else args.garbage_threshold
+        df_clean = df_clean.assign(**{SCORE_COLUMN: scorer.score(df_clean.reset_index(drop=True))})
+        before = len(df_clean)
+        df_clean = df_clean[df_clean[SCORE_COLUMN] < threshold]
+        print(f"Learned Garbage Filter Removed: {before - len(df_clean)} rows (threshold {threshold})")
     print(f"Final Clean Dataset: {len(df_clean)} rows")
 
     # save cleaned base dataset for later phases
@@ -0,0 +1,388 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from data_loader import load_table
+from garbage_filter import (BOILERPLATE_COLUMNS, MIN_CHAR_ENTROPY, MIN_TTR, MIN_WORDS, calculate_text_entropy,
+                            contains_boilerplate, type_token_ratio)
+from keyword_matrix import TERM_FIELDS, keyword_counts, parse_terms
+
+# Learned garbage scorer, trained on the reviewed validation sample
+# (llm_validation_sample.py -> fill in is_garbage = 1 / 0, blank = not reviewed).
+#
+# Features, all cheap:
+#   stats       char_entropy, ttr, log word count, is_boilerplate, lang_score (phase 2;
+#               computed from content_text when the file does not have them)
+#   keywords    AI keyword count, keyword_presence, plus kw: / uni: terms of the
+#               keyword matrix seen in >= MIN_TERM_DOCS labelled rows (sparse, log counts)
+#   embeddings  optional: the preview cache's embeddings, looked up by content hash
+#
+# Dense features are standardized with the training mean / std; the model is an L2
+# logistic regression (no class re-weighting, so scores stay calibrated probabilities).
+# Scoring a corpus is one sparse matrix-vector product. The bundle keeps the threshold
+# that garbage_filter.py --scorer applies as an extra stage after the rule-based filters.
+
+MODEL_PATH = "data/garbage_scorer.joblib"
+LABELS_PATH = "data/ganis_llm_sample.csv"
+REPORT_PATH = "data/garbage_scorer_report.csv"
+LABEL_COLUMN = "is_garbage"
+SCORE_COLUMN = "garbage_score"
+
+THRESHOLD = 0.5
+MIN_TERM_DOCS = 3      # a keyword term needs this many labelled documents to become a feature
+MIN_LABELS = 20
+C = 1.0                # inverse L2 strength
+CV_FOLDS = 5
+CALIBRATION_BINS = 10
+TERM_PREFIXES = ["kw", "uni"]
+STAT_FEATURES = ["char_entropy", "ttr", "log_word_count", "is_boilerplate", "lang_score",
+                 "log_keywords", "keyword_presence"]
+
+
+def parse_labels(values: pd.Series) -> pd.Series:
+    """1 / 0 / yes / no / true / false / garbage / ok -> 1.0 / 0.0; blank or anything else -> NaN."""
+    text = values.astype(object).where(values.notna(), "").astype(str).str.strip().str.lower()
+    mapping = {"1": 1.0, "1.0": 1.0, "yes": 1.0, "y": 1.0, "true": 1.0, "garbage": 1.0,
+               "0": 0.0, "0.0": 0.0, "no": 0.0, "n": 0.0, "false": 0.0, "ok": 0.0}
+    return text.map(mapping)
+
+
+def text_stats(df: pd.DataFrame) -> pd.DataFrame:
+    """Phase 2 statistics; columns the file already has are reused, the rest computed from the text."""
+    content = df["content_text"].astype(object).where(df["content_text"].notna(), None) \
+        if "content_text" in df.columns else pd.Series(None, index=df.index, dtype=object)
+    out = pd.DataFrame(index=df.index)
+    out["char_entropy"] = df["char_entropy"] if "char_entropy" in df.columns else \
+        [calculate_text_entropy(t) if t is not None else 0.0 for t in content]
+    out["ttr"] = df["ttr"] if "ttr" in df.columns else [type_token_ratio(t) for t in content]
+    if "word_count" in df.columns:
+        out["word_count"] = df["word_count"]
+    elif "raw_word_count" in df.columns:
+        out["word_count"] = df["raw_word_count"]
+    else:
+        out["word_count"] = [len(t.split()) if t is not None else 0 for t in content]
+    if "is_boilerplate" in df.columns:
+        out["is_boilerplate"] = df["is_boilerplate"].astype(bool)
+    else:
+        rows = df.reindex(columns=BOILERPLATE_COLUMNS).astype(object).to_dict("records")
+        out["is_boilerplate"] = [contains_boilerplate(r) for r in rows]
+    return out.apply(pd.to_numeric, errors="coerce").fillna(0.0)
+
+
+def rule_garbage(stats: pd.DataFrame) -> np.ndarray:
+    """What the rule-based phase 2 filter drops (low-information or boilerplate)."""
+    return ((stats["word_count"] < MIN_WORDS) | (stats["char_entropy"] < MIN_CHAR_ENTROPY)
+            | (stats["ttr"] < MIN_TTR) | stats["is_boilerplate"].astype(bool)).to_numpy()
+
+
+def term_triples(df: pd.DataFrame) -> pd.DataFrame:
+    """(row, term, count) for the kw: / uni: keyword-matrix fields, row = position in df."""
+    parts = []
+    for prefix in TERM_PREFIXES:
+        column, weighted = TERM_FIELDS[prefix]
+        if column in df.columns:
+            triples = parse_terms(df[column], weighted)
+            triples["term"] = prefix + ":" + triples["term"]
+            parts.append(triples)
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=["row", "term", "count"])
+
+
+def load_embedding_cache(cache_dir: str, model_name: str) -> dict:
+    """content hash -> embedding from a preview cache, read without touching the directory; None without cache_dir."""
+    if not cache_dir:
+        return None
+    from preview_pipeline import cached_embedding_dir, load_cached_embeddings
+
+    return load_cached_embeddings(cached_embedding_dir(cache_dir, model_name))
+
+
+def cached_embeddings(df: pd.DataFrame, embeddings: dict, dim: int = None):
+    """(embeddings, found mask) for df from a hash -> vector dict (zeros where a document is not cached)."""
+    from snapshot_store import content_hash
+
+    hashes = content_hash(df).to_numpy()
+    found = np.array([h in embeddings for h in hashes], dtype=bool)
+    if dim is None:
+        dim = len(next(iter(embeddings.values()))) if embeddings else 0
+    out = np.zeros((len(df), dim), dtype=np.float32)
+    if found.any():
+        out[found] = np.stack([embeddings[h] for h in hashes[found]])
+    return out, found
+
+
+class GarbageScorer:
+    def __init__(self, vocab: list, mean: np.ndarray, std: np.ndarray, coef: np.ndarray, intercept: float,
+                 threshold: float = THRESHOLD, embedding_cache: str = None, model_name: str = None,
+                 train_scores: np.ndarray = None):
+        self.vocab = list(vocab)
+        self.mean, self.std = mean, std
+        self.coef, self.intercept = coef, intercept
+        self.threshold = threshold
+        self.embedding_cache = embedding_cache
+        self.model_name = model_name
+        self.train_scores = train_scores  # reference distribution for the drift report
+
+    # ---------- features ----------
+    def features(self, df: pd.DataFrame, stats: pd.DataFrame = None, embeddings: dict = None) -> sp.csr_matrix:
+        """[standardized dense features | log1p keyword terms] for every row of df."""
+        stats = text_stats(df) if stats is None else stats
+        dense = np.column_stack([
+            stats["char_entropy"], stats["ttr"], np.log1p(stats["word_count"].clip(lower=0)),
+            stats["is_boilerplate"],
+            pd.to_numeric(df["lang_score"], errors="coerce").fillna(0.0) if "lang_score" in df.columns
+            else np.zeros(len(df)),
+            np.log1p(keyword_counts(df)),
+            (df["keyword_presence"].astype(str).str.lower() == "yes").to_numpy()
+            if "keyword_presence" in df.columns else np.zeros(len(df)),
+        ]).astype(np.float64)
+        if self.embedding_cache:
+            if embeddings is None:
+                embeddings = load_embedding_cache(self.embedding_cache, self.model_name)
+            dim = None if self.mean is None else len(self.mean) - len(STAT_FEATURES) - 1
+            emb, found = cached_embeddings(df, embeddings, dim)
+            dense = np.hstack([dense, found[:, None], emb])
+        dense = (dense - self.mean) / self.std if self.mean is not None else dense
+
+        index = {t: i for i, t in enumerate(self.vocab)}
+        triples = term_triples(df)
+        cols = triples["term"].map(index)
+        known = cols.notna().to_numpy()
+        terms = sp.csr_matrix(
+            (np.log1p(triples["count"].to_numpy(dtype=np.float64)[known]),
+             (triples["row"].to_numpy(dtype=np.int64)[known], cols[known].to_numpy(dtype=np.int64))),
+            shape=(len(df), len(self.vocab)),
+        )
+        return sp.hstack([sp.csr_matrix(dense), terms], format="csr")
+
+    @property
+    def feature_names(self) -> list:
+        names = list(STAT_FEATURES)
+        if self.embedding_cache:
+            names += ["has_embedding"] + [f"emb_{i}" for i in range(len(self.mean) - len(names) - 1)]
+        return names + self.vocab
+
+    # ---------- training ----------
+    @classmethod
+    def fit(cls, df: pd.DataFrame, labels: np.ndarray, c: float = C, min_term_docs: int = MIN_TERM_DOCS,
+            embedding_cache: str = None, model_name: str = "all-MiniLM-L6-v2",
+            threshold: float = THRESHOLD, embeddings: dict = None) -> "GarbageScorer":
+        from sklearn.linear_model import LogisticRegression
+
+        labels = np.asarray(labels, dtype=np.int64)
+        if len(np.unique(labels)) < 2:
+            raise ValueError("Need both garbage (1) and clean (0) labels to train the scorer.")
+        triples = term_triples(df).drop_duplicates(["row", "term"])
+        doc_freq = triples["term"].value_counts()
+        vocab = sorted(doc_freq[doc_freq >= min_term_docs].index)
+
+        scorer = cls(vocab, None, None, None, 0.0, threshold, embedding_cache, model_name)
+        if embeddings is None:
+            embeddings = load_embedding_cache(embedding_cache, model_name)
+        raw = scorer.features(df, embeddings=embeddings)
+        n_dense = raw.shape[1] - len(vocab)
+        dense = raw[:, :n_dense].toarray()
+        scorer.mean = dense.mean(axis=0)
+        scorer.std = np.where(dense.std(axis=0) > 1e-12, dense.std(axis=0), 1.0)
+        x = sp.hstack([sp.csr_matrix((dense - scorer.mean) / scorer.std), raw[:, n_dense:]], format="csr")
+
+        model = LogisticRegression(C=c, max_iter=1000).fit(x, labels)
+        scorer.coef, scorer.intercept = model.coef_[0], float(model.intercept_[0])
+        scorer.train_scores = scorer.score(df, embeddings=embeddings)
+        return scorer
+
+    # ---------- scoring ----------
+    def score(self, df: pd.DataFrame, stats: pd.DataFrame = None, embeddings: dict = None) -> np.ndarray:
+        """Garbage probability per row: one sparse matrix-vector product over the whole frame."""
+        z = self.features(df, stats, embeddings) @ self.coef + self.intercept
+        return 1.0 / (1.0 + np.exp(-z))
+
+    def is_garbage(self, df: pd.DataFrame, threshold: float = None, stats: pd.DataFrame = None) -> np.ndarray:
+        return self.score(df, stats) >= (self.threshold if threshold is None else threshold)
+
+    def top_features(self, n: int = 10) -> pd.DataFrame:
+        weights = pd.Series(self.coef, index=self.feature_names)
+        order = weights.abs().sort_values(ascending=False).index[:n]
+        return weights.loc[order].rename("weight").to_frame()
+
+    # ---------- persistence ----------
+    def save(self, path: str = MODEL_PATH):
+        import joblib
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        joblib.dump({
+            "vocab": self.vocab, "mean": self.mean, "std": self.std, "coef": self.coef,
+            "intercept": self.intercept, "threshold": self.threshold,
+            "embedding_cache": self.embedding_cache, "model_name": self.model_name,
+            "train_scores": self.train_scores,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }, path)
+
+    @classmethod
+    def load(cls, path: str = MODEL_PATH) -> "GarbageScorer":
+        import joblib
+
+        b = joblib.load(path)
+        return cls(b["vocab"], b["mean"], b["std"], b["coef"], b["intercept"], b["threshold"],
+                   b["embedding_cache"], b["model_name"], b.get("train_scores"))
+
+
+# ---------- reports ----------
+def cross_val_scores(df: pd.DataFrame, labels: np.ndarray, folds: int = CV_FOLDS, seed: int = 42,
+                     embeddings: dict = None, **fit_kwargs):
+    """Out-of-fold garbage probabilities for the labelled rows (cached embeddings are read once for all folds)."""
+    from sklearn.model_selection import StratifiedKFold
+
+    labels = np.asarray(labels, dtype=np.int64)
+    folds = min(folds, int(np.bincount(labels).min()))
+    if folds < 2:
+        raise ValueError("Need at least two labelled rows of each class for cross-validation.")
+    if embeddings is None:
+        embeddings = load_embedding_cache(fit_kwargs.get("embedding_cache"),
+                                          fit_kwargs.get("model_name", "all-MiniLM-L6-v2"))
+    out = np.zeros(len(df))
+    for train, test in StratifiedKFold(folds, shuffle=True, random_state=seed).split(np.zeros(len(labels)), labels):
+        scorer = GarbageScorer.fit(df.iloc[train].reset_index(drop=True), labels[train], embeddings=embeddings,
+                                   **fit_kwargs)
+        out[test] = scorer.score(df.iloc[test].reset_index(drop=True), embeddings=embeddings)
+    return out
+
+
+def calibration_table(scores: np.ndarray, labels: np.ndarray, bins: int = CALIBRATION_BINS) -> pd.DataFrame:
+    """Reliability table: mean predicted vs observed garbage rate per score bin."""
+    edges = np.linspace(0, 1, bins + 1)
+    which = np.clip(np.digitize(scores, edges[1:-1]), 0, bins - 1)
+    table = pd.DataFrame({"bin": which, "score": scores, "label": labels}).groupby("bin").agg(
+        n=("label", "size"), mean_score=("score", "mean"), garbage_rate=("label", "mean"))
+    table.insert(0, "range", [f"{edges[b]:.1f}-{edges[b + 1]:.1f}" for b in table.index])
+    return table
+
+
+def calibration_summary(scores: np.ndarray, labels: np.ndarray, threshold: float = THRESHOLD) -> dict:
+    from sklearn.metrics import roc_auc_score
+
+    labels = np.asarray(labels, dtype=np.float64)
+    table = calibration_table(scores, labels)
+    pred = scores >= threshold
+    tp = float((pred & (labels == 1)).sum())
+    return {
+        "n_labelled": len(labels),
+        "garbage_rate": float(labels.mean()),
+        "auc": float(roc_auc_score(labels, scores)),
+        "brier": float(np.mean((scores - labels) ** 2)),
+        "ece": float((table["n"] * (table["mean_score"] - table["garbage_rate"]).abs()).sum() / len(labels)),
+        "precision": tp / max(pred.sum(), 1),
+        "recall": tp / max((labels == 1).sum(), 1),
+    }
+
+
+def population_stability(expected: np.ndarray, actual: np.ndarray, bins: int = CALIBRATION_BINS) -> float:
+    """PSI between two score distributions (training sample vs corpus); > 0.2 is a notable shift."""
+    edges = np.linspace(0, 1, bins + 1)
+    e = np.histogram(expected, edges)[0] / max(len(expected), 1)
+    a = np.histogram(actual, edges)[0] / max(len(actual), 1)
+    e, a = np.maximum(e, 1e-4), np.maximum(a, 1e-4)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+
+def rule_drift(learned: np.ndarray, rules: np.ndarray) -> dict:
+    """Agreement between the learned stage and the rule-based filter on the same rows."""
+    learned, rules = np.asarray(learned, bool), np.asarray(rules, bool)
+    n = max(len(learned), 1)
+    p_learned, p_rules = learned.mean() if len(learned) else 0.0, rules.mean() if len(rules) else 0.0
+    agree = float((learned == rules).mean()) if len(learned) else 1.0
+    expected = p_learned * p_rules + (1 - p_learned) * (1 - p_rules)
+    return {
+        "rows": len(learned),
+        "learned_garbage_rate": float(p_learned),
+        "rule_garbage_rate": float(p_rules),
+        "agreement": agree,
+        "kappa": float((agree - expected) / (1 - expected)) if expected < 1 else 1.0,
+        "learned_only": int((learned & ~rules).sum()),
+        "rules_only": int((rules & ~learned).sum()),
+        "learned_only_share": float((learned & ~rules).sum() / n),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train / apply the learned garbage scorer.")
+    parser.add_argument("--model", default=MODEL_PATH, help=f"Scorer bundle (default: {MODEL_PATH})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_train = sub.add_parser("train", help="Fit on the reviewed validation rows; report calibration")
+    p_train.add_argument("--labels", default=LABELS_PATH,
+                         help=f"Validation CSV with an {LABEL_COLUMN} column (default: {LABELS_PATH})")
+    p_train.add_argument("--threshold", type=float, default=THRESHOLD, help=f"Default: {THRESHOLD}")
+    p_train.add_argument("--C", type=float, default=C, help=f"Inverse L2 strength (default: {C})")
+    p_train.add_argument("--min_term_docs", type=int, default=MIN_TERM_DOCS, help=f"Default: {MIN_TERM_DOCS}")
+    p_train.add_argument("--embedding_cache", default=None,
+                         help="Also use the preview cache's embeddings, e.g. data/preview/cache")
+    p_train.add_argument("--model_name", default="all-MiniLM-L6-v2", help="Model of the cached embeddings")
+
+    p_score = sub.add_parser("score", help="Score a corpus; report drift against the rule-based filter")
+    p_score.add_argument("--input", required=True, help="Corpus, e.g. data/ganis_phase2_clean.csv")
+    p_score.add_argument("--output", default=None, help="Optional CSV: the input plus garbage_score")
+    p_score.add_argument("--threshold", type=float, default=None, help="Default: the bundle's threshold")
+    p_score.add_argument("--report", default=REPORT_PATH, help=f"Drift report CSV (default: {REPORT_PATH})")
+    args = parser.parse_args()
+
+    if args.command == "train":
+        df = load_table(args.labels)
+        if LABEL_COLUMN not in df.columns:
+            raise ValueError(f"{args.labels} has no '{LABEL_COLUMN}' column. Review the sample from "
+                             f"llm_validation_sample.py and mark each row 1 (garbage) or 0.")
+        labels = parse_labels(df[LABEL_COLUMN])
+        df = df[labels.notna()].reset_index(drop=True)
+        labels = labels.dropna().to_numpy(dtype=np.int64)
+        if len(labels) < MIN_LABELS:
+            raise ValueError(f"Only {len(labels)} labelled rows in {args.labels}; need at least {MIN_LABELS}.")
+        print(f"[INFO] {len(labels)} labelled rows ({labels.mean():.0%} garbage) from {args.labels}")
+
+        fit_kwargs = {"c": args.C, "min_term_docs": args.min_term_docs, "embedding_cache": args.embedding_cache,
+                      "model_name": args.model_name, "threshold": args.threshold}
+        embeddings = load_embedding_cache(args.embedding_cache, args.model_name)
+        oof = cross_val_scores(df, labels, embeddings=embeddings, **fit_kwargs)
+        summary = calibration_summary(oof, labels, args.threshold)
+        rules = rule_garbage(text_stats(df))
+        summary.update({f"rules_{k}": v for k, v in calibration_summary(rules.astype(float), labels, 0.5).items()
+                        if k in ("precision", "recall")})
+
+        scorer = GarbageScorer.fit(df, labels, embeddings=embeddings, **fit_kwargs)
+        scorer.save(args.model)
+        with pd.option_context("display.max_columns", None, "display.width", 200):
+            print(f"\n=== Out-of-fold calibration ({CV_FOLDS}-fold) ===")
+            print(calibration_table(oof, labels).round(3).to_string())
+            print(pd.Series(summary).round(4).to_string())
+            print("\n=== Largest weights ===")
+            print(scorer.top_features().round(3).to_string())
+        print(f"\n✅ Saved garbage scorer ({len(scorer.feature_names)} features, threshold {args.threshold}) "
+              f"to {args.model}")
+        return
+
+    scorer = GarbageScorer.load(args.model)
+    threshold = scorer.threshold if args.threshold is None else args.threshold
+    df = load_table(args.input)
+    start = time.perf_counter()
+    stats = text_stats(df)
+    scores = scorer.score(df, stats)
+    print(f"[INFO] Scored {len(df)} rows in {time.perf_counter() - start:.2f}s")
+
+    drift = rule_drift(scores >= threshold, rule_garbage(stats))
+    if scorer.train_scores is not None:
+        drift["score_psi_vs_training"] = population_stability(scorer.train_scores, scores)
+    drift["threshold"] = threshold
+    pd.DataFrame([drift]).to_csv(args.report, index=False)
+    print(pd.Series(drift).round(4).to_string())
+    print(f"[INFO] Saved drift report to {args.report}")
+
+    if args.output:
+        df[SCORE_COLUMN] = scores
+        df.to_csv(args.output, index=False)
+        print(f"✅ Saved scored corpus to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,31 @@
 import pandas as pd
 
 DATA_PATH = "data/ganis_phase2_clean.csv"
+CHUNK_SIZE = 5000
+
+# For full per-column statistics on large crawls use corpus_profiler.py
+
 
 def main():
-    df = pd.read_csv(DATA_PATH)
+    # Stream the file: only the sample rows and two count tables stay in memory
+    counts = {"the_country": pd.Series(dtype="int64"), "Labels": pd.Series(dtype="int64")}
+    head = None
+    for chunk in pd.read_csv(DATA_PATH, usecols=["the_country", "the_rank", "Labels"],
+                             chunksize=CHUNK_SIZE):
+        if head is None:
+            head = chunk.head(20)
+        for col in counts:
+            counts[col] = counts[col].add(chunk[col].value_counts(), fill_value=0)
 
     print("\n=== Sample rows ===")
-    print(df[["the_country", "the_rank", "Labels"]].head(20))
+    print(head)
 
     print("\n=== Unique countries (top 20) ===")
-    print(df["the_country"].value_counts().head(20))
+    print(counts["the_country"].astype(int).sort_values(ascending=False).head(20))
 
     print("\n=== Unique Labels (top 20) ===")
-    print(df["Labels"].value_counts().head(20))
+    print(counts["Labels"].astype(int).sort_values(ascending=False).head(20))
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,295 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from data_loader import load_table
+from phase4_split_by_rank import assign_rank_band
+from phase5_voice_assignment_multi import CLUSTER_VOICES, SCOPE_COLUMN, cluster_scope, label_key
+from phase6_ai_positioning_index import ALL_VOICES, DATASETS
+from snapshot_store import dataset_name
+
+# University-level view of the phase 5 output:
+#
+#   centroid      mean document embedding per the_name (unit length), pooled over the datasets
+#   voice shares  share of the institution's documents per voice
+#
+# Both come from one grouped reduction per embedding block: a sparse
+# institutions x documents indicator matrix times [embeddings | voice one-hot].
+# Similarity is the centroid cosine, optionally blended with the cosine of the
+# voice-share vectors (--voice_weight). The top-k graph is computed in row
+# blocks (block x institutions matmul + argpartition) and exported as Gephi /
+# Cytoscape node and edge CSVs; `similar` ranks any filtered set of
+# institutions against one of them straight from the saved centroids.
+
+INDEX_DIR = "data/semantic/institutions"
+MIN_DOCS = 3          # institutions with fewer documents get no centroid
+TOP_K = 10
+VOICE_WEIGHT = 0.0    # 0 = semantic centroids only
+BLOCK_SIZE = 1024     # institutions per similarity block
+VOICES = ALL_VOICES + ["Noise"]
+
+
+def document_voices(df: pd.DataFrame, prefix: str) -> pd.Series:
+    """voice per row: the file's own column, else CLUSTER_VOICES (unmapped = Noise)."""
+    if "voice" in df.columns:
+        voices = df["voice"].astype(object)
+    else:
+        voices = df["cluster_id"].map(CLUSTER_VOICES.get(label_key(prefix, cluster_scope(df)), {})).astype(object)
+    return voices.where(voices.notna(), "Noise")
+
+
+class InstitutionIndex:
+    def __init__(self, institutions: pd.DataFrame, centroids: np.ndarray, voices: list):
+        self.institutions = institutions    # one row per institution (index: the_name)
+        self.centroids = centroids          # unit-length, same row order
+        self.voices = list(voices)
+        shares = institutions[[f"share_{v}" for v in self.voices]].to_numpy(dtype=np.float32)
+        self.share_vectors = shares / np.maximum(np.linalg.norm(shares, axis=1, keepdims=True), 1e-12)
+
+    def __len__(self):
+        return len(self.institutions)
+
+    # ---------- building ----------
+    @classmethod
+    def build(cls, frames: dict, stores: dict, min_docs: int = MIN_DOCS) -> "InstitutionIndex":
+        """
+        frames: dataset -> DataFrame (the_name, the_country, the_rank, voice or cluster_id, file_name);
+        stores: dataset -> EmbeddingStore with the same rows (checked against doc_ids when it has them).
+        """
+        names = pd.Index(sorted(set().union(*(f["the_name"].dropna().astype(str) for f in frames.values()))))
+        voices = list(dict.fromkeys(VOICES + [v for n, f in frames.items() for v in document_voices(f, n)]))
+        dim = next(iter(stores.values())).dim
+        sums = np.zeros((len(names), dim + len(voices)), dtype=np.float64)
+
+        meta = []
+        for name, df in frames.items():
+            store = stores[name]
+            if store.n != len(df) or store.dim != dim:
+                raise ValueError(f"{name}: embedding store has {store.n} x {store.dim} rows but the file has "
+                                 f"{len(df)} rows (dim {dim}); pass the store written with this CSV.")
+            if "doc_ids" in store.arrays and "file_name" in df.columns and not np.array_equal(
+                    np.asarray(store.arrays["doc_ids"]).astype(str), df["file_name"].astype(str).to_numpy()):
+                raise ValueError(f"{name}: the embedding store's doc_ids do not match the file's file_name column "
+                                 f"(same row count, different rows); pass the store written with this CSV.")
+            inst = names.get_indexer(df["the_name"].astype(object).where(df["the_name"].notna(), None))
+            voice_code = pd.Categorical(document_voices(df, name), categories=voices).codes
+            for start, block in store.iter_blocks():
+                rows = np.flatnonzero(inst[start:start + len(block)] >= 0)
+                indicator = sp.csr_matrix((np.ones(len(rows)), (inst[start + rows], rows)),
+                                          shape=(len(names), len(block)))
+                onehot = np.zeros((len(block), len(voices)), dtype=np.float32)
+                onehot[np.arange(len(block)), voice_code[start:start + len(block)]] = 1.0
+                sums += indicator @ np.hstack([block, onehot])
+            meta.append(pd.DataFrame({
+                "the_name": df["the_name"].astype(object).to_numpy(),
+                "the_country": df["the_country"].astype(object).to_numpy() if "the_country" in df else None,
+                "the_rank": df["the_rank"].astype(object).to_numpy() if "the_rank" in df else None,
+                "dataset": name,
+            }))
+
+        counts = sums[:, dim:]
+        n_docs = counts.sum(axis=1)
+        keep = n_docs >= min_docs
+        centroids = sums[keep, :dim] / n_docs[keep, None]
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+        meta = pd.concat(meta, ignore_index=True).dropna(subset=["the_name"])
+        grouped = meta.groupby("the_name", sort=True)
+        institutions = pd.DataFrame({
+            "the_country": grouped["the_country"].first(),
+            "the_rank": grouped["the_rank"].first(),
+            "datasets": grouped["dataset"].agg(lambda s: ";".join(pd.unique(s))),
+        }).reindex(names)
+        institutions["rank_band"] = assign_rank_band(institutions["the_rank"]).to_numpy()
+        institutions["n_docs"] = n_docs.astype(int)
+        for j, v in enumerate(voices):
+            institutions[f"share_{v}"] = counts[:, j] / np.maximum(n_docs, 1)
+        institutions = institutions[keep]
+        institutions.index.name = "the_name"
+        return cls(institutions, centroids.astype(np.float32), voices)
+
+    # ---------- persistence ----------
+    def save(self, path: str = INDEX_DIR):
+        os.makedirs(path, exist_ok=True)
+        self.institutions.to_csv(os.path.join(path, "institutions.csv"))
+        np.save(os.path.join(path, "centroids.npy"), self.centroids)
+
+    @classmethod
+    def load(cls, path: str = INDEX_DIR) -> "InstitutionIndex":
+        institutions = pd.read_csv(os.path.join(path, "institutions.csv"), index_col="the_name")
+        voices = [c[len("share_"):] for c in institutions.columns if c.startswith("share_")]
+        return cls(institutions, np.load(os.path.join(path, "centroids.npy"), mmap_mode="r"), voices)
+
+    # ---------- similarity ----------
+    def similarity(self, rows, cols=None, voice_weight: float = VOICE_WEIGHT) -> np.ndarray:
+        """Similarity of the `rows` institutions to `cols` (default: all), blended with voice shares."""
+        cols = slice(None) if cols is None else cols
+        sims = np.asarray(self.centroids[rows]) @ np.asarray(self.centroids[cols]).T
+        if voice_weight:
+            sims = (1 - voice_weight) * sims + voice_weight * (self.share_vectors[rows] @ self.share_vectors[cols].T)
+        return sims
+
+    def top_k(self, k: int = TOP_K, voice_weight: float = VOICE_WEIGHT, block_size: int = BLOCK_SIZE):
+        """(indices, scores) of each institution's k most similar others, one row block at a time."""
+        n = len(self)
+        k = min(k, n - 1)
+        out_idx = np.zeros((n, max(k, 0)), dtype=np.int64)
+        out_score = np.zeros((n, max(k, 0)), dtype=np.float32)
+        if k <= 0:
+            return out_idx, out_score
+        for start in range(0, n, block_size):
+            sims = self.similarity(slice(start, start + block_size), voice_weight=voice_weight)
+            rows = np.arange(len(sims))
+            sims[rows, start + rows] = -np.inf  # not its own neighbour
+            part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(sims, part, axis=1)
+            order = np.argsort(-scores, axis=1, kind="stable")
+            out_idx[start:start + len(sims)] = np.take_along_axis(part, order, axis=1)
+            out_score[start:start + len(sims)] = np.take_along_axis(scores, order, axis=1)
+        return out_idx, out_score
+
+    def graph(self, k: int = TOP_K, voice_weight: float = VOICE_WEIGHT):
+        """(nodes, edges) for Gephi / Cytoscape: undirected top-k edges, mutual ones flagged."""
+        idx, score = self.top_k(k, voice_weight)
+        src = np.repeat(np.arange(len(self)), idx.shape[1])
+        dst, weight = idx.ravel(), score.ravel()
+        a, b = np.minimum(src, dst), np.maximum(src, dst)
+        edges = pd.DataFrame({"a": a, "b": b, "Weight": weight})
+        edges = edges.groupby(["a", "b"], sort=False).agg(Weight=("Weight", "max"), directions=("Weight", "size"))
+        edges = edges.reset_index()
+
+        names = self.institutions.index.to_numpy()
+        edges = pd.DataFrame({
+            "Source": names[edges["a"]],
+            "Target": names[edges["b"]],
+            "Weight": edges["Weight"].round(4),
+            "Type": "Undirected",
+            "mutual": edges["directions"] > 1,
+        }).sort_values("Weight", ascending=False)
+
+        nodes = self.institutions.reset_index().rename(columns={"the_name": "Id"})
+        nodes.insert(1, "Label", nodes["Id"])
+        share_cols = [f"share_{v}" for v in self.voices]
+        nodes["top_voice"] = np.asarray(self.voices)[nodes[share_cols].to_numpy().argmax(axis=1)]
+        return nodes, edges
+
+    # ---------- lookup ----------
+    def find(self, name: str) -> int:
+        """Row of an institution: exact name, else a unique case-insensitive substring match."""
+        names = self.institutions.index
+        if name in names:
+            return names.get_loc(name)
+        hits = np.flatnonzero(names.str.lower().str.contains(name.lower(), regex=False))
+        if len(hits) != 1:
+            options = ", ".join(names[hits[:10]]) if len(hits) else "none"
+            raise ValueError(f"'{name}' matches {len(hits)} institutions ({options}); use the full name.")
+        return int(hits[0])
+
+    def candidates(self, countries=None, rank_bands=None, min_rank=None, max_rank=None) -> np.ndarray:
+        inst = self.institutions
+        mask = np.ones(len(inst), dtype=bool)
+        if countries:
+            mask &= inst["the_country"].isin(countries).to_numpy()
+        if rank_bands:
+            mask &= inst["rank_band"].isin(rank_bands).to_numpy()
+        if min_rank is not None or max_rank is not None:
+            rank = pd.to_numeric(inst["the_rank"], errors="coerce").to_numpy()
+            mask &= (rank >= (min_rank if min_rank is not None else -np.inf)) & \
+                    (rank <= (max_rank if max_rank is not None else np.inf))
+        return np.flatnonzero(mask)
+
+    def similar(self, name: str, k: int = TOP_K, voice_weight: float = VOICE_WEIGHT, **filters) -> pd.DataFrame:
+        """The k institutions most similar to `name` among those passing the country / rank filters."""
+        row = self.find(name)
+        cand = self.candidates(**filters)
+        cand = cand[cand != row]
+        scores = self.similarity([row], cand, voice_weight)[0] if len(cand) else np.empty(0)
+        top = np.argsort(-scores, kind="stable")[:k]
+        out = self.institutions.iloc[cand[top]][["the_country", "the_rank", "rank_band", "n_docs"]].copy()
+        out.insert(0, "similarity", scores[top].round(4))
+        share_cols = [f"share_{v}" for v in self.voices]
+        out["top_voice"] = np.asarray(self.voices)[
+            self.institutions.iloc[cand[top]][share_cols].to_numpy().argmax(axis=1)] if len(top) else []
+        return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Institution centroids, top-k similarity graph and lookup.")
+    parser.add_argument("--index", default=INDEX_DIR, help=f"Index directory (default: {INDEX_DIR})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="Centroids + voice shares per institution, then the top-k graph")
+    p_build.add_argument("--files", nargs="*", default=None,
+                         help="*_with_voice.csv (or *_semantic.csv) files (default: the four phase 6 datasets)")
+    p_build.add_argument("--embeddings", nargs="*", default=None,
+                         help="Embedding stores, one per file (default: <dir>/<dataset>_embeddings)")
+    p_build.add_argument("--min_docs", type=int, default=MIN_DOCS, help=f"Default: {MIN_DOCS}")
+    p_build.add_argument("--k", type=int, default=TOP_K, help=f"Neighbours per institution (default: {TOP_K})")
+    p_build.add_argument("--voice_weight", type=float, default=VOICE_WEIGHT,
+                         help=f"Weight of voice-share similarity in the graph (default: {VOICE_WEIGHT})")
+
+    p_similar = sub.add_parser("similar", help="Institutions most similar to one institution")
+    p_similar.add_argument("name", help="Institution (the_name, or a unique part of it)")
+    p_similar.add_argument("--k", type=int, default=TOP_K, help=f"Number of results (default: {TOP_K})")
+    p_similar.add_argument("--country", nargs="+", default=None, help="Keep only these the_country values")
+    p_similar.add_argument("--rank_band", nargs="+", default=None, help="Keep only these rank bands (top50, mid, ...)")
+    p_similar.add_argument("--min_rank", type=float, default=None)
+    p_similar.add_argument("--max_rank", type=float, default=None)
+    p_similar.add_argument("--voice_weight", type=float, default=VOICE_WEIGHT,
+                           help=f"Weight of voice-share similarity (default: {VOICE_WEIGHT})")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        from embedding_store import EmbeddingStore
+
+        paths = {dataset_name(p): p for p in args.files} if args.files else DATASETS
+        if args.embeddings and len(args.embeddings) != len(paths):
+            raise ValueError(f"Got {len(args.embeddings)} --embeddings for {len(paths)} files.")
+        frames, stores = {}, {}
+        for i, (name, path) in enumerate(paths.items()):
+            store_dir = args.embeddings[i] if args.embeddings else \
+                os.path.join(os.path.dirname(path), f"{name}_embeddings")
+            if not os.path.exists(path) or not os.path.exists(os.path.join(store_dir, "meta.json")):
+                print(f"WARNING: {path} or its embedding store {store_dir} not found. Skipping.")
+                continue
+            frames[name] = load_table(path, columns=["the_name", "the_country", "the_rank", "voice", "cluster_id",
+                                                       "file_name", SCOPE_COLUMN])
+            stores[name] = EmbeddingStore.load(store_dir)
+            print(f"[INFO] {name}: {len(frames[name])} docs, {stores[name].encoding} embeddings from {store_dir}")
+        if not frames:
+            print("ERROR: No datasets with embeddings found.")
+            return
+
+        start = time.perf_counter()
+        index = InstitutionIndex.build(frames, stores, args.min_docs)
+        index.save(args.index)
+        print(f"[INFO] {len(index)} institutions with >= {args.min_docs} docs "
+              f"({time.perf_counter() - start:.2f}s)")
+
+        start = time.perf_counter()
+        nodes, edges = index.graph(args.k, args.voice_weight)
+        nodes.to_csv(os.path.join(args.index, "nodes.csv"), index=False)
+        edges.to_csv(os.path.join(args.index, "edges.csv"), index=False)
+        print(f"[INFO] Top-{args.k} graph: {len(edges)} edges ({edges['mutual'].mean():.0%} mutual) "
+              f"in {time.perf_counter() - start:.2f}s")
+        print(f"✅ Saved institution index, nodes.csv and edges.csv (Gephi / Cytoscape) to {args.index}")
+        return
+
+    index = InstitutionIndex.load(args.index)
+    start = time.perf_counter()
+    out = index.similar(args.name, args.k, args.voice_weight, countries=args.country, rank_bands=args.rank_band,
+                        min_rank=args.min_rank, max_rank=args.max_rank)
+    elapsed = (time.perf_counter() - start) * 1000
+    target = index.institutions.index[index.find(args.name)]
+    print(f"[INFO] {len(out)} most similar to {target} among {len(index)} institutions ({elapsed:.1f} ms)")
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(out)
+
+
+if __name__ == "__main__":
+    main()
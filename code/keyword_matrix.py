@@ -0,0 +1,232 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from data_loader import load_table
+from snapshot_store import dataset_name
+
+# Sparse document-term matrix built from the per-row keyword columns:
+#
+#   keywords_list   "a;b;c"              -> kw:<term>   (1 per document)
+#   top_unigrams    "term:count;..."     -> uni:<term>  (count)
+#   top_bigrams     "term term:count;.." -> bi:<term>
+#   top_trigrams                         -> tri:<term>
+#
+# Stored as <dir>/matrix.npz (CSR), <dir>/vocab.json (term list, position = column,
+# only ever appended to) and <dir>/docs.csv (one row per matrix row).
+
+MATRIX_DIR = "data/keyword_matrix"
+
+TERM_FIELDS = {
+    "kw": ("keywords_list", False),
+    "uni": ("top_unigrams", True),
+    "bi": ("top_bigrams", True),
+    "tri": ("top_trigrams", True),
+}
+DOC_COLUMNS = ["dataset", "file_name", "the_name", "the_country", "Labels", "cluster_id", "voice",
+               "keyword_presence"]
+
+MIN_KEYWORDS = 1
+
+
+def parse_terms(col: pd.Series, weighted: bool) -> pd.DataFrame:
+    """Explode a ';'-separated column into (row, term, count) triples; row is the position in col."""
+    values = pd.Series(col.astype(object).where(col.notna(), None).to_numpy(), dtype=object)
+    parts = values.str.split(";").explode().dropna().str.strip()
+    parts = parts[parts != ""]
+    if weighted:
+        split = parts.str.rsplit(":", n=1, expand=True).reindex(columns=[0, 1])
+        terms = split[0].str.strip()
+        counts = pd.to_numeric(split[1], errors="coerce").fillna(1.0)
+    else:
+        terms = parts.str.lower()
+        counts = pd.Series(1.0, index=parts.index)
+    return pd.DataFrame({"row": parts.index.to_numpy(), "term": terms.to_numpy(), "count": counts.to_numpy()})
+
+
+def keyword_counts(df: pd.DataFrame) -> np.ndarray:
+    """Distinct keywords_list terms per row."""
+    if "keywords_list" not in df.columns:
+        return np.zeros(len(df), dtype=np.int64)
+    triples = parse_terms(df["keywords_list"], weighted=False).drop_duplicates(["row", "term"])
+    return np.bincount(triples["row"].to_numpy(dtype=np.int64), minlength=len(df))
+
+
+def relevance_mask(df: pd.DataFrame, min_keywords: int = MIN_KEYWORDS) -> np.ndarray:
+    """
+    Cheap pre-embedding filter: keyword_presence == "yes" and at least
+    min_keywords AI keywords in keywords_list.
+    """
+    keep = np.ones(len(df), dtype=bool)
+    if "keyword_presence" in df.columns:
+        keep &= (df["keyword_presence"].astype(str).str.lower() == "yes").to_numpy()
+    return keep & (keyword_counts(df) >= min_keywords)
+
+
+class KeywordMatrix:
+    def __init__(self, matrix: sp.csr_matrix, vocab: list, docs: pd.DataFrame):
+        self.matrix = matrix.tocsr()
+        self.vocab = list(vocab)
+        self.docs = docs.reset_index(drop=True)
+
+    # ---------- building ----------
+    @classmethod
+    def empty(cls) -> "KeywordMatrix":
+        return cls(sp.csr_matrix((0, 0), dtype=np.float32), [], pd.DataFrame(columns=DOC_COLUMNS))
+
+    def add(self, df: pd.DataFrame, dataset: str = None):
+        """Append the rows of df, extending the vocabulary with unseen terms."""
+        index = {t: i for i, t in enumerate(self.vocab)}
+        parts = []
+        for prefix, (column, weighted) in TERM_FIELDS.items():
+            if column in df.columns:
+                triples = parse_terms(df[column], weighted)
+                triples["term"] = prefix + ":" + triples["term"]
+                parts.append(triples)
+        triples = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=["row", "term", "count"])
+
+        for term in pd.unique(triples["term"]):
+            if term not in index:
+                index[term] = len(self.vocab)
+                self.vocab.append(term)
+
+        cols = triples["term"].map(index).to_numpy(dtype=np.int64)
+        new = sp.csr_matrix(
+            (triples["count"].to_numpy(dtype=np.float32), (triples["row"].to_numpy(dtype=np.int64), cols)),
+            shape=(len(df), len(self.vocab)),
+        )
+        old = self.matrix
+        old.resize((old.shape[0], len(self.vocab)))
+        self.matrix = sp.vstack([old, new], format="csr")
+
+        docs = df.reindex(columns=DOC_COLUMNS).astype(object).reset_index(drop=True)
+        if dataset is not None:
+            docs["dataset"] = dataset
+        self.docs = pd.concat([self.docs, docs], ignore_index=True) if len(self.docs) else docs
+        return self
+
+    # ---------- persistence ----------
+    def save(self, path: str = MATRIX_DIR):
+        os.makedirs(path, exist_ok=True)
+        sp.save_npz(os.path.join(path, "matrix.npz"), self.matrix)
+        with open(os.path.join(path, "vocab.json"), "w", encoding="utf-8") as f:
+            json.dump(self.vocab, f)
+        self.docs.to_csv(os.path.join(path, "docs.csv"), index=False)
+
+    @classmethod
+    def load(cls, path: str = MATRIX_DIR) -> "KeywordMatrix":
+        with open(os.path.join(path, "vocab.json"), encoding="utf-8") as f:
+            vocab = json.load(f)
+        docs = pd.read_csv(os.path.join(path, "docs.csv"), dtype={"cluster_id": "Int64"})
+        return cls(sp.load_npz(os.path.join(path, "matrix.npz")), vocab, docs)
+
+    # ---------- analytics ----------
+    def _columns(self, field: str) -> np.ndarray:
+        if field not in TERM_FIELDS:
+            raise ValueError(f"Unknown field '{field}'. Use one of {list(TERM_FIELDS)}.")
+        return np.flatnonzero([t.startswith(field + ":") for t in self.vocab])
+
+    def _binary(self, field: str):
+        cols = self._columns(field)
+        x = self.matrix[:, cols].tocsr()
+        x.data = np.ones_like(x.data)
+        return x, [self.vocab[c].split(":", 1)[1] for c in cols]
+
+    def _groups(self, by: str):
+        if by not in self.docs.columns:
+            raise ValueError(f"Column '{by}' not found in the matrix documents.")
+        keys = self.docs[by].astype(str).where(self.docs[by].notna(), "<NA>")
+        codes, groups = pd.factorize(keys, sort=True)
+        indicator = sp.csr_matrix((np.ones(len(codes), dtype=np.float32), (np.arange(len(codes)), codes)),
+                                  shape=(len(codes), len(groups)))
+        return indicator, list(groups)
+
+    def share_by(self, by: str = "voice", field: str = "kw") -> pd.DataFrame:
+        """% of the documents of each group that contain each term (terms x groups)."""
+        x, terms = self._binary(field)
+        g, groups = self._groups(by)
+        hits = np.asarray((g.T @ x).todense(), dtype=np.float64).T   # terms x groups
+        sizes = np.asarray(g.sum(axis=0)).ravel()
+        return pd.DataFrame(hits / np.maximum(sizes, 1) * 100, index=terms, columns=groups)
+
+    def lift(self, by: str = "cluster_id", field: str = "kw", min_docs: int = 5) -> pd.DataFrame:
+        """P(term | group) / P(term) per group; terms in fewer than min_docs documents are dropped."""
+        x, terms = self._binary(field)
+        g, groups = self._groups(by)
+        hits = np.asarray((g.T @ x).todense(), dtype=np.float64).T
+        sizes = np.asarray(g.sum(axis=0)).ravel()
+        df_t = hits.sum(axis=1)
+        base = df_t / max(x.shape[0], 1)
+        lift = (hits / np.maximum(sizes, 1)) / np.maximum(base, 1e-12)[:, None]
+        out = pd.DataFrame(lift, index=terms, columns=groups)
+        return out[df_t >= min_docs]
+
+    def cooccurrence(self, field: str = "kw", top: int = 20, min_count: int = 2) -> pd.DataFrame:
+        """Most frequent term pairs (documents containing both), with Jaccard similarity."""
+        x, terms = self._binary(field)
+        co = sp.triu(x.T @ x, k=1).tocoo()
+        keep = co.data >= min_count
+        rows, cols, counts = co.row[keep], co.col[keep], co.data[keep]
+        df_t = np.asarray(x.sum(axis=0)).ravel()
+        jaccard = counts / (df_t[rows] + df_t[cols] - counts)
+        order = np.argsort(-counts, kind="stable")[:top]
+        return pd.DataFrame({
+            "term_a": [terms[i] for i in rows[order]],
+            "term_b": [terms[i] for i in cols[order]],
+            "documents": counts[order].astype(int),
+            "jaccard": np.round(jaccard[order], 4),
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sparse keyword / n-gram matrix and voice analytics.")
+    parser.add_argument("--matrix", default=MATRIX_DIR, help=f"Matrix directory (default: {MATRIX_DIR})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="Parse the keyword columns of one or more CSVs")
+    p_build.add_argument("--input", nargs="+", required=True, help="e.g. data/semantic/*_with_voice.csv")
+    p_build.add_argument("--append", action="store_true", help="Add to the existing matrix (keeps the vocabulary)")
+
+    for name, default_by, help_text in [("share", "voice", "Keyword share (%% of documents) per group"),
+                                        ("lift", "cluster_id", "Keyword lift per group")]:
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("--by", default=default_by, help=f"Group column (default: {default_by})")
+        p.add_argument("--field", default="kw", choices=list(TERM_FIELDS))
+        p.add_argument("--top", type=int, default=15, help="Terms per group (default: 15)")
+
+    p_cooc = sub.add_parser("cooc", help="Most frequent co-occurring term pairs")
+    p_cooc.add_argument("--field", default="kw", choices=list(TERM_FIELDS))
+    p_cooc.add_argument("--top", type=int, default=20)
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        km = KeywordMatrix.load(args.matrix) if args.append and os.path.exists(args.matrix) else KeywordMatrix.empty()
+        for path in args.input:
+            df = load_table(path)
+            km.add(df, dataset=dataset_name(path))
+            print(f"[INFO] {path}: {len(df)} rows")
+        km.save(args.matrix)
+        density = km.matrix.nnz / max(np.prod(km.matrix.shape), 1)
+        print(f"✅ Saved {km.matrix.shape[0]} x {km.matrix.shape[1]} matrix ({km.matrix.nnz} non-zeros, "
+              f"density {density:.4%}) to {args.matrix}")
+        return
+
+    km = KeywordMatrix.load(args.matrix)
+    if args.command == "cooc":
+        print(km.cooccurrence(args.field, top=args.top).to_string(index=False))
+        return
+
+    table = km.share_by(args.by, args.field) if args.command == "share" else km.lift(args.by, args.field)
+    for group in table.columns:
+        top = table[group].sort_values(ascending=False).head(args.top).round(2)
+        print(f"\n=== {args.by} = {group} ({args.command}) ===")
+        print(top.to_string())
+
+
+if __name__ == "__main__":
+    main()
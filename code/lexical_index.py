@@ -0,0 +1,376 @@
+import argparse
+import json
+import os
+import re
+import shutil
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from data_loader import load_table
+from snapshot_store import content_hash
+from stratified_sampler import add_rank_band
+
+# Persistent BM25 index over Title + content_text, stored as append-only segments:
+#
+#   <index>/meta.json            segment list + BM25 settings
+#   <index>/vocab.json           term list (position = term id, only ever appended to)
+#   <index>/seg_NNNNN/
+#       postings.npz             CSR postings: indptr (per term id), doc (local doc id), tf
+#       doc_len.npy              tokens per document (title tokens counted TITLE_BOOST times)
+#       docs.csv                 doc key, Title, url, the_name, filter fields (display metadata only)
+#       keys.npy                 doc keys (content hashes), read by add() to find known documents
+#       text.bin + text_offsets.npy   content_text as UTF-8, read only for the returned hits' snippets
+#       bitmaps.npz              per filter field: distinct values + one packed bitmap per value
+#
+# Adding documents writes a new segment (and rewrites docs.csv / bitmaps.npz of the
+# segments whose known documents come back with changed filter fields); compact()
+# merges all segments into one.
+
+INDEX_DIR = "data/lexical_index"
+
+FILTER_FIELDS = ["the_country", "rank_band", "Labels", "cluster_id", "voice"]
+DOC_COLUMNS = ["doc_key", "Title", "url", "the_name"] + FILTER_FIELDS
+
+TITLE_BOOST = 2      # title tokens count twice
+BM25_K1 = 1.2
+BM25_B = 0.75
+SNIPPET_WORDS = 30
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text) -> list:
+    if not isinstance(text, str):
+        if pd.isna(text):
+            return []
+        text = str(text)
+    return [t for t in TOKEN_RE.findall(text.lower()) if len(t) > 1 or t.isdigit()]
+
+
+def _field_values(df: pd.DataFrame, field: str) -> np.ndarray:
+    if field not in df.columns:
+        return np.full(len(df), "<NA>", dtype=object)
+    col = df[field]
+    return col.astype(str).where(col.notna(), "<NA>").to_numpy(dtype=object)
+
+
+def _build_bitmaps(docs: pd.DataFrame) -> dict:
+    """field -> (distinct values, packed bitmap per value) over the rows of docs."""
+    bitmaps = {}
+    for field in FILTER_FIELDS:
+        vals = _field_values(docs, field)
+        uniq, inv = np.unique(vals.astype(str), return_inverse=True)
+        dense = np.zeros((len(uniq), len(docs)), dtype=bool)
+        dense[inv, np.arange(len(docs))] = True
+        bitmaps[field] = (uniq, np.packbits(dense, axis=1))
+    return bitmaps
+
+
+def _save_bitmaps(path: str, bitmaps: dict):
+    np.savez(os.path.join(path, "bitmaps.npz"),
+             **{f"{f}__values": v for f, (v, _) in bitmaps.items()},
+             **{f"{f}__bits": b for f, (_, b) in bitmaps.items()})
+
+
+class Segment:
+    def __init__(self, path: str, indptr, doc, tf, doc_len, bitmaps: dict):
+        self.path = path
+        self.indptr, self.doc, self.tf = indptr, doc, tf
+        self.doc_len = doc_len
+        self.bitmaps = bitmaps  # field -> (values, packed bits of shape (n_values, ceil(n / 8)))
+        self._docs = None
+        self._offsets = None
+
+    @property
+    def n(self) -> int:
+        return len(self.doc_len)
+
+    def postings(self, term_id: int):
+        if term_id >= len(self.indptr) - 1:
+            return self.doc[:0], self.tf[:0]
+        start, stop = self.indptr[term_id], self.indptr[term_id + 1]
+        return self.doc[start:stop], self.tf[start:stop]
+
+    def mask(self, filters: dict) -> np.ndarray:
+        """AND across fields, OR across the values of one field."""
+        keep = np.ones(self.n, dtype=bool)
+        for field, wanted in (filters or {}).items():
+            if field not in self.bitmaps:
+                raise ValueError(f"Unknown filter field '{field}'. Use any of {FILTER_FIELDS}.")
+            values, bits = self.bitmaps[field]
+            rows = np.flatnonzero(np.isin(values, [str(w) for w in wanted]))
+            hit = np.bitwise_or.reduce(bits[rows], axis=0) if len(rows) else np.zeros(bits.shape[1], np.uint8)
+            keep &= np.unpackbits(hit, count=self.n).astype(bool)
+        return keep
+
+    def docs(self) -> pd.DataFrame:
+        if self._docs is None:
+            self._docs = pd.read_csv(os.path.join(self.path, "docs.csv"), dtype=str, keep_default_na=False)
+        return self._docs
+
+    def keys(self) -> np.ndarray:
+        return np.load(os.path.join(self.path, "keys.npy"))
+
+    def refresh(self, fields: pd.DataFrame) -> int:
+        """
+        Overwrite the filter fields of this segment's documents with `fields`
+        (indexed by doc key, "<NA>" for missing) where they changed, e.g. after a
+        re-cluster, and rewrite docs.csv and the bitmaps. Returns how many changed.
+        """
+        docs = self.docs()
+        rows = np.flatnonzero(docs["doc_key"].isin(fields.index).to_numpy())
+        if not len(rows):
+            return 0
+        new = fields.loc[docs["doc_key"].iloc[rows]]
+        changed = np.zeros(len(rows), dtype=bool)
+        for field in fields.columns:
+            changed |= docs[field].iloc[rows].to_numpy() != new[field].to_numpy()
+        if not changed.any():
+            return 0
+
+        docs = docs.copy()
+        for field in fields.columns:
+            docs.loc[docs.index[rows[changed]], field] = new[field].to_numpy()[changed]
+        docs.to_csv(os.path.join(self.path, "docs.csv"), index=False)
+        self.bitmaps = _build_bitmaps(docs)
+        _save_bitmaps(self.path, self.bitmaps)
+        self._docs = docs
+        return int(changed.sum())
+
+    def text(self, i: int) -> str:
+        """content_text of local doc i, read from its byte range in text.bin."""
+        if self._offsets is None:
+            self._offsets = np.load(os.path.join(self.path, "text_offsets.npy"), mmap_mode="r")
+        start, stop = int(self._offsets[i]), int(self._offsets[i + 1])
+        with open(os.path.join(self.path, "text.bin"), "rb") as f:
+            f.seek(start)
+            return f.read(stop - start).decode("utf-8")
+
+    def texts(self) -> list:
+        offsets = np.load(os.path.join(self.path, "text_offsets.npy"))
+        with open(os.path.join(self.path, "text.bin"), "rb") as f:
+            blob = f.read()
+        return [blob[a:b].decode("utf-8") for a, b in zip(offsets[:-1], offsets[1:])]
+
+    @classmethod
+    def load(cls, path: str) -> "Segment":
+        post = np.load(os.path.join(path, "postings.npz"))
+        bm = np.load(os.path.join(path, "bitmaps.npz"), allow_pickle=False)
+        bitmaps = {f: (bm[f"{f}__values"], bm[f"{f}__bits"]) for f in FILTER_FIELDS}
+        return cls(path, post["indptr"], post["doc"], post["tf"], np.load(os.path.join(path, "doc_len.npy")), bitmaps)
+
+    @classmethod
+    def build(cls, path: str, docs: pd.DataFrame, vocab: dict) -> "Segment":
+        """Tokenize docs (extending vocab in place) and write the segment to path."""
+        term_ids, doc_ids, tfs = [], [], []
+        doc_len = np.zeros(len(docs), dtype=np.float32)
+        for i, (title, body) in enumerate(zip(docs["Title"], docs["content_text"])):
+            counts = Counter(tokenize(body))
+            for tok in tokenize(title):
+                counts[tok] += TITLE_BOOST
+            doc_len[i] = sum(counts.values())
+            for tok, c in counts.items():
+                term_ids.append(vocab.setdefault(tok, len(vocab)))
+                doc_ids.append(i)
+                tfs.append(c)
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids, kind="stable")  # stable: doc ids stay sorted within a term
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(term_ids, minlength=len(vocab)))
+        doc = np.asarray(doc_ids, dtype=np.int32)[order]
+        tf = np.asarray(tfs, dtype=np.float32)[order]
+
+        bitmaps = _build_bitmaps(docs)
+
+        os.makedirs(path, exist_ok=True)
+        np.savez(os.path.join(path, "postings.npz"), indptr=indptr, doc=doc, tf=tf)
+        np.save(os.path.join(path, "doc_len.npy"), doc_len)
+        _save_bitmaps(path, bitmaps)
+        out = docs.copy()
+        for field in FILTER_FIELDS:
+            out[field] = _field_values(docs, field)
+        out.reindex(columns=DOC_COLUMNS).to_csv(os.path.join(path, "docs.csv"), index=False)
+        np.save(os.path.join(path, "keys.npy"), docs["doc_key"].astype(str).to_numpy(dtype="U"))
+        body = [("" if pd.isna(t) else str(t)).encode("utf-8") for t in docs["content_text"]]
+        offsets = np.zeros(len(body) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(t) for t in body])
+        with open(os.path.join(path, "text.bin"), "wb") as f:
+            f.write(b"".join(body))
+        np.save(os.path.join(path, "text_offsets.npy"), offsets)
+        return cls(path, indptr, doc, tf, doc_len, bitmaps)
+
+
+class LexicalIndex:
+    def __init__(self, root: str = INDEX_DIR):
+        self.root = root
+        self.meta = {"segments": [], "k1": BM25_K1, "b": BM25_B, "title_boost": TITLE_BOOST}
+        self.vocab = {}
+        self.segments = []
+        if os.path.exists(os.path.join(root, "meta.json")):
+            with open(os.path.join(root, "meta.json"), encoding="utf-8") as f:
+                self.meta = json.load(f)
+            with open(os.path.join(root, "vocab.json"), encoding="utf-8") as f:
+                self.vocab = {t: i for i, t in enumerate(json.load(f))}
+            self.segments = [Segment.load(os.path.join(root, s)) for s in self.meta["segments"]]
+
+    @property
+    def n_docs(self) -> int:
+        return sum(s.n for s in self.segments)
+
+    def _keys(self) -> set:
+        return set().union(*(s.keys().tolist() for s in self.segments)) if self.segments else set()
+
+    def _save_meta(self):
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, "vocab.json"), "w", encoding="utf-8") as f:
+            json.dump(sorted(self.vocab, key=self.vocab.get), f)
+        with open(os.path.join(self.root, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, indent=2)
+
+    def add(self, df: pd.DataFrame) -> int:
+        """
+        Index the documents of df that are not in the index yet (by content hash)
+        and refresh the filter fields (voice, cluster_id, ...) of those that are.
+        Returns how many documents were added.
+        """
+        docs = add_rank_band(df).copy()
+        docs["doc_key"] = content_hash(docs).values
+        docs = docs.drop_duplicates("doc_key")
+        known = docs["doc_key"].isin(self._keys()).to_numpy()
+        fields = [f for f in FILTER_FIELDS if f in docs.columns]
+        if known.any() and fields:
+            updates = pd.DataFrame({f: _field_values(docs[known], f) for f in fields},
+                                   index=docs["doc_key"][known].to_numpy())
+            refreshed = sum(seg.refresh(updates) for seg in self.segments)
+            if refreshed:
+                print(f"[INFO] Refreshed the filter fields of {refreshed} already indexed documents.")
+        docs = docs[~known].reset_index(drop=True)
+        if docs.empty:
+            return 0
+        for col in ["Title", "content_text"]:
+            if col not in docs.columns:
+                docs[col] = ""
+
+        name = f"seg_{len(self.meta['segments']):05d}"
+        while os.path.exists(os.path.join(self.root, name)):
+            name += "_"
+        self.segments.append(Segment.build(os.path.join(self.root, name), docs, self.vocab))
+        self.meta["segments"].append(name)
+        self._save_meta()
+        return len(docs)
+
+    def compact(self):
+        """Merge all segments into one (same documents, same scores)."""
+        if len(self.segments) <= 1:
+            return
+        docs = pd.concat([s.docs().assign(content_text=s.texts()) for s in self.segments], ignore_index=True)
+        docs = docs.replace({"<NA>": None, "": None})
+        old = [s.path for s in self.segments]
+        name = f"seg_{len(self.meta['segments']):05d}"
+        merged = Segment.build(os.path.join(self.root, name), docs, self.vocab)
+        self.segments, self.meta["segments"] = [merged], [name]
+        self._save_meta()
+        for path in old:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def search(self, query: str, k: int = 10, filters: dict = None) -> pd.DataFrame:
+        """Top-k BM25 matches for query, restricted by filters ({field: [values]})."""
+        terms = [self.vocab[t] for t in dict.fromkeys(tokenize(query)) if t in self.vocab]
+        n = self.n_docs
+        if not terms or n == 0:
+            return pd.DataFrame(columns=["score"] + DOC_COLUMNS + ["snippet"])
+
+        k1, b = self.meta["k1"], self.meta["b"]
+        avgdl = float(sum(s.doc_len.sum() for s in self.segments)) / n
+        df_t = np.array([sum(len(s.postings(t)[0]) for s in self.segments) for t in terms], dtype=np.float64)
+        idf = np.log1p((n - df_t + 0.5) / (df_t + 0.5))
+
+        hits = []
+        for seg_no, seg in enumerate(self.segments):
+            scores = np.zeros(seg.n, dtype=np.float64)
+            norm = k1 * (1 - b + b * seg.doc_len / avgdl)
+            for w, t in zip(idf, terms):
+                doc, tf = seg.postings(t)
+                scores[doc] += w * tf * (k1 + 1) / (tf + norm[doc])
+            scores[~seg.mask(filters)] = 0.0
+            top = np.flatnonzero(scores > 0)
+            if len(top) > k:
+                top = top[np.argpartition(-scores[top], k - 1)[:k]]
+            hits.extend((scores[i], seg_no, i) for i in top)
+
+        hits = sorted(hits, key=lambda h: -h[0])[:k]
+        words = set(tokenize(query))
+        rows = []
+        for score, seg_no, i in hits:
+            seg = self.segments[seg_no]
+            doc = seg.docs().iloc[i]
+            row = {"score": round(float(score), 4)}
+            row.update({c: doc[c] for c in DOC_COLUMNS})
+            row["snippet"] = snippet(seg.text(i), words)
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+
+def snippet(text: str, words: set, width: int = SNIPPET_WORDS) -> str:
+    """Window of `width` words around the first query hit, hits wrapped in **...**."""
+    tokens = str(text).split()
+    first = next((i for i, t in enumerate(tokens) if set(tokenize(t)) & words), 0)
+    start = max(first - width // 3, 0)
+    window = [f"**{t}**" if set(tokenize(t)) & words else t for t in tokens[start:start + width]]
+    return ("... " if start else "") + " ".join(window) + (" ..." if start + width < len(tokens) else "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BM25 lexical search over Title + content_text with metadata filters.")
+    parser.add_argument("--index", default=INDEX_DIR, help=f"Index directory (default: {INDEX_DIR})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_add = sub.add_parser("add", help="Index new documents (creates the index if needed)")
+    p_add.add_argument("--input", nargs="+", required=True, help="CSV files, e.g. data/semantic/*_with_voice.csv")
+    p_add.add_argument("--rebuild", action="store_true", help="Drop the existing index first")
+
+    sub.add_parser("compact", help="Merge all segments into one")
+
+    p_search = sub.add_parser("search", help="Ranked search with snippets")
+    p_search.add_argument("query")
+    p_search.add_argument("--k", type=int, default=10, help="Number of results (default: 10)")
+    for field in FILTER_FIELDS:
+        p_search.add_argument(f"--{field}", nargs="+", default=None, help=f"Keep only these {field} values")
+
+    args = parser.parse_args()
+
+    if args.command == "add":
+        if args.rebuild and os.path.exists(args.index):
+            shutil.rmtree(args.index)
+        index = LexicalIndex(args.index)
+        for path in args.input:
+            start = time.perf_counter()
+            added = index.add(load_table(path))
+            print(f"[INFO] {path}: indexed {added} new documents in {time.perf_counter() - start:.1f}s")
+        print(f"✅ Index {args.index}: {index.n_docs} documents, {len(index.vocab)} terms, "
+              f"{len(index.segments)} segment(s)")
+        return
+
+    index = LexicalIndex(args.index)
+    if args.command == "compact":
+        index.compact()
+        print(f"✅ Compacted {args.index} into 1 segment ({index.n_docs} documents)")
+        return
+
+    filters = {f: getattr(args, f) for f in FILTER_FIELDS if getattr(args, f)}
+    start = time.perf_counter()
+    results = index.search(args.query, k=args.k, filters=filters)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"[INFO] {len(results)} result(s) in {elapsed:.1f} ms over {index.n_docs} documents")
+    for rank, row in enumerate(results.itertuples(), 1):
+        print(f"\n{rank}. [{row.score:.2f}] {row.Title}  ({row.the_name}, {row.the_country}, voice={row.voice})")
+        print(f"   {row.url}")
+        print(f"   {row.snippet}")
+
+
+if __name__ == "__main__":
+    main()
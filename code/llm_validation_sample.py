@@ -1,31 +1,88 @@
+import argparse
+
 import pandas as pd
-import random
+
+from stratified_sampler import ALLOCATIONS, CHUNK_SIZE, stratified_sample
 
 DATA_PATH = "data/ganis_phase2_clean.csv"
 OUTPUT_SAMPLE = "data/ganis_llm_sample.csv"
 
-SAMPLE_SIZE = 400  # random sample for manual + AI validation
+SAMPLE_SIZE = 400  # stratified sample for manual + AI validation
+SEED = 42
+
+OUTPUT_COLUMNS = [
+    "the_domain",
+    "the_country",
+    "the_rank",
+    "Labels",
+    "content_text",
+]
+# carried along (when the corpus has them) so the reviewed sample can train garbage_scorer.py
+FEATURE_COLUMNS = [
+    "Title",
+    "url",
+    "char_entropy",
+    "ttr",
+    "word_count",
+    "is_boilerplate",
+    "lang_score",
+    "keyword_presence",
+    "keywords_list",
+    "top_unigrams",
+    "top_bigrams",
+    "top_trigrams",
+]
+LABEL_COLUMN = "is_garbage"  # filled in by the reviewer: 1 = garbage, 0 = keep, blank = not reviewed
+
 
 def main():
-    df = pd.read_csv(DATA_PATH)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", default=DATA_PATH,
+                        help=f"Corpus CSV to sample from (default: {DATA_PATH})")
+    parser.add_argument("--output", default=OUTPUT_SAMPLE,
+                        help=f"Where to save the sample (default: {OUTPUT_SAMPLE})")
+    parser.add_argument("--size", type=int, default=SAMPLE_SIZE,
+                        help=f"Number of rows to sample (default: {SAMPLE_SIZE})")
+    parser.add_argument("--seed", type=int, default=SEED,
+                        help=f"Random seed (default: {SEED})")
+    parser.add_argument("--strata", nargs="*", default=["the_country", "Labels", "rank_band"],
+                        help="Columns to stratify by: the_country, Labels, rank_band, "
+                             "the_domain, cluster_id (default: the_country Labels rank_band)")
+    parser.add_argument("--allocation", choices=ALLOCATIONS, default="proportional",
+                        help="Rows per stratum: proportional to its size or equal (default: proportional)")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE,
+                        help=f"Rows read per chunk (default: {CHUNK_SIZE})")
+    args = parser.parse_args()
 
-    print("Columns:", df.columns.tolist())
+    # Only read the columns we need (rank_band is derived from the_rank)
+    needed = set(OUTPUT_COLUMNS) | set(FEATURE_COLUMNS) | {"the_rank" if c == "rank_band" else c for c in args.strata}
 
-    # Use correct column names from your dataset
-    sample_df = df.sample(SAMPLE_SIZE)
+    print(f"[INFO] Streaming {args.input} in chunks of {args.chunksize} rows ...")
+    sample_df, sizes = stratified_sample(
+        args.input,
+        args.size,
+        args.strata,
+        allocation=args.allocation,
+        seed=args.seed,
+        chunksize=args.chunksize,
+        usecols=sorted(needed),
+    )
+    print(f"[INFO] {len(sizes)} strata over {sum(sizes.values())} rows "
+          f"(strata: {', '.join(args.strata) or 'none'}, allocation: {args.allocation}, seed: {args.seed})")
 
-    sample_df = sample_df[[
-        "the_domain",
-        "the_country",
-        "the_rank",
-        "Labels",
-        "content_text"
-    ]]
+    extra = [c for c in args.strata if c not in OUTPUT_COLUMNS]
+    features = [c for c in FEATURE_COLUMNS if c in sample_df.columns and c not in extra]
+    if sample_df.empty:
+        print(f"[WARN] No rows to sample from {args.input}; writing an empty sample.")
+        sample_df = pd.DataFrame(columns=OUTPUT_COLUMNS + extra + features)
+    sample_df = sample_df[OUTPUT_COLUMNS + extra + features]
+    sample_df[LABEL_COLUMN] = ""
 
-    sample_df.to_csv(OUTPUT_SAMPLE, index=False)
-    print(f"✅ LLM validation sample saved to {OUTPUT_SAMPLE}")
-    print("Open this file and check which domains produce garbage content.")
+    sample_df.to_csv(args.output, index=False)
+    print(f"✅ LLM validation sample ({len(sample_df)} rows) saved to {args.output}")
+    print(f"Open this file, check which domains produce garbage content and mark {LABEL_COLUMN} "
+          f"(1 = garbage, 0 = keep); then: python code/garbage_scorer.py train --labels {args.output}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,103 @@
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from data_loader import load_table
+
+# Load test for voice_service.py on localhost: N concurrent keep-alive clients
+# send /classify requests with documents drawn from a phase 4 CSV, then the
+# client-side latency / throughput and the server's /metrics are printed.
+
+INPUT_PATH = "data/ganis_hype_ge1000.csv"
+HOST = "127.0.0.1"
+PORT = 8765
+
+
+async def request(reader, writer, method, path, payload=None):
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        if key.strip().lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def client(host, port, jobs, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while jobs:
+            docs = jobs.pop()
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, "POST", "/classify", {"documents": docs})
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run(args, documents):
+    rng = np.random.default_rng(args.seed)
+    jobs = [
+        [documents[i] for i in rng.integers(0, len(documents), size=args.docs_per_request)]
+        for _ in range(args.requests)
+    ]
+    latencies, errors = [], []
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client(args.host, args.port, jobs, latencies, errors)
+                           for _ in range(args.concurrency)])
+    elapsed = time.perf_counter() - start
+
+    lat = np.array(latencies) * 1000
+    print(f"[INFO] {len(latencies)} requests x {args.docs_per_request} docs "
+          f"with concurrency {args.concurrency} in {elapsed:.2f}s")
+    print(f"[INFO] Throughput: {len(latencies) / elapsed:.1f} req/s, "
+          f"{len(latencies) * args.docs_per_request / elapsed:.1f} docs/s")
+    print("[INFO] Latency ms: " + ", ".join(f"p{q}={np.percentile(lat, q):.1f}" for q in (50, 90, 95, 99)))
+    if errors:
+        print(f"[WARN] {len(errors)} failed requests (status codes {sorted(set(errors))})")
+
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    _, metrics = await request(reader, writer, "GET", "/metrics")
+    writer.close()
+    print("[INFO] Server metrics:")
+    print(json.dumps(metrics, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test a running voice_service.py on localhost.")
+    parser.add_argument("--input", default=INPUT_PATH, help=f"CSV with Title / content_text (default: {INPUT_PATH})")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--requests", type=int, default=200, help="Total requests (default: 200)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients (default: 16)")
+    parser.add_argument("--docs_per_request", type=int, default=1, help="Documents per request (default: 1)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    df = load_table(args.input, columns=["Title", "content_text"])
+    documents = [
+        {"Title": "" if t is None else t, "content_text": "" if c is None else c}
+        for t, c in zip(df["Title"].astype(object).where(df["Title"].notna(), None),
+                        df["content_text"].astype(object).where(df["content_text"].notna(), None))
+    ]
+    print(f"[INFO] Loaded {len(documents)} documents from {args.input}")
+    asyncio.run(run(args, documents))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,80 +1,62 @@
 import os
 import pandas as pd
 
+from data_loader import load_table
+from domain_rules import DomainTrie, blacklist_matches, read_rules
+
 DATA_PATH = "data/ganis_phase2_clean.csv"
 BLACKLIST_PATH = "data/domain_blacklist.txt"
 
 OUTPUT_HYPE = "data/ganis_hype_set.csv"
 OUTPUT_CONTROL = "data/ganis_control_set.csv"
+STAGE_COUNTS_PATH = "data/phase3_stage_counts.csv"  # read by phase7_visual_garbage_comparison.py
+
+TARGET_COUNTRIES = {"Germany", "United Kingdom"}
 
 
-def load_blacklist(path: str):
+def load_blacklist(path: str) -> DomainTrie:
     """
-    Load domain blacklist from a simple text file (one domain per line).
+    Load domain blacklist rules from a simple text file (one rule per line, see
+    domain_rules.py for the suffix / wildcard / exact syntax).
     Lines that are empty or start with '#' are ignored.
     """
     if not os.path.exists(path):
         print(f"[INFO] No blacklist file found at {path}. Skipping domain filtering.")
-        return set()
-
-    domains = []
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            if line.startswith("#"):
-                continue
-            domains.append(line)
-
-    blacklist = set(domains)
-    print(f"[INFO] Loaded {len(blacklist)} blacklisted domains from {path}")
+        return DomainTrie()
+
+    blacklist = DomainTrie(read_rules(path))
+    print(f"[INFO] Loaded {len(blacklist)} blacklist rules from {path}")
     return blacklist
 
 
-def remove_blacklisted_domains(df: pd.DataFrame, blacklist: set) -> pd.DataFrame:
+def remove_blacklisted_domains(df: pd.DataFrame, blacklist) -> pd.DataFrame:
     """
-    Remove rows whose domain column matches any entry in the blacklist.
-    Tries to guess the correct domain column name.
+    Remove rows whose url host or the_domain matches a blacklist rule
+    (a DomainTrie, or a plain collection of rules).
     """
-    if not blacklist:
+    if not isinstance(blacklist, DomainTrie):
+        blacklist = DomainTrie(blacklist)
+    if not len(blacklist):
         return df
 
-    # Try to guess which column holds the domain
-    domain_col = None
-    for cand in ["the_domain", "domain_root", "root_domain", "domain", "Domain"]:
-        if cand in df.columns:
-            domain_col = cand
-            break
-
-    if domain_col is None:
-        print("[WARN] No domain column found (tried domain_root/root_domain/domain/Domain).")
-        print("[WARN] Skipping domain blacklist filtering.")
+    if "url" not in df.columns and "the_domain" not in df.columns:
+        print("[WARN] No url / the_domain column found. Skipping domain blacklist filtering.")
         return df
 
+    matched = blacklist_matches(df, blacklist)
     before = len(df)
-    df = df[~df[domain_col].isin(blacklist)].copy()
-    after = len(df)
-    removed = before - after
+    df = df[matched.isna()].copy()
+    removed = before - len(df)
     print(f"[INFO] Domain filtering: removed {removed} rows using blacklist.")
+    if removed:
+        print(matched.dropna().value_counts().head(10).to_string())
     return df
 
 
-def main():
-    print(f"[INFO] Loading dataset from {DATA_PATH} ...")
-    df = pd.read_csv(DATA_PATH)
-    print(f"[INFO] Loaded {len(df)} rows total.")
-
-    # 1) Remove blacklisted domains
-    blacklist = load_blacklist(BLACKLIST_PATH)
-    df = remove_blacklisted_domains(df, blacklist)
-
+def select_subsets(df: pd.DataFrame):
+    """(hype_df, control_df): Germany + UK pages split by their Labels."""
     # 2) Filter by country: Germany + United Kingdom
-    target_countries = {"Germany", "United Kingdom"}
-    before_country = len(df)
-    df = df[df["the_country"].isin(target_countries)].copy()
-    after_country = len(df)
-    print(f"[INFO] Country filter (Germany + UK): {before_country} -> {after_country} rows.")
+    df = df[df["the_country"].isin(TARGET_COUNTRIES)]
 
     # 3) Build HYPE (News/Media) and CONTROL (Policy/Admin) masks based on Labels
     labels = df["Labels"].astype(str)
@@ -90,8 +72,24 @@ def main():
         labels.str.contains("administrative communications", case=False, na=False)
     ) & ~hype_mask
 
-    hype_df = df[hype_mask].copy()
-    control_df = df[control_mask].copy()
+    return df[hype_mask].copy(), df[control_mask].copy()
+
+
+def main():
+    print(f"[INFO] Loading dataset from {DATA_PATH} ...")
+    df = load_table(DATA_PATH)
+    print(f"[INFO] Loaded {len(df)} rows total.")
+
+    # 1) Remove blacklisted domains
+    blacklist = load_blacklist(BLACKLIST_PATH)
+    df = remove_blacklisted_domains(df, blacklist)
+    after_blacklist = len(df)
+
+    # 2) + 3) Country filter, then HYPE / CONTROL by Labels
+    before_country = len(df)
+    hype_df, control_df = select_subsets(df)
+    after_country = int(df["the_country"].isin(TARGET_COUNTRIES).sum())
+    print(f"[INFO] Country filter (Germany + UK): {before_country} -> {after_country} rows.")
 
     print("\n[INFO] Subset sizes AFTER all filters (country + blacklist + label logic):")
     print(f"  HYPE (news/media) rows:    {len(hype_df)}")
@@ -100,11 +98,18 @@ def main():
     # 4) Save out to CSV
     os.makedirs(os.path.dirname(OUTPUT_HYPE), exist_ok=True)
 
+    stage_counts = pd.DataFrame({
+        "stage": ["Domain blacklist applied", "Germany+UK + AI-label subset"],
+        "rows": [after_blacklist, len(hype_df) + len(control_df)],
+    })
+    stage_counts.to_csv(STAGE_COUNTS_PATH, index=False)
+
     hype_df.to_csv(OUTPUT_HYPE, index=False)
     control_df.to_csv(OUTPUT_CONTROL, index=False)
 
     print(f"\n[INFO] Saved HYPE set to:    {OUTPUT_HYPE}")
     print(f"[INFO] Saved CONTROL set to: {OUTPUT_CONTROL}")
+    print(f"[INFO] Saved stage counts to: {STAGE_COUNTS_PATH}")
     print("\n[DONE] Phase 3 selection complete.")
 
 
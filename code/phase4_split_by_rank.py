@@ -1,12 +1,17 @@
 import pandas as pd
 import os
 
+from data_loader import load_table
+
 HYPE_PATH = "data/ganis_hype_set.csv"
 CONTROL_PATH = "data/ganis_control_set.csv"
 
+# Rank bands used across GANIS (top 50 vs. >= 1000, the middle is ignored)
+RANK_BANDS = ["top50", "mid", "ge1000", "unranked"]
+
 
 def load_with_rank(path):
-    df = pd.read_csv(path)
+    df = load_table(path)
     if "the_rank" not in df.columns:
         raise ValueError(f"'the_rank' column not found in {path}")
     # make sure rank is numeric
@@ -14,6 +19,19 @@ def load_with_rank(path):
     return df
 
 
+def assign_rank_band(rank):
+    """
+    Map THE ranks to the GANIS rank bands:
+    top50 (<= 50), mid (51–999), ge1000 (>= 1000), unranked (missing / non-numeric).
+    """
+    num = pd.to_numeric(pd.Series(rank), errors="coerce")
+    band = pd.Series("unranked", index=num.index, dtype=object)
+    band[num <= 50] = "top50"
+    band[(num > 50) & (num < 1000)] = "mid"
+    band[num >= 1000] = "ge1000"
+    return band
+
+
 def split_by_rank(df, label):
     # Top 50 (rank <= 50)
     top50 = df[df["the_rank_num"] <= 50].copy()
@@ -1,10 +1,21 @@
 import argparse
+import os
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
-from sentence_transformers import SentenceTransformer
-import umap.umap_ as umap
-import hdbscan
+
+from data_loader import has_pyarrow, iter_table, load_table, memory_mb
+from clustering import (SCALABLE_MIN_ROWS, cluster_projection, consensus_clustering, reduce_and_cluster,
+                        reduce_projection, scalable_clustering)
+from embedding_store import ENCODINGS, EmbeddingStore
+from encoder_backends import BACKENDS, load_encoder
+from keyword_matrix import relevance_mask
+from phase5_voice_assignment_multi import SCOPE_COLUMN
+from voice_classifier import save_model_bundle
+
+JOINT_PREFIX = "joint"  # --joint writes joint_<prefix>_semantic.csv per subset
+CHUNK_ROWS = 5000       # --out_of_core rows per chunk
 
 
 def build_text_field(row):
@@ -12,38 +23,94 @@ def build_text_field(row):
     Build the text we embed: Title + content_text.
     Falls back gracefully if columns are missing.
     """
-    title = str(row.get("Title", "") or "")
-    body = str(row.get("content_text", "") or "")
+    title = row.get("Title", "")
+    body = row.get("content_text", "")
+    title = str(title) if pd.notna(title) else ""
+    body = str(body) if pd.notna(body) else ""
     text = (title.strip() + "\n\n" + body.strip()).strip()
     return text
 
 
-def main(args):
-    input_path = Path(args.input)
-    output_dir = Path(args.output_dir)
-    output_dir.mkdir(parents=True, exist_ok=True)
+def input_columns(args):
+    """Projected read: only what the pipeline needs + --columns (None = all columns)."""
+    if not args.columns:
+        return None
+    return sorted(set(args.columns) | {"Title", "content_text", "the_name", "file_name"})
 
-    print(f"[INFO] Loading dataset from {input_path} ...")
-    df = pd.read_csv(input_path)
-    print(f"[INFO] Loaded {len(df)} rows.")
 
-    # Build text field for embedding
-    print("[INFO] Building text_for_embedding field (Title + content_text) ...")
+def prepare_documents(df: pd.DataFrame, args):
+    """
+    Build text_for_embedding and apply the word / keyword filters.
+    Returns (filtered df, rows left after each step).
+    """
+    counts = {"loaded": len(df)}
     df["text_for_embedding"] = df.apply(build_text_field, axis=1)
 
     # Basic length filter so we don't embed tiny boilerplate
     df["word_count_calc"] = df["text_for_embedding"].str.split().str.len()
-    before_filter = len(df)
     df = df[df["word_count_calc"] >= args.min_words].reset_index(drop=True)
-    print(f"[INFO] Filtered by min_words={args.min_words}: {before_filter} -> {len(df)} rows.")
+    counts["min_words"] = len(df)
 
-    if len(df) == 0:
-        print("[WARN] No rows left after filtering. Exiting.")
-        return
+    if args.min_keywords > 0:
+        # cheap relevance filter on the crawler's keyword columns, before paying for embeddings
+        df = df[relevance_mask(df, args.min_keywords)].reset_index(drop=True)
+        counts["min_keywords"] = len(df)
+    return df, counts
+
+
+def print_filter_counts(counts: dict, args):
+    print(f"[INFO] Filtered by min_words={args.min_words}: {counts['loaded']} -> {counts['min_words']} rows.")
+    if "min_keywords" in counts:
+        print(f"[INFO] Filtered by min_keywords={args.min_keywords}: {counts['min_words']} -> "
+              f"{counts['min_keywords']} rows.")
+
+
+def load_subset(input_path: Path, args) -> pd.DataFrame:
+    """Load one input file, build text_for_embedding and apply the word / keyword filters."""
+    print(f"[INFO] Loading dataset from {input_path} ...")
+    df = load_table(input_path, columns=input_columns(args))
+    print(f"[INFO] Loaded {len(df)} rows ({memory_mb(df):.1f} MB in memory).")
+
+    print("[INFO] Building text_for_embedding field (Title + content_text) ...")
+    df, counts = prepare_documents(df, args)
+    print_filter_counts(counts, args)
+    return df
+
+
+def reusable_store(embedding_dir: Path, input_path: Path, args, doc_ids=None, n: int = None):
+    """
+    The store from a previous run with the same input, model, backend and filters
+    (and, when given, the same row count / file_name order), or None.
+    """
+    if not (args.reuse_embeddings and (embedding_dir / "meta.json").exists()):
+        return None
+    store = EmbeddingStore.load(str(embedding_dir))
+    expected = {"model_name": args.model_name, "backend": args.backend, "source": str(input_path),
+                "min_words": args.min_words, "min_keywords": args.min_keywords}
+    ok = all(store.meta.get(k, "torch" if k == "backend" else None) == v for k, v in expected.items())
+    if ok and n is not None:
+        ok = store.n == n
+    if ok and doc_ids is not None:
+        stored = store.arrays.get("doc_ids")
+        ok = stored is not None and len(stored) == len(doc_ids) and bool(np.array_equal(stored.astype(str), doc_ids))
+    if ok:
+        return store
+    print(f"[WARN] Stored embeddings in {embedding_dir} do not match this input. Re-encoding.")
+    return None
+
+
+def embed_subset(df: pd.DataFrame, input_path: Path, embedding_dir: Path, args):
+    """(embeddings, store) for df: reused from embedding_dir when they match, else encoded and stored."""
+    doc_ids = df["file_name"].astype(str).to_numpy() if "file_name" in df.columns else None
+
+    store = reusable_store(embedding_dir, input_path, args, doc_ids=doc_ids, n=len(df))
+    if store is not None:
+        print(f"[INFO] Reusing {store.encoding} embeddings from {embedding_dir} ...")
+        return store.decode(), store
 
     # Load Sentence Transformer model
-    print(f"[INFO] Loading SentenceTransformer model: {args.model_name} ...")
-    model = SentenceTransformer(args.model_name)
+    print(f"[INFO] Loading SentenceTransformer model: {args.model_name} ({args.backend} backend) ...")
+    model = load_encoder(args.model_name, args.backend, args.threads)
 
     texts = df["text_for_embedding"].tolist()
     print(f"[INFO] Encoding {len(texts)} documents to embeddings ...")
@@ -53,41 +120,74 @@ def main(args):
         show_progress_bar=True
     )
 
-    # UMAP dimensionality reduction (to 2D for visualization)
-    print("[INFO] Running UMAP dimensionality reduction ...")
-    reducer = umap.UMAP(
-        n_components=2,
-        n_neighbors=args.n_neighbors,
-        min_dist=0.1,
-        metric="cosine",
-        random_state=42,
-    )
-    emb_2d = reducer.fit_transform(embeddings)
+    store = None
+    if args.embedding_encoding != "none":
+        store = EmbeddingStore.from_embeddings(
+            embeddings, args.embedding_encoding,
+            model_name=args.model_name, backend=args.backend, source=str(input_path),
+            min_words=args.min_words, min_keywords=args.min_keywords,
+        )
+        if doc_ids is not None:
+            store.arrays["doc_ids"] = doc_ids.astype(str)
+        store.save(str(embedding_dir))
+        print(f"[INFO] Saved {args.embedding_encoding} embeddings ({store.nbytes / 1e6:.1f} MB) "
+              f"to {embedding_dir}")
+    return embeddings, store
+
+
+def cluster_embeddings(embeddings, store, args):
+    """
+    Run the selected clustering path. Returns (emb_2d, labels, extra columns,
+    (reducer, clusterer) or None). With --scalable and a store, embeddings may be None.
+    """
+    if args.scalable:
+        # mini-batch k-means micro-clusters (streamed from the store) -> HDBSCAN on their centroids
+        source = store if store is not None else embeddings
+        n = store.n if store is not None else len(embeddings)
+        if n < SCALABLE_MIN_ROWS:
+            print(f"[WARN] Only {n} rows: --scalable is meant for large corpora and agrees less "
+                  f"with the exact path on small ones.")
+        print("[INFO] Running two-stage clustering (MiniBatchKMeans micro-clusters + HDBSCAN) ...")
+        emb_2d, cluster_labels, micro = scalable_clustering(
+            source,
+            n_micro=args.micro_clusters,
+            n_neighbors=args.n_neighbors,
+            min_cluster_size=args.min_cluster_size,
+            min_samples=args.min_samples,
+        )
+        return emb_2d, cluster_labels, {"micro_cluster": micro}, None
 
-    # HDBSCAN clustering on the 2D projections
-    print("[INFO] Running HDBSCAN clustering ...")
-    clusterer = hdbscan.HDBSCAN(
+    if args.consensus_seeds > 1:
+        # Consensus over several seeds (UMAP/HDBSCAN runs spread over a process pool)
+        print(f"[INFO] Running consensus clustering over {args.consensus_seeds} seeds "
+              f"with {args.workers} worker(s) ...")
+        emb_2d, cluster_labels, stability, _ = consensus_clustering(
+            embeddings,
+            n_seeds=args.consensus_seeds,
+            workers=args.workers,
+            n_neighbors=args.n_neighbors,
+            min_cluster_size=args.min_cluster_size,
+            min_samples=args.min_samples,
+        )
+        print(f"[INFO] Mean cluster stability: {stability.mean():.3f}")
+        if args.save_models:
+            print("[WARN] --save_models is ignored with --consensus_seeds (no single fitted model).")
+        return emb_2d, cluster_labels, {"cluster_stability": stability}, None
+
+    # UMAP dimensionality reduction (to 2D for visualization) + HDBSCAN on the projections
+    print("[INFO] Running UMAP dimensionality reduction + HDBSCAN clustering ...")
+    result = reduce_and_cluster(
+        embeddings,
+        n_neighbors=args.n_neighbors,
         min_cluster_size=args.min_cluster_size,
         min_samples=args.min_samples,
-        metric="euclidean",
-        cluster_selection_method="eom",
+        return_models=args.save_models,
     )
-    cluster_labels = clusterer.fit_predict(emb_2d)
-
-    df["umap_x"] = emb_2d[:, 0]
-    df["umap_y"] = emb_2d[:, 1]
-    df["cluster_id"] = cluster_labels
+    return result[0], result[1], {}, result[2:] if args.save_models else None
 
-    print("\n=== Cluster label counts (including -1 noise) ===")
-    print(df["cluster_id"].value_counts().sort_index())
 
-    # Save semantic CSV (for plotting later)
-    out_csv = output_dir / f"{args.output_prefix}_semantic.csv"
-    df.to_csv(out_csv, index=False)
-    print(f"\n[INFO] Saved semantic CSV to: {out_csv}")
-
-    # Prepare cluster samples file for LLM topic labeling
-    samples_path = output_dir / f"{args.output_prefix}_cluster_samples.txt"
+def write_cluster_samples(df: pd.DataFrame, samples_path: Path, args):
+    """Top documents per cluster (longest first) for LLM topic labeling."""
     print(f"[INFO] Writing cluster samples for LLM to: {samples_path}")
 
     with open(samples_path, "w", encoding="utf-8") as f:
@@ -107,6 +207,8 @@ def main(args):
 
             for _, row in sub.iterrows():
                 uni = str(row.get("the_name", ""))
+                if "subset" in row:
+                    uni = f"{row['subset']} | {uni}"
                 title = str(row.get("Title", "")).strip()
                 f.write(f"\n--- DOC: {uni} | {title[:140]}\n")
 
@@ -117,6 +219,266 @@ def main(args):
 
             f.write("\n\n")
 
+
+def write_semantic_csv(df: pd.DataFrame, out_csv: Path):
+    print(f"\n=== Cluster label counts for {out_csv.name} (including -1 noise) ===")
+    print(df["cluster_id"].value_counts().sort_index())
+
+    # Save semantic CSV (for plotting later)
+    df.to_csv(out_csv, index=False)
+    print(f"\n[INFO] Saved semantic CSV to: {out_csv}")
+
+
+def run_single(args, output_dir: Path):
+    input_path, prefix = Path(args.input[0]), args.output_prefix[0]
+    df = load_subset(input_path, args)
+    if len(df) == 0:
+        print("[WARN] No rows left after filtering. Exiting.")
+        return
+
+    embedding_dir = Path(args.embedding_dir or output_dir / f"{prefix}_embeddings")
+    embeddings, store = embed_subset(df, input_path, embedding_dir, args)
+
+    emb_2d, cluster_labels, extra, models = cluster_embeddings(embeddings, store, args)
+    for col, values in extra.items():
+        df[col] = values
+    if models is not None:
+        models_path = output_dir / f"{prefix}_models.joblib"
+        save_model_bundle(models_path, models[0], models[1], model_name=args.model_name, prefix=prefix,
+                          backend=args.backend)
+        print(f"[INFO] Saved fitted UMAP + HDBSCAN models to {models_path}")
+
+    df["umap_x"] = emb_2d[:, 0]
+    df["umap_y"] = emb_2d[:, 1]
+    df["cluster_id"] = cluster_labels
+
+    write_semantic_csv(df, output_dir / f"{prefix}_semantic.csv")
+    write_cluster_samples(df, output_dir / f"{prefix}_cluster_samples.txt", args)
+
+
+def run_joint(args, output_dir: Path):
+    """
+    One reducer (and, with --joint_clusters shared, one clusterer) fitted on the
+    union of all subsets, so every subset's map and cluster_id live in the same
+    space. Embeddings are still stored per subset (<prefix>_embeddings) and can
+    be reused by single-subset runs and vice versa.
+    """
+    if args.joint_clusters == "per_subset" and args.consensus_seeds > 1:
+        raise ValueError("--joint_clusters per_subset cannot be combined with --consensus_seeds.")
+
+    frames, embeddings = [], []
+    for input_path, prefix in zip(map(Path, args.input), args.output_prefix):
+        df = load_subset(input_path, args)
+        if len(df) == 0:
+            print(f"[WARN] No rows left in {input_path} after filtering. Skipping this subset.")
+            continue
+        emb, _ = embed_subset(df, input_path, output_dir / f"{prefix}_embeddings", args)
+        df["subset"] = prefix
+        frames.append(df)
+        embeddings.append(emb)
+    if not frames:
+        print("[WARN] No rows left after filtering. Exiting.")
+        return
+
+    df = pd.concat(frames, ignore_index=True)
+    embeddings = np.vstack(embeddings)
+    print(f"[INFO] Joint fit on {len(df)} rows from {len(frames)} subsets ...")
+    if args.joint_clusters == "per_subset":
+        # only the shared coordinates are needed; HDBSCAN runs per subset below
+        if args.scalable:
+            print("[WARN] --scalable is ignored with --joint_clusters per_subset "
+                  "(its two-stage clusterer only clusters the union).")
+        if args.save_models:
+            print("[WARN] --save_models is ignored with --joint_clusters per_subset (no single clusterer).")
+        print("[INFO] Running UMAP dimensionality reduction on the union ...")
+        emb_2d, _ = reduce_projection(embeddings, n_neighbors=args.n_neighbors)
+        cluster_labels, extra, models = -1, {}, None
+    else:
+        emb_2d, cluster_labels, extra, models = cluster_embeddings(embeddings, None, args)
+    for col, values in extra.items():
+        df[col] = values
+    df["umap_x"] = emb_2d[:, 0]
+    df["umap_y"] = emb_2d[:, 1]
+    df["cluster_id"] = cluster_labels
+    # phase5_voice_assignment_multi.py only applies the shared "joint" voice map to shared runs
+    df[SCOPE_COLUMN] = args.joint_clusters
+
+    if args.joint_clusters == "per_subset":
+        # shared coordinates, separate HDBSCAN per subset (cluster ids are per subset again)
+        for idx in df.groupby("subset", sort=False).indices.values():
+            labels, _ = cluster_projection(emb_2d[idx], min_cluster_size=args.min_cluster_size,
+                                           min_samples=args.min_samples)
+            df.loc[idx, "cluster_id"] = labels
+
+    if models is not None:
+        models_path = output_dir / f"{JOINT_PREFIX}_models.joblib"
+        save_model_bundle(models_path, models[0], models[1], model_name=args.model_name,
+                          prefix=JOINT_PREFIX, backend=args.backend)
+        print(f"[INFO] Saved fitted joint UMAP + HDBSCAN models to {models_path}")
+
+    for prefix, sub in df.groupby("subset", sort=False):
+        sub = sub.reset_index(drop=True)
+        write_semantic_csv(sub, output_dir / f"{JOINT_PREFIX}_{prefix}_semantic.csv")
+        if args.joint_clusters == "per_subset":
+            write_cluster_samples(sub, output_dir / f"{JOINT_PREFIX}_{prefix}_cluster_samples.txt", args)
+    if args.joint_clusters == "shared":
+        write_cluster_samples(df, output_dir / f"{JOINT_PREFIX}_cluster_samples.txt", args)
+
+
+def _arrow_table(df: pd.DataFrame, schema=None):
+    """
+    Arrow table for one chunk, cast to the schema of the first chunk. Categories
+    become plain strings and integers float64, so chunks whose categories or
+    missing values differ still share one schema (load_table downcasts again).
+    """
+    import pyarrow as pa
+
+    df = df.astype({c: object for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)})
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if schema is None:
+        schema = pa.schema([
+            pa.field(f.name, pa.string() if pa.types.is_null(f.type)
+                     else pa.float64() if pa.types.is_integer(f.type) else f.type)
+            for f in table.schema
+        ])
+    return table.select(schema.names).cast(schema), schema
+
+
+def run_out_of_core(args, output_dir: Path):
+    """
+    Stream the input in --chunksize rows: filter, encode and append each chunk to a
+    memory-mapped float32 embedding store, staging the metadata (without the
+    embedded text) in a Parquet file. Clustering then reads the memory-mapped
+    matrix, and <prefix>_semantic.parquet is written one row group per chunk,
+    so peak memory depends on the chunk size, not on the corpus size.
+    """
+    import pyarrow.parquet as pq
+
+    from embedding_store import EmbeddingWriter
+
+    if args.joint:
+        raise ValueError("--out_of_core does not support --joint.")
+    input_path, prefix = Path(args.input[0]), args.output_prefix[0]
+    embedding_dir = Path(args.embedding_dir or output_dir / f"{prefix}_embeddings")
+    staging_path = output_dir / f"{prefix}_staging.parquet"
+    out_path = output_dir / f"{prefix}_semantic.parquet"
+
+    store = reusable_store(embedding_dir, input_path, args)
+    writer = model = None
+    if store is None:
+        encoding = args.embedding_encoding if args.embedding_encoding in ("float32", "float16") else "float32"
+        if encoding != args.embedding_encoding:
+            print(f"[INFO] --out_of_core streams {encoding} embeddings (not {args.embedding_encoding}).")
+        writer = EmbeddingWriter(str(embedding_dir), encoding, model_name=args.model_name, backend=args.backend,
+                                 source=str(input_path), min_words=args.min_words, min_keywords=args.min_keywords)
+        print(f"[INFO] Loading SentenceTransformer model: {args.model_name} ({args.backend} backend) ...")
+        model = load_encoder(args.model_name, args.backend, args.threads)
+    else:
+        print(f"[INFO] Reusing {store.encoding} embeddings from {embedding_dir} ...")
+
+    # 1) stream: filter -> encode -> append embeddings + stage metadata
+    print(f"[INFO] Streaming {input_path} in chunks of {args.chunksize} rows ...")
+    totals, staging, schema = {}, None, None
+    for i, chunk in enumerate(iter_table(input_path, args.chunksize, columns=input_columns(args))):
+        chunk, counts = prepare_documents(chunk, args)
+        for step, n in counts.items():
+            totals[step] = totals.get(step, 0) + n
+        texts = chunk.pop("text_for_embedding").tolist()
+        if not len(chunk):
+            continue
+        if writer is not None:
+            doc_ids = chunk["file_name"].astype(str).to_numpy() if "file_name" in chunk.columns else None
+            writer.append(model.encode(texts, batch_size=args.batch_size, show_progress_bar=False), doc_ids)
+        del texts
+        table, schema = _arrow_table(chunk, schema)
+        if staging is None:
+            staging = pq.ParquetWriter(str(staging_path), schema)
+        staging.write_table(table)
+        print(f"[INFO] Chunk {i + 1}: {totals[list(totals)[-1]]} rows kept so far.")
+    if staging is None:
+        if writer is not None:
+            writer.close()
+        print("[WARN] No rows left after filtering. Exiting.")
+        return
+    staging.close()
+    print_filter_counts(totals, args)
+
+    if writer is not None:
+        store = writer.close()
+        print(f"[INFO] Saved {store.encoding} embeddings ({store.nbytes / 1e6:.1f} MB) to {embedding_dir}")
+    n_rows = totals[list(totals)[-1]]
+    if store.n != n_rows:
+        raise ValueError(f"Embedding store in {embedding_dir} has {store.n} rows but the input has {n_rows}; "
+                         f"re-run without --reuse_embeddings.")
+
+    # 2) cluster straight from the memory-mapped matrix
+    if not args.scalable:
+        print("[INFO] Exact UMAP loads the embedding matrix into memory; add --scalable to keep memory flat.")
+    if args.scalable:
+        embeddings = None  # streamed from the store block by block
+    else:
+        embeddings = store.codes if store.encoding == "float32" else store.decode()
+    emb_2d, cluster_labels, extra, models = cluster_embeddings(embeddings, store, args)
+    if models is not None:
+        models_path = output_dir / f"{prefix}_models.joblib"
+        save_model_bundle(models_path, models[0], models[1], model_name=args.model_name, prefix=prefix,
+                          backend=args.backend)
+        print(f"[INFO] Saved fitted UMAP + HDBSCAN models to {models_path}")
+
+    # 3) re-stream the staged chunks, attach the results, keep the cluster samples
+    sample_cols = ["cluster_id", "word_count_calc", "the_name", "Title", "content_text"]
+    staged = pq.ParquetFile(str(staging_path))
+    writer_out, schema, start = None, None, 0
+    label_counts = pd.Series(dtype=np.int64)
+    samples = pd.DataFrame()
+    for g in range(staged.num_row_groups):
+        chunk = staged.read_row_group(g).to_pandas()
+        rows = slice(start, start + len(chunk))
+        start += len(chunk)
+        for col, values in extra.items():
+            chunk[col] = values[rows]
+        chunk["umap_x"] = emb_2d[rows, 0]
+        chunk["umap_y"] = emb_2d[rows, 1]
+        chunk["cluster_id"] = cluster_labels[rows]
+
+        table, schema = _arrow_table(chunk, schema)
+        if writer_out is None:
+            writer_out = pq.ParquetWriter(str(out_path), schema)
+        writer_out.write_table(table)
+
+        label_counts = label_counts.add(chunk["cluster_id"].value_counts(), fill_value=0)
+        samples = (
+            pd.concat([samples, chunk[[c for c in sample_cols if c in chunk.columns]]], ignore_index=True)
+            .sort_values("word_count_calc", ascending=False, kind="stable")
+            .groupby("cluster_id").head(args.samples_per_cluster)
+        )
+    writer_out.close()
+    os.remove(staging_path)
+
+    print(f"\n=== Cluster label counts for {out_path.name} (including -1 noise) ===")
+    print(label_counts.astype(int).sort_index().rename("count"))
+    print(f"\n[INFO] Saved semantic Parquet ({staged.num_row_groups} row groups) to: {out_path}")
+    write_cluster_samples(samples, output_dir / f"{prefix}_cluster_samples.txt", args)
+
+
+def main(args):
+    if len(args.input) != len(args.output_prefix):
+        raise ValueError(f"Got {len(args.input)} --input file(s) but {len(args.output_prefix)} --output_prefix(es).")
+    if not args.joint and len(args.input) > 1:
+        raise ValueError("Several --input files need --joint.")
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    if args.out_of_core:
+        if not has_pyarrow():
+            raise ValueError("--out_of_core writes Parquet and needs pyarrow (pip install pyarrow).")
+        run_out_of_core(args, output_dir)
+    elif args.joint:
+        run_joint(args, output_dir)
+    else:
+        run_single(args, output_dir)
+
     print("[DONE] Phase 4 semantic pipeline complete for this file.")
 
 
@@ -125,13 +487,47 @@ if __name__ == "__main__":
 
     parser.add_argument(
         "--input",
+        nargs="+",
         required=True,
-        help="Path to input CSV (e.g. data/ganis_hype_top50.csv)",
+        help="Path to input CSV (e.g. data/ganis_hype_top50.csv); several with --joint",
     )
     parser.add_argument(
         "--output_prefix",
+        nargs="+",
         required=True,
-        help="Prefix for output files (e.g. hype_top50)",
+        help="Prefix for output files (e.g. hype_top50); one per --input",
+    )
+    parser.add_argument(
+        "--joint",
+        action="store_true",
+        help="Fit one UMAP (and HDBSCAN) on the union of all --input files and write "
+             "joint_<prefix>_semantic.csv per subset, so the maps share one space",
+    )
+    parser.add_argument(
+        "--joint_clusters",
+        choices=["shared", "per_subset"],
+        default="shared",
+        help="With --joint: one HDBSCAN over the union (shared cluster ids, default) "
+             "or one per subset on the shared coordinates",
+    )
+    parser.add_argument(
+        "--columns",
+        nargs="*",
+        default=None,
+        help="Only load these input columns (plus Title, content_text, the_name, file_name); "
+             "default: all columns",
+    )
+    parser.add_argument(
+        "--out_of_core",
+        action="store_true",
+        help="Stream the input in --chunksize rows into a memory-mapped embedding store and write "
+             "<prefix>_semantic.parquet chunk by chunk (for corpora larger than RAM; best with --scalable)",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=CHUNK_ROWS,
+        help=f"Rows per chunk with --out_of_core (default: {CHUNK_ROWS})",
     )
     parser.add_argument(
         "--output_dir",
@@ -151,6 +547,38 @@ if __name__ == "__main__":
         default=16,
         help="Batch size for embedding (default: 16)",
     )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="torch",
+        help="Encoder backend: torch (FP32), onnx or onnx-int8 (ONNX Runtime, exported on first use; "
+             "check agreement with encoder_backends.py) (default: torch)",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="Encoder intra-op threads (default: library default)",
+    )
+
+    # Embedding storage (rows are in the same order as the semantic CSV)
+    parser.add_argument(
+        "--embedding_encoding",
+        choices=ENCODINGS + ["none"],
+        default="int8",
+        help="Encoding for the saved embeddings: float32, float16, int8, pq or none (default: int8)",
+    )
+    parser.add_argument(
+        "--embedding_dir",
+        default=None,
+        help="Where to save the embedding store (default: <output_dir>/<output_prefix>_embeddings; "
+             "--joint always uses the default per subset)",
+    )
+    parser.add_argument(
+        "--reuse_embeddings",
+        action="store_true",
+        help="Decode embeddings from --embedding_dir instead of re-encoding when they match the input",
+    )
 
     # Filters / clustering hyperparameters
     parser.add_argument(
@@ -159,6 +587,13 @@ if __name__ == "__main__":
         default=30,
         help="Minimum words in text_for_embedding to keep a doc (default: 30)",
     )
+    parser.add_argument(
+        "--min_keywords",
+        type=int,
+        default=0,
+        help="Keep only docs with keyword_presence == yes and at least this many keywords_list terms "
+             "(default: 0 = no keyword filter)",
+    )
     parser.add_argument(
         "--n_neighbors",
         type=int,
@@ -178,6 +613,39 @@ if __name__ == "__main__":
         help="HDBSCAN min_samples (default: 5)",
     )
 
+    # Consensus clustering (cluster stability)
+    parser.add_argument(
+        "--consensus_seeds",
+        type=int,
+        default=0,
+        help="Run UMAP/HDBSCAN with this many seeds and output consensus clusters "
+             "plus a cluster_stability column (default: 0 = single run with seed 42)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processes for the consensus seeds (default: 1)",
+    )
+    parser.add_argument(
+        "--scalable",
+        action="store_true",
+        help="Two-stage clustering for large corpora: mini-batch k-means over the embedding store, "
+             "then HDBSCAN on the weighted micro-cluster centroids",
+    )
+    parser.add_argument(
+        "--micro_clusters",
+        type=int,
+        default=None,
+        help="Micro-clusters for --scalable (default: min(2000, rows // 5))",
+    )
+    parser.add_argument(
+        "--save_models",
+        action="store_true",
+        help="Save the fitted UMAP reducer + HDBSCAN clusterer to <output_dir>/<output_prefix>_models.joblib "
+             "(used by voice_service.py)",
+    )
+
     # LLM sample settings
     parser.add_argument(
         "--samples_per_cluster",
@@ -1,7 +1,13 @@
 import argparse
 import os
+
 import pandas as pd
 
+from data_loader import load_table
+
+JOINT_PREFIX = "joint"
+SCOPE_COLUMN = "cluster_scope"  # written by phase5 --joint: "shared" or "per_subset"
+
 # 1) Per-file: cluster_id -> topic label
 
 CLUSTER_TOPIC_LABELS = {
@@ -41,6 +47,10 @@ CLUSTER_TOPIC_LABELS = {
         1: "Student Administration & Access",
         2: "Law Education Pathways",
     },
+
+    # JOINT – one clustering over all four subsets (phase5 --joint); fill in from
+    # data/semantic/joint_cluster_samples.txt
+    "joint": {},
 }
 
 # -----------------------------
@@ -85,42 +95,116 @@ CLUSTER_VOICES = {
         1: "Admin",  # Student Administration & Access
         2: "Admin",  # Law Education Pathways
     },
+
+    # JOINT – shared by joint_hype_top50, joint_control_ge1000, ...
+    "joint": {},
+}
+
+# -----------------------------
+# 3) Judgement calls: clusters whose voice could reasonably be something else
+#    (alternatives to the CLUSTER_VOICES choice; voice_sensitivity.py tries them all)
+# -----------------------------
+
+AMBIGUOUS_VOICES = {
+    "hype_top50": {
+        0: ["Risk"],                      # Journalism & AI Disruption
+        2: ["Marketing", "Noise"],        # General University Content
+        3: ["Risk"],                      # Law & Governance Discourse
+        9: ["Pedagogical", "Risk"],       # GenAI in Peer Review
+        13: ["Risk"],                     # AI Governance & Strategy
+        -1: ["Noise"],                    # HDBSCAN noise
+    },
+    "hype_ge1000": {
+        0: ["Pedagogical"],               # Law & Degree Content
+        1: ["Admin"],                     # Student Life & Opportunities
+    },
+    "control_top50": {
+        0: ["Pedagogical"],               # Postgraduate Law Programmes
+        1: ["Admin"],                     # AI Guidance & Infrastructure
+    },
+    "control_ge1000": {
+        1: ["Marketing"],                 # Student Administration & Access
+        2: ["Pedagogical"],               # Law Education Pathways
+    },
 }
 
 
 def detect_prefix(input_path: str) -> str:
     """
     Infer prefix from filename:
-    e.g. hype_top50_semantic.csv → hype_top50
+    e.g. hype_top50_semantic.csv (or .parquet from --out_of_core) → hype_top50
     """
     base = os.path.basename(input_path)
-    if base.endswith("_semantic.csv"):
-        return base.replace("_semantic.csv", "")
+    for suffix in ("_semantic.csv", "_semantic.parquet"):
+        if base.endswith(suffix):
+            return base[: -len(suffix)]
     # fallback: strip extension
     return os.path.splitext(base)[0]
 
 
+def cluster_scope(df: pd.DataFrame) -> str:
+    """
+    "per_subset" for the files of a --joint_clusters per_subset run (cluster ids
+    are numbered per file), else "shared".
+    """
+    if SCOPE_COLUMN in df.columns and (df[SCOPE_COLUMN].astype(str) == "per_subset").any():
+        return "per_subset"
+    return "shared"
+
+
+def label_key(prefix: str, scope: str = "shared") -> str:
+    """
+    Key into CLUSTER_VOICES / CLUSTER_TOPIC_LABELS: the joint_<subset> files of
+    a shared --joint run share one clustering, hence one map, unless the prefix
+    has an entry of its own. Files of a per_subset run only ever use their own.
+    """
+    if scope == "shared" and prefix not in CLUSTER_VOICES and prefix.startswith(JOINT_PREFIX + "_"):
+        return JOINT_PREFIX
+    return prefix
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--input", required=True,
                         help="Path to *_semantic.csv")
     parser.add_argument("--output", required=True,
                         help="Where to save *_with_voice.csv")
+    parser.add_argument("--cluster_map", default=None,
+                        help="Cluster map JSON from cluster_reconciliation.py; used instead of the dicts below")
     args = parser.parse_args()
 
     prefix = detect_prefix(args.input)
-    if prefix not in CLUSTER_VOICES:
+    print(f"[INFO] Loading {args.input} ...")
+    df = load_table(args.input)
+    scope = cluster_scope(df)
+    key = label_key(prefix, scope)
+    if args.cluster_map:
+        from cluster_reconciliation import cluster_map_labels, load_cluster_map
+
+        clusters = load_cluster_map(args.cluster_map)
+        topic_map, voice_map = cluster_map_labels(clusters)
+        review = sorted(cid for cid, c in clusters.items() if c["status"] != "matched")
+        print(f"[INFO] Using cluster map {args.cluster_map} ({len(voice_map)} clusters with a voice)")
+        if review:
+            print(f"[WARN] Clusters {review} are new / split / merged and still need review; "
+                  f"unlabelled ones are 'Noise' for now.")
+    elif key not in CLUSTER_VOICES:
+        hint = (" Its clusters come from a --joint_clusters per_subset run, so the shared 'joint' map "
+                "does not apply." if scope == "per_subset" else "")
         raise ValueError(
-            f"Unknown prefix '{prefix}'. "
+            f"Unknown prefix '{prefix}'.{hint} "
             f"Add it to CLUSTER_VOICES and CLUSTER_TOPIC_LABELS."
         )
+    elif not CLUSTER_VOICES[key]:
+        raise ValueError(
+            f"No voices defined for '{key}' yet. "
+            f"Label the clusters in data/semantic/{key}_cluster_samples.txt and fill CLUSTER_VOICES['{key}']."
+        )
+    else:
+        topic_map = CLUSTER_TOPIC_LABELS.get(key, {})
+        voice_map = CLUSTER_VOICES[key]
 
-    topic_map = CLUSTER_TOPIC_LABELS.get(prefix, {})
-    voice_map = CLUSTER_VOICES[prefix]
-
-    print(f"[INFO] Prefix detected: {prefix}")
-    print(f"[INFO] Loading {args.input} ...")
-    df = pd.read_csv(args.input)
+    print(f"[INFO] Prefix detected: {prefix} (labels: {args.cluster_map or key})")
 
     # Optional topic labels
     if topic_map:
@@ -1,6 +1,8 @@
 import pandas as pd
 from pathlib import Path
 
+from data_loader import load_table
+
 BASE = Path("data/semantic")
 
 FILES = [
@@ -18,7 +20,7 @@ def main():
 
     for name, path in FILES:
         print(f"\n=== {name} ===")
-        df = pd.read_csv(path)
+        df = load_table(path, columns=["voice"])
 
         counts = df["voice"].value_counts()
         proportions = (counts / len(df) * 100).round(2)
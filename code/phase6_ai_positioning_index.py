@@ -1,5 +1,8 @@
+import numpy as np
 import pandas as pd
 
+from data_loader import load_table
+
 # Where the voiced datasets live
 DATASETS = {
     "hype_top50": "data/semantic/hype_top50_with_voice.csv",
@@ -14,13 +17,44 @@ ALL_VOICES = ["Innovator", "Risk", "Admin", "Pedagogical", "Marketing"]
 OUTPUT = "data/semantic/ai_positioning_index.csv"
 
 
+def index_from_counts(counts: pd.DataFrame) -> pd.DataFrame:
+    """
+    Voice percentages, Governance_Coherence and AI_Optimism_Index from voice counts.
+
+    `counts` has one row per slice and one column per voice; extra voices
+    (e.g. Noise) count toward the total, missing ones count as 0.
+    """
+    total = counts.sum(axis=1).replace(0, np.nan)
+    out = pd.DataFrame(index=counts.index)
+
+    # Percentages per voice
+    for v in ALL_VOICES:
+        out[v] = (counts[v] / total * 100.0).fillna(0.0) if v in counts else 0.0
+
+    # Governance Coherence = Admin + Pedagogical
+    out["Governance_Coherence"] = out["Admin"] + out["Pedagogical"]
+
+    # ---------------------------------------------------------
+    # METRIC UPDATE: AI Optimism Index
+    # Formula: (Innovator + Marketing) / (Risk + Governance + 1)
+    # Reason: A Ratio avoids negative numbers and represents "Promotion vs Control"
+    # The +1 in denominator prevents division by zero.
+    # ---------------------------------------------------------
+
+    promotion_score = out["Innovator"] + out["Marketing"]
+    control_score = out["Risk"] + out["Governance_Coherence"]
+
+    out["AI_Optimism_Index"] = promotion_score / (control_score + 1.0)
+    return out
+
+
 def main():
     rows = []
 
     for name, path in DATASETS.items():
         print(f"[INFO] Processing {name} from {path} ...")
         try:
-            df = pd.read_csv(path)
+            df = load_table(path, columns=["voice"])
         except FileNotFoundError:
             print(f"WARNING: File {path} not found. Skipping.")
             continue
@@ -28,28 +62,9 @@ def main():
         if "voice" not in df.columns:
             raise ValueError(f"'voice' column not found in {path}")
 
-        # Percentages per voice
-        vc = df["voice"].value_counts(normalize=True) * 100.0
-
-        row = {"dataset": name}
-        for v in ALL_VOICES:
-            row[v] = float(vc.get(v, 0.0))  # fill 0 if voice missing
-
-        # Governance Coherence = Admin + Pedagogical
-        row["Governance_Coherence"] = row["Admin"] + row["Pedagogical"]
-
-        # ---------------------------------------------------------
-        # METRIC UPDATE: AI Optimism Index
-        # Formula: (Innovator + Marketing) / (Risk + Governance + 1)
-        # Reason: A Ratio avoids negative numbers and represents "Promotion vs Control"
-        # The +1 in denominator prevents division by zero.
-        # ---------------------------------------------------------
-        
-        promotion_score = row["Innovator"] + row["Marketing"]
-        control_score = row["Risk"] + row["Governance_Coherence"]
-        
-        row["AI_Optimism_Index"] = promotion_score / (control_score + 1.0)
-
+        # Voice counts -> percentages, Governance Coherence, AI Optimism Index
+        counts = df["voice"].value_counts().to_frame().T
+        row = {"dataset": name, **index_from_counts(counts).iloc[0].to_dict()}
         rows.append(row)
 
     out_df = pd.DataFrame(rows).set_index("dataset")
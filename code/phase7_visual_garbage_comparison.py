@@ -1,7 +1,22 @@
+import os
+
 import matplotlib.pyplot as plt
+import pandas as pd
+
+# Stage counts written by the pipeline itself (no hand-copied numbers)
+FUNNEL_PATH = "data/garbage_filter_funnel.csv"     # garbage_filter.py threshold sweep
+STAGE_COUNTS_PATH = "data/phase3_stage_counts.csv"  # phase3_selection.py
 
-# Global pipeline stage counts from your actual logs
-STAGES = [
+# funnel column -> stage label
+FUNNEL_STAGES = {
+    "initial": "Raw scraped",
+    "after_min_ttr": "Low-info filtered",
+    "after_boilerplate": "Boilerplate removed",
+}
+
+# Stage counts from the logs of the published run, plotted when the funnel has not
+# been regenerated (the raw corpus is not shipped with the repo)
+LOGGED_STAGES = [
     "Raw scraped",
     "Low-info filtered",
     "Boilerplate removed",
@@ -9,7 +24,7 @@ STAGES = [
     "Germany+UK + AI-label subset",
 ]
 
-COUNTS = [
+LOGGED_COUNTS = [
     34364,  # Initial size
     33932,  # After low-information filter
     30166,  # After boilerplate removal
@@ -17,16 +32,58 @@ COUNTS = [
     4915,   # After country + label selection (HYPE + CONTROL)
 ]
 
-plt.figure()
-plt.plot(STAGES, COUNTS, marker="o")
-plt.xlabel("Pipeline stage")
-plt.ylabel("Number of documents")
-plt.title("Garbage Removal and Focused Selection Across GANIS Pipeline")
-plt.xticks(rotation=20)
+OUT_PATH = "visuals/garbage_removal_comparison.png"
+
+
+def save_plot(stages, counts, label=None):
+    plt.plot(stages, counts, marker="o", zorder=2, label=label)
+    plt.xlabel("Pipeline stage")
+    plt.ylabel("Number of documents")
+    plt.title("Garbage Removal and Focused Selection Across GANIS Pipeline")
+    plt.xticks(rotation=20)
+    if label:
+        plt.legend(fontsize=6)
+
+    plt.tight_layout()
+    plt.savefig(OUT_PATH, dpi=200)
+    plt.close()
+
+    print(f"[INFO] Saved Garbage Removal Comparison → {OUT_PATH}")
+
+
+def main():
+    if not os.path.exists(FUNNEL_PATH):
+        print(f"[WARN] {FUNNEL_PATH} not found (run code/garbage_filter.py to regenerate it); "
+              f"plotting the logged stage counts.")
+        plt.figure()
+        save_plot(LOGGED_STAGES, LOGGED_COUNTS)
+        return
+
+    funnel = pd.read_csv(FUNNEL_PATH)
+    default = funnel[funnel["is_default"]].iloc[0]
+
+    stages = list(FUNNEL_STAGES.values())
+    counts = [int(default[col]) for col in FUNNEL_STAGES]
+
+    if os.path.exists(STAGE_COUNTS_PATH):
+        later = pd.read_csv(STAGE_COUNTS_PATH)
+        stages += later["stage"].tolist()
+        counts += later["rows"].astype(int).tolist()
+    else:
+        print(f"[WARN] {STAGE_COUNTS_PATH} not found; plotting the phase 2 stages only.")
+
+    plt.figure()
+
+    # every other threshold setting from the sweep, for context
+    n_funnel = len(FUNNEL_STAGES)
+    for _, row in funnel[~funnel["is_default"]].iterrows():
+        plt.plot(stages[:n_funnel], [row[col] for col in FUNNEL_STAGES],
+                 color="lightgrey", linewidth=0.5, zorder=1)
+
+    label = (f"MIN_WORDS={default['min_words']:g}, MIN_CHAR_ENTROPY={default['min_char_entropy']:g}, "
+             f"MIN_TTR={default['min_ttr']:g}")
+    save_plot(stages, counts, label)
 
-out_path = "visuals/garbage_removal_comparison.png"
-plt.tight_layout()
-plt.savefig(out_path, dpi=200)
-plt.close()
 
-print(f"[INFO] Saved Garbage Removal Comparison → {out_path}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
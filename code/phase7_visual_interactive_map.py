@@ -2,6 +2,8 @@ import pandas as pd
 import plotly.express as px
 import os
 
+from data_loader import load_table
+
 # --- CONFIG ---
 # We match the SEMANTIC file (coordinates) with the VOICE file (labels)
 DATA_PAIRS = {
@@ -50,9 +52,10 @@ def main():
         print(f"Processing {label}...")
         try:
             # Load Coordinates
-            df_coords = pd.read_csv(semantic_path)
+            df_coords = load_table(semantic_path, columns=["umap_x", "umap_y", "cluster_id",
+                                                           "Title", "the_name", "file_name"])
             # Load Voices
-            df_voice = pd.read_csv(voice_path)
+            df_voice = load_table(voice_path, columns=["file_name", "voice"])
             
             # MERGE STRATEGY: 
             # We merge on file_name to ensure data aligns perfectly.
@@ -75,7 +78,7 @@ def main():
             continue
 
         # 2. Fill missing voices
-        df["voice"] = df["voice"].fillna("Unassigned")
+        df["voice"] = df["voice"].astype(object).fillna("Unassigned")
 
         # 3. Prepare Hover Data
         hover_data = {}
@@ -1,7 +1,8 @@
 import os
-import pandas as pd
 import matplotlib.pyplot as plt
 
+from data_loader import load_table
+
 FILES = [
     "data/semantic/hype_top50_semantic.csv",
     "data/semantic/hype_ge1000_semantic.csv",
@@ -18,7 +19,7 @@ def ensure_outdir():
 
 
 def plot_umap(file_path):
-    df = pd.read_csv(file_path)
+    df = load_table(file_path, columns=["umap_x", "umap_y", "cluster_id"])
 
     name = os.path.basename(file_path).replace("_semantic.csv", "")
 
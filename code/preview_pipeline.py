@@ -0,0 +1,283 @@
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_loader import load_table
+from domain_rules import blacklist_matches
+from garbage_filter import (LANGUAGE, MIN_CHAR_ENTROPY, MIN_LANG_SCORE, MIN_TTR, MIN_WORDS, RAW_DATA_PATH,
+                            BOILERPLATE_COLUMNS, calculate_text_entropy, contains_boilerplate, type_token_ratio)
+from phase3_selection import BLACKLIST_PATH, load_blacklist, select_subsets
+from phase4_split_by_rank import assign_rank_band
+from phase6_ai_positioning_index import ALL_VOICES, index_from_counts
+from snapshot_store import content_hash
+from stratified_sampler import allocate
+from voice_classifier import VoiceClassifier
+
+# Progressive preview of the whole chain (garbage filter -> blacklist / selection
+# -> rank split -> embedding + voice -> AI_Optimism_Index) on nested, seeded,
+# stratified samples of the raw table:
+#
+#   increment 0 = 5% of every stratum, increment 1 = 10% (the same 5% + 5% more), ...
+#
+# Only the rows new to an increment go through the chain. Text statistics and
+# embeddings are cached per content hash in data/preview/cache, so re-running the
+# preview after changing a threshold or the blacklist only pays for the filters.
+# Voices come from the phase 5 model bundles (--save_models), so the clusters keep
+# their labelled meaning. Each increment reports the index with stratified
+# bootstrap error bars; the run stops once the estimates move less than the tolerance.
+
+OUTPUT_PATH = "data/preview/preview_index.csv"
+CACHE_DIR = "data/preview/cache"
+MODELS_DIR = "data/semantic"
+
+FRACTIONS = [0.05, 0.1, 0.2, 0.4, 1.0]
+STRATA = ["the_country", "Labels", "rank_band"]
+SUBSETS = ["hype_top50", "hype_ge1000", "control_top50", "control_ge1000"]
+N_BOOTSTRAP = 1000
+TOLERANCE = 0.05       # max change of AI_Optimism_Index between increments to stop
+PHASE5_MIN_WORDS = 30  # phase5_semantic_pipeline.py --min_words default
+
+RAW_COLUMNS = ["url", "the_domain", "the_name", "the_country", "the_rank", "Labels", "lang_detected",
+               "lang_score", "raw_word_count"] + BOILERPLATE_COLUMNS
+
+
+def nested_levels(df: pd.DataFrame, strata, fractions, seed: int = 42) -> np.ndarray:
+    """
+    First increment each row belongs to (len(fractions) = never). Rows are ranked
+    by a seeded random key within their stratum; increment k holds the first
+    quota_k of them (proportional allocation of fractions[k] of the rows), so
+    every increment contains the previous one.
+    """
+    rng = np.random.default_rng(seed)
+    key = rng.random(len(df))
+    codes = (df.groupby(list(strata), dropna=False, sort=False).ngroup().to_numpy() if strata
+             else np.zeros(len(df), dtype=np.int64))
+    order = np.lexsort((key, codes))  # by stratum, then by random key
+
+    sizes = np.bincount(codes)
+    starts = np.r_[0, np.cumsum(sizes)[:-1]]
+    rank = np.empty(len(df), dtype=np.int64)
+    rank[order] = np.arange(len(df)) - starts[codes[order]]
+
+    levels = np.zeros(len(df), dtype=np.int64)
+    quota = np.zeros(len(sizes), dtype=np.int64)
+    for f in fractions:
+        # largest-remainder split of round(f * n) rows; never below the previous increment
+        step = allocate(dict(enumerate(sizes)), int(round(f * len(df))))
+        quota = np.maximum(quota, [step[i] for i in range(len(sizes))])
+        levels += rank >= quota[codes]
+    return levels
+
+
+def bootstrap_index(voices: pd.Series, strata: pd.Series, n_boot: int = N_BOOTSTRAP, seed: int = 42) -> dict:
+    """AI_Optimism_Index with a stratified bootstrap 95% interval (multinomial resampling per stratum)."""
+    rng = np.random.default_rng(seed)
+    voice_names = sorted(set(voices) | set(ALL_VOICES))
+    codes = pd.Categorical(voices, categories=voice_names).codes
+    table = pd.crosstab(strata.to_numpy(), codes).reindex(columns=range(len(voice_names)), fill_value=0)
+
+    counts = table.to_numpy()
+    boot = np.zeros((n_boot, len(voice_names)), dtype=np.int64)
+    for row in counts:
+        n = row.sum()
+        boot += rng.multinomial(n, row / n, size=n_boot)
+
+    point = index_from_counts(pd.DataFrame([counts.sum(axis=0)], columns=voice_names)).iloc[0]
+    dist = index_from_counts(pd.DataFrame(boot, columns=voice_names))["AI_Optimism_Index"].to_numpy()
+    low, high = np.percentile(dist, [2.5, 97.5])
+    return {"n_docs": int(counts.sum()), **point.to_dict(), "ci_low": float(low), "ci_high": float(high)}
+
+
+def cached_embedding_dir(root: str, model_name: str) -> str:
+    return os.path.join(root, "embeddings", model_name.replace("/", "__"))
+
+
+def load_cached_embeddings(embedding_dir: str) -> dict:
+    """content hash -> embedding from the cache's .npz files (read only; {} when there are none)."""
+    embeddings = {}
+    for path in sorted(glob.glob(os.path.join(embedding_dir, "*.npz"))):
+        with np.load(path) as z:
+            embeddings.update(zip(z["hashes"].tolist(), z["vectors"]))
+    return embeddings
+
+
+class PreviewCache:
+    """Text statistics and embeddings per content hash, appended to as the preview goes."""
+
+    def __init__(self, root: str = CACHE_DIR, model_name: str = "all-MiniLM-L6-v2"):
+        self.root = root
+        self.stats_path = os.path.join(root, "text_stats.csv")
+        self.embedding_dir = cached_embedding_dir(root, model_name)
+        os.makedirs(self.embedding_dir, exist_ok=True)
+
+        self.stats = (pd.read_csv(self.stats_path, index_col="content_hash")
+                      if os.path.exists(self.stats_path) else pd.DataFrame(columns=["char_entropy", "ttr"]))
+        self.embeddings = load_cached_embeddings(self.embedding_dir)
+
+    def text_stats(self, hashes: pd.Series, texts: pd.Series) -> pd.DataFrame:
+        missing = ~hashes.isin(self.stats.index)
+        new = hashes[missing].drop_duplicates()
+        if len(new):
+            body = texts.loc[new.index]
+            fresh = pd.DataFrame({
+                "char_entropy": [calculate_text_entropy(t) for t in body],
+                "ttr": [type_token_ratio(t) for t in body],
+            }, index=pd.Index(new.to_numpy(), name="content_hash"))
+            fresh.to_csv(self.stats_path, mode="a", header=not os.path.exists(self.stats_path))
+            self.stats = pd.concat([self.stats, fresh]) if len(self.stats) else fresh
+        return self.stats.loc[hashes.to_numpy()].set_axis(hashes.index)
+
+    def encode(self, hashes: pd.Series, texts: pd.Series, encoder, batch_size: int = 32) -> np.ndarray:
+        new = hashes[~hashes.isin(list(self.embeddings))].drop_duplicates()
+        if len(new):
+            vectors = np.asarray(encoder.encode(texts.loc[new.index].tolist(), batch_size=batch_size,
+                                                show_progress_bar=False), dtype=np.float16)
+            path = os.path.join(self.embedding_dir, f"{time.strftime('%Y%m%d%H%M%S')}_{len(self.embeddings)}.npz")
+            np.savez(path, hashes=new.to_numpy().astype(str), vectors=vectors)
+            self.embeddings.update(zip(new.tolist(), vectors))
+        return np.stack([self.embeddings[h] for h in hashes]).astype(np.float32)
+
+
+def load_classifiers(models_dir: str) -> dict:
+    """Subset prefix -> VoiceClassifier from <prefix>_models.joblib (or joint_models.joblib)."""
+    classifiers = {}
+    joint = os.path.join(models_dir, "joint_models.joblib")
+    for prefix in SUBSETS:
+        path = os.path.join(models_dir, f"{prefix}_models.joblib")
+        if not os.path.exists(path):
+            path = joint
+        if not os.path.exists(path):
+            print(f"[WARN] No model bundle for {prefix} in {models_dir} "
+                  f"(run phase5 with --save_models). Skipping this subset.")
+            continue
+        try:
+            classifiers[prefix] = VoiceClassifier.from_bundle(path)
+        except ValueError as e:
+            # e.g. an empty voice map: every document would be "Noise" and the index a flat 0
+            print(f"[WARN] {e} ({path}). Skipping {prefix}.")
+    return classifiers
+
+
+def run_chain(df: pd.DataFrame, cache: PreviewCache, blacklist, classifiers: dict) -> pd.DataFrame:
+    """garbage filter -> blacklist -> selection -> rank split -> voice, for the rows of df."""
+    content = df["content_text"].astype(object)
+    keep = content.notna().to_numpy()
+    if "lang_detected" in df.columns:
+        keep &= (df["lang_detected"].astype(object) == LANGUAGE).to_numpy()
+    if "lang_score" in df.columns:
+        keep &= (pd.to_numeric(df["lang_score"], errors="coerce") >= MIN_LANG_SCORE).to_numpy()
+    df = df[keep].copy()
+
+    hashes = content_hash(df)
+    stats = cache.text_stats(hashes, df["content_text"].astype(str))
+    word_count = (pd.to_numeric(df["raw_word_count"], errors="coerce") if "raw_word_count" in df.columns
+                  else df["content_text"].astype(str).str.split().str.len())
+    lowinfo = (word_count >= MIN_WORDS) & (stats["char_entropy"] >= MIN_CHAR_ENTROPY) & (stats["ttr"] >= MIN_TTR)
+    df = df[lowinfo.to_numpy()]
+    boiler = [contains_boilerplate(row) for row in df[[c for c in BOILERPLATE_COLUMNS if c in df]].to_dict("records")]
+    df = df[~np.array(boiler, dtype=bool)]
+
+    if len(blacklist) and len(df):
+        df = df[blacklist_matches(df, blacklist).isna().to_numpy()]
+
+    hype, control = select_subsets(df)
+    parts = []
+    for name, part in [("hype", hype), ("control", control)]:
+        band = assign_rank_band(part["the_rank"]).to_numpy()
+        for rank in ["top50", "ge1000"]:
+            prefix = f"{name}_{rank}"
+            sub = part[band == rank].copy()
+            if prefix not in classifiers or sub.empty:
+                continue
+            # phase 5 length filter on Title + content_text
+            text = (sub["Title"].astype(object).fillna("").astype(str).str.strip() + "\n\n"
+                    + sub["content_text"].astype(str).str.strip()).str.strip()
+            sub = sub[text.str.split().str.len() >= PHASE5_MIN_WORDS]
+            if sub.empty:
+                continue
+            text = text.loc[sub.index]
+            clf = classifiers[prefix]
+            embeddings = cache.encode(content_hash(sub), text, clf.encoder)
+            labels, _ = clf.predict_embeddings(embeddings)
+            sub["subset"] = prefix
+            sub["voice"] = [clf.voice_map.get(int(c), "Noise") for c in labels]
+            parts.append(sub)
+    if not parts:
+        return pd.DataFrame(columns=["subset", "voice"] + STRATA)
+    return pd.concat(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preview the AI_Optimism_Index on growing stratified samples.")
+    parser.add_argument("--input", default=RAW_DATA_PATH, help=f"Raw table (default: {RAW_DATA_PATH})")
+    parser.add_argument("--fractions", type=float, nargs="+", default=FRACTIONS,
+                        help=f"Nested sample sizes, increasing (default: {FRACTIONS})")
+    parser.add_argument("--strata", nargs="*", default=STRATA, help=f"Default: {STRATA}")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help=f"Stop when no subset's index moves more than this (default: {TOLERANCE})")
+    parser.add_argument("--n_bootstrap", type=int, default=N_BOOTSTRAP)
+    parser.add_argument("--models_dir", default=MODELS_DIR,
+                        help=f"Where the phase 5 model bundles are (default: {MODELS_DIR})")
+    parser.add_argument("--blacklist", default=BLACKLIST_PATH)
+    parser.add_argument("--cache_dir", default=CACHE_DIR)
+    parser.add_argument("--output", default=OUTPUT_PATH,
+                        help=f"Rewritten after every increment (default: {OUTPUT_PATH})")
+    args = parser.parse_args()
+
+    if sorted(args.fractions) != args.fractions or not 0 < args.fractions[0] or args.fractions[-1] > 1:
+        raise ValueError("--fractions must be increasing values in (0, 1].")
+
+    classifiers = load_classifiers(args.models_dir)
+    if not classifiers:
+        print("ERROR: No model bundles found. Run phase5_semantic_pipeline.py with --save_models first.")
+        return
+    cache = PreviewCache(args.cache_dir, next(iter(classifiers.values())).model_name)
+    blacklist = load_blacklist(args.blacklist)
+
+    print(f"[INFO] Loading {args.input} ...")
+    raw = load_table(args.input, columns=RAW_COLUMNS)
+    raw["rank_band"] = assign_rank_band(raw["the_rank"]).to_numpy()
+    levels = nested_levels(raw, args.strata, args.fractions, args.seed)
+    strata_key = raw[args.strata].astype(str).agg("|".join, axis=1) if args.strata else pd.Series("all", raw.index)
+    print(f"[INFO] {len(raw)} raw rows in {strata_key.nunique()} strata.")
+
+    done, history, previous = [], [], None
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    for k, fraction in enumerate(args.fractions):
+        start = time.perf_counter()
+        new_rows = raw[levels == k]
+        done.append(run_chain(new_rows, cache, blacklist, classifiers))
+        voiced = pd.concat(done)
+
+        rows = []
+        for prefix, sub in voiced.groupby("subset", sort=False):
+            est = bootstrap_index(sub["voice"], strata_key.loc[sub.index], args.n_bootstrap, args.seed)
+            rows.append({"increment": k, "fraction": fraction, "sampled_rows": int((levels <= k).sum()),
+                         "subset": prefix, **est})
+        table = pd.DataFrame(rows).set_index("subset")
+        history.append(table.reset_index())
+        pd.concat(history).to_csv(args.output, index=False)
+
+        print(f"\n=== Increment {k}: {fraction:.0%} sample ({len(new_rows)} new raw rows, "
+              f"{time.perf_counter() - start:.1f}s) ===")
+        with pd.option_context("display.max_columns", None, "display.width", 200):
+            print(table[["n_docs", "Innovator", "Risk", "Admin", "AI_Optimism_Index", "ci_low", "ci_high"]].round(3))
+
+        if previous is not None and k < len(args.fractions) - 1:
+            shared = table.index.intersection(previous.index)
+            change = (table.loc[shared, "AI_Optimism_Index"] - previous.loc[shared, "AI_Optimism_Index"]).abs()
+            if len(shared) == len(table) and change.max() <= args.tolerance:
+                print(f"\n✅ Converged: no subset moved more than {args.tolerance} "
+                      f"(max change {change.max():.4f}). Stopping at {fraction:.0%}.")
+                break
+        previous = table
+    print(f"[INFO] Preview estimates saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
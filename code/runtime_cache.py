@@ -0,0 +1,25 @@
+import os
+
+# Persistent caches shared by every invocation:
+#   numba    UMAP / pynndescent JIT kernels (NUMBA_CACHE_DIR)
+#   models   SentenceTransformer downloads (SENTENCE_TRANSFORMERS_HOME)
+# Variables that are already set in the environment win.
+# configure_caches() must run before numba / sentence_transformers are imported.
+
+CACHE_DIR = os.environ.get("GANIS_CACHE_DIR", "data/cache")
+
+
+def cache_paths(cache_dir: str = CACHE_DIR) -> dict:
+    root = os.path.abspath(cache_dir)
+    return {
+        "NUMBA_CACHE_DIR": os.path.join(root, "numba"),
+        "SENTENCE_TRANSFORMERS_HOME": os.path.join(root, "models"),
+    }
+
+
+def configure_caches(cache_dir: str = CACHE_DIR) -> dict:
+    """Point the numba and model caches at cache_dir (unless set already); returns the paths in use."""
+    for var, path in cache_paths(cache_dir).items():
+        os.environ.setdefault(var, path)
+        os.makedirs(os.environ[var], exist_ok=True)
+    return {var: os.environ[var] for var in cache_paths(cache_dir)}
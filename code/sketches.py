@@ -0,0 +1,229 @@
+import numpy as np
+import pandas as pd
+
+# Mergeable streaming sketches used by the corpus profiler.
+# All of them hash with pandas' stable hash_array, so sketches built in
+# different processes (or on different shards) can be merged.
+
+
+def hash_values(values) -> np.ndarray:
+    """Stable 64-bit hashes for a 1-D array of values (numbers hash as float64)."""
+    arr = np.asarray(values)
+    if arr.dtype.kind in "iufb":
+        arr = arr.astype(np.float64)
+    else:
+        # elementwise str() on an object array: arr.astype(str) would first build a
+        # fixed-width <U{longest value} buffer, hundreds of MB for a chunk of page text
+        arr = pd.Series(arr, dtype=object, copy=False).astype(str).to_numpy(dtype=object)
+    return pd.util.hash_array(arr, categorize=False).astype(np.uint64)
+
+
+def _bit_length(x: np.ndarray) -> np.ndarray:
+    """Exact bit length of uint64 values (split in 32-bit halves so floats stay exact)."""
+    hi = (x >> np.uint64(32)).astype(np.float64)
+    lo = (x & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(hi > 0, 32 + np.frexp(hi)[1], np.frexp(lo)[1])
+
+
+class HyperLogLog:
+    """HyperLogLog distinct counter with 2**p one-byte registers."""
+
+    def __init__(self, p: int = 14):
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def add_hashes(self, hashes: np.ndarray):
+        if len(hashes) == 0:
+            return
+        h = np.asarray(hashes, dtype=np.uint64)
+        idx = (h >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = h & np.uint64((1 << (64 - self.p)) - 1)
+        rho = ((64 - self.p) - _bit_length(rest) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rho)
+
+    def add(self, values):
+        self.add_hashes(hash_values(values))
+
+    def merge(self, other: "HyperLogLog"):
+        if other.p != self.p:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision.")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m ** 2 / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            # small range correction (linear counting)
+            estimate = self.m * np.log(self.m / zeros)
+        return int(round(estimate))
+
+
+class CountMinSketch:
+    """Count-min sketch: upper-bound frequency estimates in depth x width counters."""
+
+    _SALTS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9,
+                       0xD6E8FEB86659FD93, 0xFF51AFD7ED558CCD, 0xC4CEB9FE1A85EC53],
+                      dtype=np.uint64)
+
+    def __init__(self, width: int = 4096, depth: int = 4):
+        if width & (width - 1):
+            raise ValueError("CountMinSketch width must be a power of two.")
+        if depth > len(self._SALTS):
+            raise ValueError(f"CountMinSketch depth must be <= {len(self._SALTS)}.")
+        self.width = width
+        self.depth = depth
+        self.shift = np.uint64(64 - int(np.log2(width)))
+        self.table = np.zeros((depth, width), dtype=np.int64)
+
+    def _index(self, hashes: np.ndarray, row: int) -> np.ndarray:
+        with np.errstate(over="ignore"):
+            mixed = (hashes ^ self._SALTS[row]) * np.uint64(0xBF58476D1CE4E5B9)
+        return (mixed >> self.shift).astype(np.int64)
+
+    def add_hashes(self, hashes: np.ndarray, counts=None):
+        h = np.asarray(hashes, dtype=np.uint64)
+        c = np.ones(len(h), dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+        for row in range(self.depth):
+            np.add.at(self.table[row], self._index(h, row), c)
+
+    def estimate_hashes(self, hashes: np.ndarray) -> np.ndarray:
+        h = np.asarray(hashes, dtype=np.uint64)
+        est = [self.table[row, self._index(h, row)] for row in range(self.depth)]
+        return np.min(est, axis=0)
+
+    def merge(self, other: "CountMinSketch"):
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Cannot merge CountMinSketch sketches of different shape.")
+        self.table += other.table
+        return self
+
+
+class TopKSketch:
+    """
+    Heavy hitters with a mergeable Space-Saving style summary plus a count-min
+    sketch for tighter upper bounds.
+
+    `candidates` keeps at most `capacity` items with lower-bound counts; every
+    prune adds the largest dropped count to `error`, so true counts lie in
+    [count, min(count + error, count-min estimate)].
+    """
+
+    def __init__(self, capacity: int = 200, width: int = 4096, depth: int = 4):
+        self.capacity = capacity
+        self.candidates = pd.Series(dtype=np.int64)
+        self.error = 0
+        self.total = 0
+        self.cms = CountMinSketch(width, depth)
+
+    def _absorb(self, counts: pd.Series, error: int = 0):
+        merged = self.candidates.add(counts, fill_value=0).astype(np.int64)
+        self.error += error
+        if len(merged) > self.capacity:
+            merged = merged.sort_values(ascending=False, kind="stable")
+            self.error += int(merged.iloc[self.capacity])
+            merged = merged.iloc[: self.capacity]
+        self.candidates = merged
+
+    def add(self, values):
+        counts = pd.Series(values).dropna().astype(str).value_counts()
+        if counts.empty:
+            return
+        self.total += int(counts.sum())
+        self.cms.add_hashes(hash_values(counts.index.values), counts.values)
+        self._absorb(counts)
+
+    def merge(self, other: "TopKSketch"):
+        self.total += other.total
+        self.cms.merge(other.cms)
+        self._absorb(other.candidates, other.error)
+        return self
+
+    def top(self, k: int = 20) -> pd.DataFrame:
+        """Top-k items with lower and upper count bounds."""
+        if self.candidates.empty:
+            return pd.DataFrame(columns=["item", "count", "upper_bound", "share_pct"])
+        best = self.candidates.sort_values(ascending=False, kind="stable").head(k)
+        upper = np.minimum(best.values + self.error,
+                           self.cms.estimate_hashes(hash_values(best.index.values)))
+        return pd.DataFrame({
+            "item": best.index,
+            "count": best.values,
+            "upper_bound": upper,
+            "share_pct": (best.values / max(self.total, 1) * 100).round(2),
+        })
+
+
+class QuantileSketch:
+    """
+    KLL-style quantile sketch: a stack of compactors where an item at level h
+    stands for 2**h inputs. Memory is O(k log(n / k)); sketches merge by
+    concatenating levels and compacting again.
+    """
+
+    def __init__(self, k: int = 200, seed: int = 0):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compact(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                keep = items[-1:] if len(items) % 2 else items[:0]
+                pairs = items[: len(items) - len(keep)]
+                promoted = pairs[self.rng.integers(0, 2)::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def add(self, values):
+        v = pd.to_numeric(pd.Series(values), errors="coerce").dropna().to_numpy(np.float64)
+        if len(v) == 0:
+            return
+        self.n += len(v)
+        self.min = min(self.min, float(v.min()))
+        self.max = max(self.max, float(v.max()))
+        self.levels[0] = np.concatenate([self.levels[0], v])
+        self._compact()
+
+    def merge(self, other: "QuantileSketch"):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compact()
+        return self
+
+    def quantiles(self, qs) -> list:
+        if self.n == 0:
+            return [np.nan for _ in qs]
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(lv), 2.0 ** h) for h, lv in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        items, cum = items[order], np.cumsum(weights[order])
+        out = []
+        for q in qs:
+            if q <= 0:
+                out.append(self.min)
+            elif q >= 1:
+                out.append(self.max)
+            else:
+                out.append(float(items[np.searchsorted(cum, q * cum[-1])]))
+        return out
@@ -0,0 +1,208 @@
+import argparse
+import hashlib
+import os
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from phase6_ai_positioning_index import DATASETS, index_from_counts
+
+# Append-only store of crawl snapshots:
+#
+#   snapshots.csv              one row per ingested snapshot
+#   documents.csv              metadata per unique document (content hash), stored once
+#   memberships/<snap>.csv     content_hash, dataset, cluster_id, topic_label, voice
+#   aggregates.csv             voice counts per snapshot x dataset x institution
+#
+# Trend queries only read aggregates.csv, never the documents.
+#
+# snapshots.csv is written last and is the commit point of an ingest: rows of a
+# snapshot that never got registered (an interrupted ingest) are ignored by trend
+# and removed by the next ingest before it appends anything.
+
+STORE_DIR = "data/snapshots"
+
+METADATA_COLUMNS = ["url", "Title", "the_name", "the_country", "the_rank", "the_domain", "Labels"]
+MEMBERSHIP_COLUMNS = ["cluster_id", "topic_label", "voice"]
+
+
+def content_hash(df: pd.DataFrame) -> pd.Series:
+    """SHA-1 of Title + content_text (the text we embed), used to dedupe across snapshots."""
+    title = df["Title"].fillna("").astype(str).str.strip() if "Title" in df else ""
+    body = df["content_text"].fillna("").astype(str).str.strip()
+    text = (title + "\n\n" + body).str.strip()
+    return text.map(lambda t: hashlib.sha1(t.encode("utf-8")).hexdigest())
+
+
+def dataset_name(path: str) -> str:
+    """hype_top50_with_voice.csv -> hype_top50"""
+    base = os.path.basename(path)
+    for suffix in ["_with_voice.csv", "_semantic.csv", ".csv"]:
+        if base.endswith(suffix):
+            return base[: -len(suffix)]
+    return base
+
+
+class SnapshotStore:
+    def __init__(self, root: str = STORE_DIR):
+        self.root = root
+        self.snapshots_path = os.path.join(root, "snapshots.csv")
+        self.documents_path = os.path.join(root, "documents.csv")
+        self.aggregates_path = os.path.join(root, "aggregates.csv")
+        self.memberships_dir = os.path.join(root, "memberships")
+
+    def _read(self, path, **kwargs) -> pd.DataFrame:
+        if not os.path.exists(path):
+            return pd.DataFrame()
+        return pd.read_csv(path, **kwargs)
+
+    @staticmethod
+    def _append(df: pd.DataFrame, path: str):
+        df.to_csv(path, mode="a", header=not os.path.exists(path), index=False)
+
+    def snapshots(self) -> pd.DataFrame:
+        return self._read(self.snapshots_path, dtype={"snapshot": str})
+
+    def _repair(self, registered: set):
+        """Drop rows and membership files left behind by an interrupted ingest."""
+        for path, col in [(self.documents_path, "first_snapshot"), (self.aggregates_path, "snapshot")]:
+            ids = self._read(path, usecols=[col], dtype={col: str})
+            if ids.empty or ids[col].isin(registered).all():
+                continue
+            df = self._read(path, dtype={col: str})
+            keep = df[col].isin(registered)
+            print(f"[WARN] Removing {int((~keep).sum())} rows of unregistered snapshots from {path}.")
+            tmp = path + ".tmp"
+            df[keep].to_csv(tmp, index=False)
+            os.replace(tmp, path)
+        if os.path.isdir(self.memberships_dir):
+            for fname in os.listdir(self.memberships_dir):
+                if fname.endswith(".csv") and fname[:-4] not in registered:
+                    os.remove(os.path.join(self.memberships_dir, fname))
+
+    def ingest(self, snapshot: str, frames: dict) -> dict:
+        """
+        Add one crawl snapshot. `frames` maps dataset name -> *_with_voice DataFrame.
+        Existing snapshots are never rewritten.
+        """
+        snapshot = str(snapshot)
+        if not snapshot.strip() or snapshot in (".", "..") or any(sep in snapshot for sep in "/\\"):
+            raise ValueError(f"Invalid snapshot id '{snapshot}' (it names a file; no path separators).")
+        known = self.snapshots()
+        registered = set(known["snapshot"]) if not known.empty else set()
+        if snapshot in registered:
+            raise ValueError(f"Snapshot '{snapshot}' already exists in {self.root} (store is append-only).")
+
+        os.makedirs(self.memberships_dir, exist_ok=True)
+        self._repair(registered)
+
+        parts = []
+        for name, df in frames.items():
+            if "voice" not in df.columns:
+                raise ValueError(f"'voice' column not found for dataset {name}")
+            part = pd.DataFrame({"content_hash": content_hash(df).values, "dataset": name})
+            for col in METADATA_COLUMNS + MEMBERSHIP_COLUMNS:
+                part[col] = df[col].values if col in df.columns else pd.NA
+            parts.append(part)
+        docs = pd.concat(parts, ignore_index=True)
+
+        # 1) new documents only (dedupe by content hash across all snapshots)
+        seen = self._read(self.documents_path, usecols=["content_hash"])
+        seen_hashes = set(seen["content_hash"]) if not seen.empty else set()
+        new_docs = docs.drop_duplicates("content_hash")
+        new_docs = new_docs[~new_docs["content_hash"].isin(seen_hashes)]
+        new_docs = new_docs[["content_hash"] + METADATA_COLUMNS].assign(first_snapshot=snapshot)
+        self._append(new_docs, self.documents_path)
+
+        # 2) this snapshot's voice / cluster assignments
+        docs[["content_hash", "dataset"] + MEMBERSHIP_COLUMNS].to_csv(
+            os.path.join(self.memberships_dir, f"{snapshot}.csv"), index=False
+        )
+
+        # 3) incremental partial aggregates
+        agg = (
+            docs.assign(the_name=docs["the_name"].fillna("<unknown>"))
+            .groupby(["dataset", "the_name", "voice"], dropna=False)
+            .size()
+            .rename("n")
+            .reset_index()
+            .assign(snapshot=snapshot)
+        )
+        self._append(agg[["snapshot", "dataset", "the_name", "voice", "n"]], self.aggregates_path)
+
+        summary = {
+            "snapshot": snapshot,
+            "ingested_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "n_docs": len(docs),
+            "n_new_docs": len(new_docs),
+            "datasets": ";".join(frames),
+        }
+        # registering the snapshot commits the ingest
+        self._append(pd.DataFrame([summary]), self.snapshots_path)
+        return summary
+
+    def trend(self, dataset: str = None, institution: str = None, by_institution: bool = False) -> pd.DataFrame:
+        """
+        AI_Optimism_Index (and voice shares) per snapshot, optionally for one
+        dataset and/or institution, computed from the precomputed partials.
+        """
+        agg = self._read(self.aggregates_path, dtype={"snapshot": str})
+        if agg.empty:
+            return pd.DataFrame()
+        # only committed snapshots (see _repair)
+        order = {s: i for i, s in enumerate(self.snapshots()["snapshot"])}
+        agg = agg[agg["snapshot"].isin(order)]
+        if dataset:
+            agg = agg[agg["dataset"] == dataset]
+        if institution:
+            agg = agg[agg["the_name"] == institution]
+
+        keys = ["snapshot", "the_name"] if by_institution else ["snapshot"]
+        counts = agg.pivot_table(index=keys, columns="voice", values="n", aggfunc="sum", fill_value=0)
+        out = index_from_counts(counts)
+        out.insert(0, "n_docs", counts.sum(axis=1))
+
+        # keep snapshots in ingestion order
+        return out.sort_index(key=lambda idx: idx.map(order) if idx.name == "snapshot" else idx)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append-only crawl snapshot store with voice/index trends.")
+    parser.add_argument("--store", default=STORE_DIR, help=f"Store directory (default: {STORE_DIR})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_ingest = sub.add_parser("ingest", help="Add the current *_with_voice.csv files as a snapshot")
+    p_ingest.add_argument("--snapshot", required=True, help="Snapshot id, e.g. 2025-11")
+    p_ingest.add_argument("--files", nargs="*", default=None,
+                          help="*_with_voice.csv files (default: the four phase 6 datasets)")
+
+    p_trend = sub.add_parser("trend", help="AI_Optimism_Index over snapshots")
+    p_trend.add_argument("--dataset", default=None, help="e.g. hype_top50 (default: all datasets)")
+    p_trend.add_argument("--institution", default=None, help="the_name of one institution")
+    p_trend.add_argument("--by_institution", action="store_true", help="One row per snapshot x institution")
+
+    args = parser.parse_args()
+    store = SnapshotStore(args.store)
+
+    if args.command == "ingest":
+        paths = {dataset_name(p): p for p in args.files} if args.files else DATASETS
+        frames = {}
+        for name, path in paths.items():
+            if not os.path.exists(path):
+                print(f"WARNING: File {path} not found. Skipping.")
+                continue
+            frames[name] = pd.read_csv(path)
+        summary = store.ingest(args.snapshot, frames)
+        print(f"[INFO] Ingested snapshot {summary['snapshot']}: {summary['n_docs']} docs, "
+              f"{summary['n_new_docs']} new ({summary['datasets']})")
+    else:
+        trend = store.trend(args.dataset, args.institution, args.by_institution)
+        if trend.empty:
+            print("[INFO] No snapshots match.")
+            return
+        with pd.option_context("display.max_columns", None, "display.width", 200):
+            print(trend[["n_docs", "Innovator", "Risk", "Admin", "Governance_Coherence", "AI_Optimism_Index"]])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import zlib
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from data_loader import iter_table
+from phase4_split_by_rank import assign_rank_band
+
+# Columns we know how to stratify on ("rank_band" is derived from the_rank)
+STRATA_COLUMNS = ["the_country", "Labels", "rank_band", "the_domain", "cluster_id"]
+
+ALLOCATIONS = ["proportional", "equal"]
+
+CHUNK_SIZE = 5000
+
+
+def add_rank_band(df: pd.DataFrame) -> pd.DataFrame:
+    """Add the derived 'rank_band' column if it is missing."""
+    if "rank_band" not in df.columns and "the_rank" in df.columns:
+        df = df.copy()
+        df["rank_band"] = assign_rank_band(df["the_rank"]).values
+    return df
+
+
+def stratum_keys(chunk: pd.DataFrame, strata) -> pd.Series:
+    """Stratum key (tuple of the strata values, "<NA>" for missing) per row."""
+    missing = [c for c in strata if c not in chunk.columns]
+    if missing:
+        raise ValueError(f"Strata columns not found in input: {missing}")
+    parts = [chunk[c].astype(str).where(chunk[c].notna(), "<NA>") for c in strata]
+    if not parts:
+        return pd.Series(["<all>"] * len(chunk), index=chunk.index)
+    return pd.Series(list(zip(*parts)), index=chunk.index)
+
+
+def allocate(sizes: dict, n: int, allocation: str = "proportional") -> dict:
+    """
+    Split a total sample size n over strata.
+
+    proportional: n * stratum_size / total, rounded with the largest remainder method.
+    equal:        n / number_of_strata each; strata that are too small hand their
+                  unused quota to the others (water filling).
+    No stratum is ever asked for more rows than it has.
+    """
+    if allocation not in ALLOCATIONS:
+        raise ValueError(f"Unknown allocation '{allocation}'. Use one of {ALLOCATIONS}.")
+
+    keys = list(sizes)
+    avail = np.array([sizes[k] for k in keys], dtype=np.int64)
+    n = int(min(n, avail.sum()))
+    quota = np.zeros(len(keys), dtype=np.int64)
+    if n == 0:
+        return dict(zip(keys, quota.tolist()))
+
+    if allocation == "proportional":
+        exact = n * avail / avail.sum()
+        quota = np.floor(exact).astype(np.int64)
+        remainder = n - quota.sum()
+        order = np.argsort(-(exact - quota), kind="stable")
+        quota[order[:remainder]] += 1
+    else:
+        remaining = n
+        open_ = avail > 0
+        while remaining > 0 and open_.any():
+            share = max(remaining // open_.sum(), 1)
+            for i in np.flatnonzero(open_):
+                take = min(share, avail[i] - quota[i], remaining)
+                quota[i] += take
+                remaining -= take
+                if quota[i] >= avail[i]:
+                    open_[i] = False
+                if remaining == 0:
+                    break
+
+    return dict(zip(keys, quota.tolist()))
+
+
+class StratifiedReservoirSampler:
+    """
+    Seeded stratified reservoir sampling over a stream of DataFrame chunks.
+
+    Every stratum keeps a uniform reservoir (Algorithm R) of at most `capacity`
+    rows, so memory is bounded by capacity x number of strata, never by the size
+    of the corpus. With `quota` (stratum key -> rows, from a counting pass) each
+    reservoir only holds its own quota and the total stays at the sample size.
+    Each stratum draws from its own generator, seeded from (seed, stratum key),
+    so the sample does not depend on how the stream is chunked or how strata
+    interleave.
+    """
+
+    def __init__(self, strata, capacity: int, seed: int = 42, quota: dict = None):
+        unknown = [c for c in strata if c not in STRATA_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown strata columns {unknown}. Use any of {STRATA_COLUMNS}.")
+        self.strata = list(strata)
+        self.capacity = int(capacity)
+        self.seed = seed
+        self.quota = quota    # stratum key -> reservoir capacity (None: `capacity` for every stratum)
+        self.rngs = {}        # stratum key -> its own generator
+        self.seen = {}        # stratum key -> rows seen so far
+        self.reservoirs = {}  # stratum key -> list of row dicts
+
+    def update(self, chunk: pd.DataFrame):
+        """Feed one chunk of rows into the per-stratum reservoirs."""
+        chunk = add_rank_band(chunk)
+        keys = stratum_keys(chunk, self.strata)
+        for key, idx in keys.groupby(keys, sort=False).indices.items():
+            self._update_stratum(key, chunk.iloc[idx])
+
+    def _update_stratum(self, key, rows: pd.DataFrame):
+        seen = self.seen.get(key, 0)
+        capacity = self.capacity if self.quota is None else min(self.capacity, self.quota.get(key, 0))
+        res = self.reservoirs.setdefault(key, [])
+        rng = self.rngs.get(key)
+        if rng is None:
+            rng = self.rngs[key] = np.random.default_rng([self.seed, zlib.crc32(repr(key).encode("utf-8"))])
+
+        # 1) fill the reservoir
+        fill = min(capacity - len(res), len(rows))
+        if fill > 0:
+            res.extend(rows.iloc[:fill].to_dict("records"))
+
+        # 2) replace with probability capacity / t for the t-th row of the stratum
+        rest = len(rows) - fill
+        if rest > 0:
+            t = np.arange(seen + fill + 1, seen + len(rows) + 1)
+            slots = rng.integers(0, t)
+            accepted = np.flatnonzero(slots < capacity)
+            if len(accepted):
+                records = rows.iloc[fill + accepted].to_dict("records")
+                # applied in stream order so later rows overwrite earlier ones
+                for slot, record in zip(slots[accepted], records):
+                    res[slot] = record
+
+        self.seen[key] = seen + len(rows)
+
+    def stratum_sizes(self) -> dict:
+        return dict(self.seen)
+
+    def sample(self, n: int, allocation: str = "proportional") -> pd.DataFrame:
+        """Draw the final stratified sample of (at most) n rows."""
+        if n > self.capacity:
+            raise ValueError(f"Sample size {n} exceeds reservoir capacity {self.capacity}.")
+
+        quota = allocate(self.seen, n, allocation)
+        rng = np.random.default_rng(self.seed + 1)
+        frames = []
+        for key in sorted(quota):
+            q = quota[key]
+            if q == 0:
+                continue
+            res = self.reservoirs[key]
+            # a uniform subset of a uniform reservoir is still uniform
+            pick = rng.permutation(len(res))[:q]
+            frames.append(pd.DataFrame([res[i] for i in sorted(pick)]))
+
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+
+def count_strata(path, strata, chunksize=CHUNK_SIZE) -> dict:
+    """Rows per stratum key, from a pass that reads only the strata columns."""
+    columns = sorted({"the_rank" if c == "rank_band" else c for c in strata})
+    sizes = Counter()
+    for chunk in iter_table(path, chunksize, columns=columns or None):
+        sizes.update(stratum_keys(add_rank_band(chunk), strata).tolist())
+    return dict(sizes)
+
+
+def stratified_sample(path, n, strata, allocation="proportional", seed=42,
+                      chunksize=CHUNK_SIZE, usecols=None):
+    """
+    Stream a CSV in chunks and return a seeded stratified sample of n rows (usecols: column names).
+    The strata are counted first, so each reservoir is capped at its quota and
+    at most n rows are held in memory however many strata there are.
+    """
+    quota = allocate(count_strata(path, strata, chunksize), n, allocation)
+    sampler = StratifiedReservoirSampler(strata, capacity=n, seed=seed, quota=quota)
+    for chunk in iter_table(path, chunksize, columns=usecols):
+        sampler.update(chunk)
+    return sampler.sample(n, allocation), sampler.stratum_sizes()
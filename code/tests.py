@@ -1,7 +1,39 @@
+import asyncio
+import os
+import tempfile
 import unittest
+import numpy as np
 import pandas as pd
+
+# UMAP runs (scalable clustering) and forked process pools (sharded filter) share this process;
+# numba's TBB threads do not survive a fork, so use its fork-safe workqueue layer here
+os.environ.setdefault("NUMBA_THREADING_LAYER", "workqueue")
+
 # Import the functions we want to test
 from garbage_filter import calculate_text_entropy, type_token_ratio, contains_boilerplate
+from garbage_filter import merge_moments, moments, run_filter_chain, sweep_thresholds
+from stratified_sampler import StratifiedReservoirSampler, allocate, stratified_sample
+from sketches import HyperLogLog, QuantileSketch, TopKSketch, hash_values
+from embedding_store import EmbeddingStore, EmbeddingWriter
+from clustering import (clustering_agreement, co_association, consensus_labels, scalable_clustering,
+                        stability_scores)
+from snapshot_store import SnapshotStore, content_hash
+from data_loader import SCHEMA, iter_table, load_table
+from voice_classifier import VoiceClassifier
+from voice_service import HTTPError, MicroBatcher, read_request
+from lexical_index import LexicalIndex
+from keyword_matrix import KeywordMatrix, relevance_mask
+from domain_rules import DomainTrie, domain_garbage_report, propose_candidates
+from phase3_selection import remove_blacklisted_domains
+from phase5_voice_assignment_multi import cluster_scope, detect_prefix, label_key
+from phase6_ai_positioning_index import index_from_counts
+from voice_cube import VoiceCube
+from preview_pipeline import bootstrap_index, cached_embedding_dir, nested_levels
+from cluster_reconciliation import build_cluster_map, reconcile
+from encoder_backends import cosine_agreement, load_encoder
+from institution_similarity import InstitutionIndex
+from voice_sensitivity import SensitivityEngine, flagged_clusters, scenario_choices, summarize
+from garbage_scorer import GarbageScorer, calibration_summary, cross_val_scores, parse_labels, rule_drift
 
 class TestGANISFilters(unittest.TestCase):
     
@@ -47,6 +79,792 @@ class TestGANISFilters(unittest.TestCase):
         self.assertTrue(contains_boilerplate(row_garbage), "Should flag 'cookie settings' or 'privacy policy'")
         self.assertFalse(contains_boilerplate(row_clean), "Should NOT flag legitimate research text")
 
+class TestShardedFilter(unittest.TestCase):
+
+    def test_merged_moments_match_global(self):
+        values = np.random.default_rng(1).normal(4.4, 0.5, 1001)
+        n, mean, std = merge_moments(moments(part) for part in np.array_split(values, 7))
+        self.assertEqual(n, 1001)
+        self.assertAlmostEqual(mean, values.mean())
+        self.assertAlmostEqual(std, values.std(ddof=1))
+
+    def test_sharded_matches_serial(self):
+        words = "Generative AI presents novel challenges for academic policy and institutional governance".split()
+        rich = " ".join(f"{w}{i}" for i in range(6) for w in words)
+        df = pd.DataFrame({
+            "content_text": [rich, "loading " * 80, None, rich + " cookie settings", rich] * 4,
+            "Title": ["News"] * 20,
+            "lang_detected": ["en", "en", "en", "en", "de"] * 4,
+            "lang_score": [0.95] * 20,
+        })
+        serial = run_filter_chain(df, workers=1)
+        sharded = run_filter_chain(df, workers=2, shard_size=3)
+        for key in ["passed_lang", "passed_lowinfo", "is_boilerplate", "char_entropy"]:
+            self.assertTrue(np.array_equal(serial[key], sharded[key], equal_nan=True), key)
+        self.assertEqual(serial["passed_lowinfo"].tolist()[:5], [True, False, False, True, False])
+        self.assertEqual(serial["is_boilerplate"].tolist()[:5], [False, False, False, True, False])
+
+
+class TestThresholdSweep(unittest.TestCase):
+
+    def test_sweep_matches_brute_force(self):
+        rng = np.random.default_rng(3)
+        words = rng.integers(0, 200, 500).astype(float)
+        entropy = rng.normal(4.0, 0.3, 500)
+        ttr = rng.uniform(0, 0.6, 500)
+        entropy[::50] = np.nan
+        boiler = rng.random(500) < 0.1
+        funnel = sweep_thresholds(words, entropy, ttr, boiler, [30, 50], [3.8, 4.0], [0.2, 0.25])
+        self.assertEqual(funnel["is_default"].sum(), 1)
+        for _, row in funnel.iterrows():
+            m_w = words >= row["min_words"]
+            m_e = m_w & (entropy >= row["min_char_entropy"])
+            m_t = m_e & (ttr >= row["min_ttr"])
+            self.assertEqual(row["after_min_words"], m_w.sum())
+            self.assertEqual(row["after_min_char_entropy"], m_e.sum())
+            self.assertEqual(row["after_min_ttr"], m_t.sum())
+            self.assertEqual(row["after_boilerplate"], (m_t & ~boiler).sum())
+
+
+class TestStratifiedSampler(unittest.TestCase):
+
+    def _corpus(self):
+        countries = ["United Kingdom"] * 900 + ["Germany"] * 90 + ["Malta"] * 10
+        # interleaved strata, so chunk boundaries cut through all of them
+        countries = np.random.default_rng(0).permutation(countries)
+        return pd.DataFrame({
+            "the_country": countries,
+            "the_rank": [10 if i % 2 else 1200 for i in range(1000)],
+            "doc": range(1000),
+        })
+
+    def _run(self, seed, chunksize=128):
+        df = self._corpus()
+        sampler = StratifiedReservoirSampler(["the_country"], capacity=60, seed=seed)
+        for start in range(0, len(df), chunksize):
+            sampler.update(df.iloc[start:start + chunksize])
+        return sampler
+
+    def test_allocation(self):
+        sizes = {"a": 900, "b": 90, "c": 10}
+        self.assertEqual(allocate(sizes, 100, "proportional"), {"a": 90, "b": 9, "c": 1})
+        # small strata hand their unused quota to the others
+        self.assertEqual(allocate(sizes, 60, "equal"), {"a": 25, "b": 25, "c": 10})
+
+    def test_seeded_and_bounded(self):
+        s1, s2 = self._run(seed=7), self._run(seed=7, chunksize=333)
+        self.assertTrue(all(len(r) <= 60 for r in s1.reservoirs.values()))
+        a = s1.sample(60, "equal")["doc"].tolist()
+        b = s2.sample(60, "equal")["doc"].tolist()
+        self.assertEqual(a, b, "Same seed must give the same sample regardless of chunking")
+        self.assertEqual((s1.sample(60, "equal")["the_country"] == "Malta").sum(), 10)
+
+    def test_quota_caps_each_reservoir(self):
+        df = self._corpus()
+        quota = allocate({("United Kingdom",): 900, ("Germany",): 90, ("Malta",): 10}, 60)
+        sampler = StratifiedReservoirSampler(["the_country"], capacity=60, seed=7, quota=quota)
+        sampler.update(df)
+        self.assertEqual(sum(len(r) for r in sampler.reservoirs.values()), 60)
+        self.assertEqual(len(sampler.sample(60)), 60)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            df.to_csv(f"{tmp}/c.csv", index=False)
+            sample, sizes = stratified_sample(f"{tmp}/c.csv", 60, ["the_country"], seed=7, chunksize=128)
+            self.assertEqual(sizes[("Malta",)], 10)
+            self.assertEqual(sample["the_country"].value_counts().to_dict(),
+                             {"United Kingdom": 54, "Germany": 5, "Malta": 1})
+
+    def test_rank_band_strata(self):
+        df = self._corpus()
+        sampler = StratifiedReservoirSampler(["rank_band"], capacity=20)
+        sampler.update(df)
+        self.assertEqual(set(sampler.stratum_sizes()), {("top50",), ("ge1000",)})
+
+
+class TestSketches(unittest.TestCase):
+
+    def test_hyperloglog_merge(self):
+        a, b = HyperLogLog(), HyperLogLog()
+        a.add([f"doc{i}" for i in range(0, 30000)])
+        b.add([f"doc{i}" for i in range(20000, 50000)])
+        est = a.merge(b).count()
+        self.assertLess(abs(est - 50000) / 50000, 0.03, f"HLL estimate too far off: {est}")
+
+    def test_hash_values_text(self):
+        values = np.array(["short", None, "x" * 40000, "short"], dtype=object)
+        h = hash_values(values)
+        self.assertEqual(h[0], h[3])
+        self.assertEqual(h[1], hash_values(np.array(["None"], dtype=object))[0])
+        self.assertEqual(len(set(h.tolist())), 3)
+
+    def test_topk_bounds(self):
+        values = ["cam.ac.uk"] * 500 + ["ed.ac.uk"] * 300 + [f"rare{i}.de" for i in range(2000)]
+        shard1, shard2 = TopKSketch(capacity=50), TopKSketch(capacity=50)
+        shard1.add(values[::2])
+        shard2.add(values[1::2])
+        top = shard1.merge(shard2).top(2)
+        self.assertEqual(top["item"].tolist(), ["cam.ac.uk", "ed.ac.uk"])
+        self.assertTrue((top["count"] <= [500, 300]).all() and (top["upper_bound"] >= [500, 300]).all())
+
+    def test_quantiles(self):
+        rng = np.random.default_rng(0)
+        values = rng.normal(4.5, 0.2, 100000)
+        sketch = QuantileSketch()
+        for chunk in np.array_split(values, 20):
+            sketch.add(chunk)
+        p05, p50, p95 = sketch.quantiles([0.05, 0.5, 0.95])
+        exact = np.quantile(values, [0.05, 0.5, 0.95])
+        self.assertTrue(np.allclose([p05, p50, p95], exact, atol=0.03))
+        self.assertLess(sum(len(lv) for lv in sketch.levels), 2000, "Sketch must stay small")
+
+
+class TestEmbeddingStore(unittest.TestCase):
+
+    def _embeddings(self):
+        rng = np.random.default_rng(5)
+        centers = rng.normal(size=(8, 64))
+        x = centers[rng.integers(0, 8, 600)] + rng.normal(scale=0.5, size=(600, 64))
+        return (x / np.linalg.norm(x, axis=1, keepdims=True)).astype(np.float32)
+
+    def test_int8_kernels(self):
+        x = self._embeddings()
+        store = EmbeddingStore.from_embeddings(x, "int8")
+        self.assertLess(store.nbytes, x.nbytes / 3)
+        self.assertLess(np.abs(store.decode() - x).max(), 0.01)
+        self.assertTrue(np.allclose(store.centroid([1, 2, 3]), x[1:4].mean(axis=0), atol=0.01))
+        idx, _ = store.search(x[:5], k=3)
+        self.assertEqual(idx[:, 0].tolist(), [0, 1, 2, 3, 4])
+
+    def test_pq_with_rerank(self):
+        x = self._embeddings()
+        store = EmbeddingStore.from_embeddings(x, "pq", pq_subspaces=8)
+        exact, _ = EmbeddingStore.from_embeddings(x, "float32").search(x[:20], k=5)
+        reranked, _ = store.search(x[:20], k=5, rerank=x, rerank_factor=10)
+        recall = np.mean([len(set(a) & set(b)) / 5 for a, b in zip(exact, reranked)])
+        self.assertGreater(recall, 0.9)
+
+    def test_streamed_writer(self):
+        x = self._embeddings()
+        with tempfile.TemporaryDirectory() as tmp:
+            writer = EmbeddingWriter(f"{tmp}/store", "float32", model_name="m")
+            for start in range(0, len(x), 250):
+                writer.append(x[start:start + 250], [f"d{i}" for i in range(start, min(start + 250, len(x)))])
+            store = writer.close()
+            self.assertIsInstance(store.codes, np.memmap)
+            np.testing.assert_array_equal(np.asarray(store.codes), x)
+            self.assertEqual(store.meta["model_name"], "m")
+            self.assertEqual(store.arrays["doc_ids"][-1], "d599")
+            idx, _ = store.search(x[:3], k=1)
+            self.assertEqual(idx[:, 0].tolist(), [0, 1, 2])
+
+    def test_save_replaces_a_previous_store(self):
+        x = self._embeddings()
+        with tempfile.TemporaryDirectory() as tmp:
+            EmbeddingStore.from_embeddings(x, "pq", pq_subspaces=8).save(tmp)
+            int8 = EmbeddingStore.from_embeddings(x, "int8")
+            int8.save(tmp)
+            loaded = EmbeddingStore.load(tmp)
+            self.assertNotIn("codebooks", loaded.arrays)
+            self.assertEqual(loaded.nbytes, int8.nbytes)
+
+
+class TestConsensusClustering(unittest.TestCase):
+
+    def test_consensus_and_stability(self):
+        # docs 0-5 always together, 6-11 together in 2 of 3 runs, 12 always noise
+        runs = [
+            np.array([0] * 6 + [1] * 6 + [-1]),
+            np.array([1] * 6 + [0] * 6 + [-1]),
+            np.array([0] * 6 + [1, 1, 1, 2, 2, 2] + [-1]),
+        ]
+        atoms, co = co_association(runs)
+        self.assertEqual(co.shape, (4, 4))  # one entry per distinct label signature, not per document
+        self.assertAlmostEqual(co[atoms[0], atoms[5]], 1.0)
+        self.assertAlmostEqual(co[atoms[6], atoms[11]], 2 / 3)
+        labels = consensus_labels(atoms, co, min_cluster_size=3)
+        self.assertEqual(len(set(labels[:6])), 1)
+        self.assertEqual(len(set(labels[6:12])), 1)
+        self.assertEqual(labels[12], -1)
+        stability = stability_scores(atoms, co, labels, runs)
+        self.assertAlmostEqual(stability[0], 1.0)
+        self.assertLess(stability[6], 1.0)
+        self.assertAlmostEqual(stability[12], 1.0)
+
+    def test_consensus_does_not_chain_clusters(self):
+        # A and B share a cluster in half the runs, B and C in the other half, A and C never
+        a, b, c = [0] * 5, [1] * 5, [2] * 5
+        runs = [np.array(a + a + c), np.array(a + a + c), np.array(a + b + b), np.array(a + b + b)]
+        atoms, co = co_association(runs)
+        labels = consensus_labels(atoms, co, min_cluster_size=3)
+        self.assertNotEqual(labels[0], labels[10])
+        self.assertEqual(len(set(labels[:5])), 1)
+        self.assertEqual(len(set(labels[10:])), 1)
+
+    def test_agreement_ignores_label_ids(self):
+        same = clustering_agreement([0, 0, 1, 1, -1], [5, 5, 2, 2, -1])
+        self.assertEqual((same["ari"], same["nmi"], same["noise_agreement"]), (1.0, 1.0, 1.0))
+        self.assertLess(clustering_agreement([0, 0, 1, 1], [0, 1, 0, 1])["ari"], 0.5)
+
+    def test_scalable_clustering_recovers_blobs(self):
+        # three large blobs and a 40-document one, in blob order like a store written file by file
+        rng = np.random.default_rng(0)
+        sizes = [200, 200, 200, 40]
+        x = np.vstack([np.eye(16)[i] * 6 + rng.normal(size=(n, 16)) for i, n in enumerate(sizes)])
+        truth = np.repeat(np.arange(4), sizes)
+        store = EmbeddingStore.from_embeddings(x.astype(np.float32), "float16")
+
+        emb_2d, labels, micro = scalable_clustering(store, n_micro=60, min_cluster_size=45, batch_size=128)
+        self.assertEqual(emb_2d.shape, (len(x), 2))
+        self.assertLess(micro.max(), 60)
+        big = truth < 3
+        self.assertEqual(clustering_agreement(truth[big], labels[big])["ari"], 1.0)
+        self.assertEqual(sorted(set(labels[big])), [0, 1, 2])
+        # HDBSCAN keeps the small blob; it holds fewer than min_cluster_size documents, so it is noise
+        self.assertTrue((labels[~big] == -1).all())
+
+
+class TestSnapshotStore(unittest.TestCase):
+
+    def _frame(self, voices):
+        return pd.DataFrame({
+            "Title": [f"Page {i}" for i in range(len(voices))],
+            "content_text": [f"Text {i}" for i in range(len(voices))],
+            "the_name": ["Uni A"] * len(voices),
+            "cluster_id": range(len(voices)),
+            "voice": voices,
+        })
+
+    def test_ingest_dedupe_and_trend(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SnapshotStore(tmp)
+            first = store.ingest("2025-10", {"hype_top50": self._frame(["Innovator", "Risk"])})
+            second = store.ingest("2025-11", {"hype_top50": self._frame(["Innovator", "Innovator", "Admin"])})
+            self.assertEqual((first["n_new_docs"], second["n_new_docs"]), (2, 1))
+            with self.assertRaises(ValueError):
+                store.ingest("2025-11", {"hype_top50": self._frame(["Risk"])})
+
+            trend = store.trend(dataset="hype_top50")
+            self.assertEqual(trend.index.tolist(), ["2025-10", "2025-11"])
+            self.assertAlmostEqual(trend.loc["2025-10", "AI_Optimism_Index"], 50 / 51)
+            self.assertAlmostEqual(trend.loc["2025-11", "Innovator"], 200 / 3)
+
+    def test_interrupted_ingest_is_repaired(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SnapshotStore(tmp)
+            store.ingest("2025-10", {"hype_top50": self._frame(["Innovator", "Risk"])})
+            store.ingest("2025-11", {"hype_top50": self._frame(["Innovator", "Innovator", "Admin"])})
+            # crash before the snapshot was registered: its rows are written, snapshots.csv is not
+            store.snapshots().iloc[:1].to_csv(store.snapshots_path, index=False)
+            self.assertEqual(store.trend().index.tolist(), ["2025-10"])
+
+            again = store.ingest("2025-11", {"hype_top50": self._frame(["Innovator", "Innovator", "Admin"])})
+            self.assertEqual(again["n_new_docs"], 1)
+            self.assertEqual(store.trend().loc["2025-11", "n_docs"], 3)
+            for bad in ["../x", "a/b", ".."]:
+                with self.assertRaises(ValueError):
+                    store.ingest(bad, {"hype_top50": self._frame(["Risk"])})
+
+
+class TestDataLoader(unittest.TestCase):
+
+    def test_lean_dtypes_and_projection(self):
+        df = pd.DataFrame({
+            "the_country": ["Germany", "Germany", "France"],
+            "the_rank": ["12", "201–250", "7"],
+            "the_no_of_students": [1000, 2000, 3000],
+            "the_overall": [55.5, 60.1, 70.2],
+            "content_text": ["a b c", None, "d e"],
+            "lang_score": [0.99, 0.5, 0.9],
+        })
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f"{tmp}/t.csv"
+            df.to_csv(path, index=False)
+            out = load_table(path)
+            self.assertEqual(str(out["the_country"].dtype), "category")
+            self.assertEqual(str(out["the_rank"].dtype), "category")  # non-numeric ranks survive
+            self.assertEqual(out["the_no_of_students"].dtype, np.int16)
+            self.assertEqual(out["the_overall"].dtype, np.float32)
+            self.assertEqual(SCHEMA["lang_score"], "float")
+            self.assertTrue(out["content_text"].isna().iloc[1])
+
+            # same CSV back out
+            out.to_csv(f"{tmp}/back.csv", index=False)
+            pd.testing.assert_frame_equal(pd.read_csv(f"{tmp}/back.csv"), pd.read_csv(path))
+
+            proj = load_table(path, columns=["content_text", "missing_col"])
+            self.assertEqual(list(proj.columns), ["content_text"])
+
+            out.to_parquet(f"{tmp}/t.parquet", index=False)
+            chunks = list(iter_table(f"{tmp}/t.parquet", chunksize=2, columns=["the_overall", "the_country"]))
+            self.assertEqual([len(c) for c in chunks], [2, 1])
+            self.assertEqual(list(chunks[0].columns), ["the_country", "the_overall"])
+            self.assertEqual(chunks[1]["the_overall"].dtype, np.float32)
+            # projected columns the file does not have are ignored, as for CSV
+            proj = load_table(f"{tmp}/t.parquet", columns=["the_country", "topic_label", "voice"])
+            self.assertEqual(list(proj.columns), ["the_country"])
+
+
+class TestVoiceService(unittest.TestCase):
+
+    class _Encoder:
+        """Deterministic stand-in for the SentenceTransformer: one blob per topic word."""
+        def encode(self, texts, **kwargs):
+            rng = np.random.default_rng(0)
+            centers = {"law": np.eye(8)[0] * 10, "campus": np.eye(8)[1] * 10}
+            return np.array([centers["law" if "law" in t else "campus"] + rng.normal(size=8) for t in texts])
+
+    def test_classifier_maps_clusters_to_voices(self):
+        import hdbscan
+        from sklearn.decomposition import PCA
+
+        enc = self._Encoder()
+        train = enc.encode(["law"] * 40 + ["campus"] * 40)
+        reducer = PCA(n_components=2).fit(train)
+        clusterer = hdbscan.HDBSCAN(min_cluster_size=10, prediction_data=True).fit(reducer.transform(train))
+        law_cluster = int(clusterer.labels_[0])
+
+        clf = VoiceClassifier(enc, reducer, clusterer, prefix="control_ge1000")
+        out = clf.classify([{"Title": "law", "content_text": "degree"}, {"text": "campus life"}])
+        self.assertEqual(out[0]["cluster_id"], law_cluster)
+        self.assertEqual(out[0]["voice"], "Admin")
+        self.assertTrue(0 <= out[1]["confidence"] <= 1)
+
+        with self.assertRaises(ValueError):
+            VoiceClassifier(enc, reducer, clusterer, prefix="joint")  # placeholder with no voices yet
+        mapped = VoiceClassifier(enc, reducer, clusterer, prefix="joint",
+                                 clusters={law_cluster: {"voice": "Risk", "status": "matched"}})
+        self.assertEqual(mapped.classify([{"text": "law"}])[0]["voice"], "Risk")
+
+    def test_micro_batcher_coalesces_requests(self):
+        calls = []
+
+        def classify(docs):
+            calls.append(len(docs))
+            return [d["i"] * 2 for d in docs]
+
+        async def run():
+            batcher = MicroBatcher(classify, max_batch_size=8, max_wait_ms=50)
+            batcher.start()
+            results = await asyncio.gather(*[batcher.submit([{"i": i}]) for i in range(10)])
+            await batcher.stop()
+            return results
+
+        results = asyncio.run(run())
+        self.assertEqual([r[0] for r in results], [i * 2 for i in range(10)])
+        self.assertEqual(calls, [8, 2])
+
+    def test_bad_content_length_is_a_400(self):
+        async def read(raw):
+            reader = asyncio.StreamReader()
+            reader.feed_data(raw)
+            reader.feed_eof()
+            return await read_request(reader)
+
+        for length in (b"abc", b"-5"):
+            with self.assertRaises(HTTPError) as ctx:
+                asyncio.run(read(b"POST /classify HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n{}"))
+            self.assertEqual(ctx.exception.status, 400)
+        method, path, _, body = asyncio.run(read(b"POST /classify?x=1 HTTP/1.1\r\nContent-Length: 2\r\n\r\n{}"))
+        self.assertEqual((method, path, body), ("POST", "/classify", b"{}"))
+
+
+class TestLexicalIndex(unittest.TestCase):
+
+    def _docs(self, texts, country, voice):
+        return pd.DataFrame({
+            "Title": [t.split()[0] for t in texts],
+            "content_text": texts,
+            "the_country": country,
+            "the_rank": 20,
+            "voice": voice,
+        })
+
+    def test_bm25_filters_and_incremental_add(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            index = LexicalIndex(tmp)
+            index.add(self._docs(["law degree admissions", "campus parking rules"], "Germany", "Admin"))
+            self.assertEqual(index.add(self._docs(["law degree admissions"], "Germany", "Admin")), 0)
+            index.add(self._docs(["generative ai law policy law", "ai ethics board"], "France", "Risk"))
+
+            reopened = LexicalIndex(tmp)
+            self.assertEqual((reopened.n_docs, len(reopened.segments)), (4, 2))
+            hits = reopened.search("law", k=5)
+            self.assertEqual(len(hits), 2)
+            self.assertIn("**law**", hits.iloc[0]["snippet"])
+
+            hits = reopened.search("law ai", filters={"voice": ["Risk"], "rank_band": ["top50"]})
+            self.assertEqual(set(hits["the_country"]), {"France"})
+            self.assertTrue(reopened.search("law", filters={"the_country": ["Spain"]}).empty)
+
+            before = reopened.search("law ai")["score"].tolist()
+            reopened.compact()
+            self.assertEqual(len(reopened.segments), 1)
+            self.assertEqual(LexicalIndex(tmp).search("law ai")["score"].tolist(), before)
+            # page text lives outside docs.csv and is only read for the returned hits
+            self.assertNotIn("content_text", reopened.segments[0].docs().columns)
+            self.assertIn("**policy**", LexicalIndex(tmp).search("policy").iloc[0]["snippet"])
+
+    def test_add_refreshes_filter_fields_of_known_documents(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            index = LexicalIndex(tmp)
+            index.add(self._docs(["law degree admissions", "campus parking rules"], "Germany", "Admin"))
+            # re-clustered: same pages, new voice
+            self.assertEqual(index.add(self._docs(["law degree admissions"], "Germany", "Risk")), 0)
+            reopened = LexicalIndex(tmp)
+            self.assertEqual(len(reopened.search("law", filters={"voice": ["Risk"]})), 1)
+            self.assertTrue(reopened.search("law", filters={"voice": ["Admin"]}).empty)
+            self.assertEqual(len(reopened.search("campus", filters={"voice": ["Admin"]})), 1)
+
+
+class TestKeywordMatrix(unittest.TestCase):
+
+    def _frame(self):
+        return pd.DataFrame({
+            "keywords_list": ["ChatGPT;ethics", "chatgpt;policy;ethics", None],
+            "top_unigrams": ["ai:5;law:2", "ai:1", "campus:3"],
+            "top_bigrams": ["generative ai:2", None, "car park:1"],
+            "keyword_presence": ["yes", "yes", "no"],
+            "voice": ["Risk", "Admin", "Admin"],
+            "cluster_id": [0, 0, 1],
+        })
+
+    def test_matrix_analytics_and_persistence(self):
+        km = KeywordMatrix.empty().add(self._frame(), dataset="toy")
+        self.assertEqual(km.matrix.shape[0], 3)
+        self.assertEqual(km.matrix[0, km.vocab.index("uni:ai")], 5)
+        self.assertEqual(km.matrix[0, km.vocab.index("bi:generative ai")], 2)
+
+        share = km.share_by("voice")
+        self.assertEqual(share.loc["chatgpt", "Risk"], 100)
+        self.assertEqual(share.loc["chatgpt", "Admin"], 50)
+        self.assertAlmostEqual(km.lift("cluster_id", min_docs=1).loc["ethics", "0"], 1.5)
+        pairs = km.cooccurrence(min_count=2)
+        self.assertEqual(set(pairs.iloc[0][["term_a", "term_b"]]), {"chatgpt", "ethics"})
+
+        with tempfile.TemporaryDirectory() as tmp:
+            km.save(tmp)
+            again = KeywordMatrix.load(tmp).add(self._frame().iloc[:1])
+            self.assertEqual(again.vocab[:len(km.vocab)], km.vocab)
+            self.assertEqual(again.matrix.shape, (4, len(km.vocab)))
+
+    def test_relevance_mask(self):
+        self.assertEqual(relevance_mask(self._frame(), min_keywords=3).tolist(), [False, True, False])
+        self.assertEqual(relevance_mask(self._frame()).tolist(), [True, True, False])
+
+
+class TestDomainRules(unittest.TestCase):
+
+    def test_trie_rules(self):
+        trie = DomainTrie(["example.ac.uk", "*.tees.ac.uk", "news.*.ac.uk", "=uel.ac.uk"])
+        self.assertEqual(trie.match("news.example.ac.uk"), "example.ac.uk")
+        self.assertEqual(trie.match("www.example.ac.uk"), "example.ac.uk")
+        self.assertIsNone(trie.match("notexample.ac.uk"))
+        self.assertEqual(trie.match("libguides.tees.ac.uk"), "*.tees.ac.uk")
+        self.assertIsNone(trie.match("tees.ac.uk"))
+        self.assertEqual(trie.match("news.chester.ac.uk"), "news.*.ac.uk")
+        self.assertEqual(trie.match("uel.ac.uk"), "=uel.ac.uk")
+        self.assertIsNone(trie.match("libguides.uel.ac.uk"))
+
+    def test_blacklist_on_url_host_and_garbage_report(self):
+        df = pd.DataFrame({
+            "url": ["https://libguides.tees.ac.uk/a", "https://www.tees.ac.uk/b", None,
+                    "http://blog.chester.ac.uk/x?y=1", "https://blog.chester.ac.uk/z"],
+            "the_domain": ["tees.ac.uk", "tees.ac.uk", "spam.ac.uk", "chester.ac.uk", "chester.ac.uk"],
+            "word_count": [500, 500, 500, 10, 500],
+            "char_entropy": [4.5, 4.5, 4.5, 4.5, 3.0],
+            "ttr": [0.5] * 5,
+            "is_boilerplate": [True, False, False, False, False],
+        })
+        kept = remove_blacklisted_domains(df, ["*.tees.ac.uk", "spam.ac.uk"])
+        self.assertEqual(kept.index.tolist(), [1, 3, 4])
+
+        report = domain_garbage_report(df)
+        self.assertEqual(report.loc["blog.chester.ac.uk", "garbage_rate"], 1.0)
+        self.assertEqual(report.loc["tees.ac.uk", "garbage_rate"], 0.0)
+        cand = propose_candidates(report, min_docs=2, min_rate=0.8, trie=DomainTrie(["*.tees.ac.uk"]))
+        self.assertEqual(cand.index.tolist(), ["blog.chester.ac.uk"])
+
+
+class TestJointVoiceMaps(unittest.TestCase):
+
+    def test_joint_files_share_one_map(self):
+        self.assertEqual(label_key(detect_prefix("data/semantic/joint_hype_top50_semantic.csv")), "joint")
+        self.assertEqual(label_key(detect_prefix("data/semantic/control_ge1000_semantic.csv")), "control_ge1000")
+
+    def test_per_subset_files_never_use_the_shared_map(self):
+        per_subset = pd.DataFrame({"cluster_id": [0, 1], "cluster_scope": "per_subset"})
+        self.assertEqual(cluster_scope(per_subset), "per_subset")
+        self.assertEqual(cluster_scope(per_subset.drop(columns="cluster_scope")), "shared")
+        self.assertEqual(label_key("joint_hype_top50", cluster_scope(per_subset)), "joint_hype_top50")
+
+
+class TestVoiceCube(unittest.TestCase):
+
+    def setUp(self):
+        self.hype = pd.DataFrame({
+            "the_country": ["UK", "UK", "Germany", "UK"],
+            "the_rank": [10, 1200, 30, 40],
+            "the_name": ["A", "B", "C", "A"],
+            "cluster_id": [0, 1, 0, -1],
+            "voice": ["Innovator", "Risk", "Admin", None],
+        })
+        self.control = pd.DataFrame({"the_country": ["UK"], "the_rank": [5], "the_name": ["A"],
+                                     "cluster_id": [0], "voice": ["Admin"]})
+
+    def test_rollup_matches_document_level_index(self):
+        cube = VoiceCube.build({"hype": self.hype, "control": self.control})
+        out = cube.rollup("dataset")
+        expected = index_from_counts(self.hype["voice"].fillna("Noise").value_counts().to_frame().T)
+        self.assertEqual(out.loc["hype", "n_docs"], 4)
+        self.assertAlmostEqual(out.loc["hype", "AI_Optimism_Index"], expected["AI_Optimism_Index"].iloc[0])
+
+        uk_top = cube.rollup(["dataset", "the_name"], where={"the_country": "UK", "rank_band": "top50"})
+        self.assertEqual(uk_top.loc[("hype", "A"), "n_docs"], 2)
+        self.assertEqual(uk_top.loc[("control", "A"), "Admin"], 100.0)
+
+    def test_save_load_roundtrip(self):
+        cube = VoiceCube.build({"hype": self.hype})
+        with tempfile.TemporaryDirectory() as tmp:
+            cube.save(f"{tmp}/cube.npz")
+            loaded = VoiceCube.load(f"{tmp}/cube.npz")
+        pd.testing.assert_frame_equal(loaded.rollup("cluster_id"), cube.rollup("cluster_id"))
+        with self.assertRaises(ValueError):
+            VoiceCube.build({})
+
+
+class TestPreviewPipeline(unittest.TestCase):
+
+    def test_nested_levels_are_stratified(self):
+        df = pd.DataFrame({"the_country": ["UK"] * 80 + ["Germany"] * 20})
+        levels = nested_levels(df, ["the_country"], [0.1, 0.5, 1.0], seed=1)
+        first = df[levels == 0]["the_country"].value_counts()
+        self.assertEqual(first.to_dict(), {"UK": 8, "Germany": 2})
+        self.assertEqual(int((levels <= 1).sum()), 50)
+        self.assertTrue((levels < 3).all())
+        # a different seed picks other rows, with the same quotas
+        other = nested_levels(df, ["the_country"], [0.1, 0.5, 1.0], seed=2)
+        self.assertEqual(int((other == 0).sum()), 10)
+        self.assertFalse(np.array_equal(levels, other))
+
+    def test_bootstrap_interval_brackets_estimate(self):
+        voices = pd.Series(["Innovator"] * 30 + ["Admin"] * 50 + ["Risk"] * 20)
+        strata = pd.Series(["a"] * 50 + ["b"] * 50)
+        est = bootstrap_index(voices, strata, n_boot=500)
+        self.assertEqual(est["n_docs"], 100)
+        self.assertLessEqual(est["ci_low"], est["AI_Optimism_Index"])
+        self.assertGreaterEqual(est["ci_high"], est["AI_Optimism_Index"])
+        self.assertAlmostEqual(est["AI_Optimism_Index"], 30 / (20 + 50 + 1))
+
+
+class TestClusterReconciliation(unittest.TestCase):
+
+    def test_renumbered_and_split_clusters(self):
+        hashes = np.array([f"doc{i}" for i in range(60)])
+        prev = np.repeat([0, 1, 2], 20)
+        # new run: 0 <-> 1 swapped, old 2 split into 2 and 3
+        new = np.concatenate([np.full(20, 1), np.full(20, 0), np.full(12, 2), np.full(8, 3)])
+        result = reconcile(prev, new, hashes, hashes).set_index("cluster_id")
+        self.assertEqual(result.loc[0, "previous_id"], 1)
+        self.assertEqual(result.loc[1, "previous_id"], 0)
+        self.assertEqual(result.loc[2, "status"], "matched")
+        self.assertEqual(result.loc[3, "status"], "split")
+        self.assertEqual(result.loc[3, "previous_id"], 2)
+
+        labels = pd.DataFrame({"topic_label": ["A", "B", "C"], "voice": ["Risk", "Admin", "Innovator"]},
+                              index=pd.Index([0, 1, 2], name="cluster_id"))
+        cmap = build_cluster_map(result.reset_index(), labels, "hype_top50", "old.csv", "new.csv")
+        self.assertEqual(cmap["clusters"]["0"]["voice"], "Admin")
+        self.assertEqual(cmap["review"], [3])
+
+    def test_centroids_match_without_shared_documents(self):
+        rng = np.random.default_rng(0)
+        centers = np.eye(3, 8) * 5
+        prev = np.repeat([0, 1, 2], 10)
+        new = np.repeat([2, 0, 1], 10)
+        emb_prev = centers[prev] + rng.normal(0, 0.1, (30, 8))
+        emb_new = centers[[1, 2, 0]][new] + rng.normal(0, 0.1, (30, 8))  # new id 2 ~ old 0, ...
+        result = reconcile(prev, new, [f"a{i}" for i in range(30)], [f"b{i}" for i in range(30)],
+                           emb_prev, emb_new).set_index("cluster_id")
+        self.assertEqual(result["previous_id"].to_dict(), {0: 1, 1: 2, 2: 0})
+
+
+class TestEncoderBackends(unittest.TestCase):
+
+    def test_cosine_agreement(self):
+        x = np.random.default_rng(0).normal(size=(50, 16)).astype(np.float32)
+        np.testing.assert_allclose(cosine_agreement(x, 3 * x), 1.0, rtol=1e-5)
+        np.testing.assert_allclose(cosine_agreement(x, -x), -1.0, rtol=1e-5)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            load_encoder("all-MiniLM-L6-v2", "tensorrt")
+
+
+class TestVoiceSensitivity(unittest.TestCase):
+
+    def _sizes(self):
+        idx = pd.Index([0, 1, 2], name="cluster_id")
+        return {
+            "hype": pd.DataFrame({"size": [60, 30, 10], "voice": ["Marketing", "Admin", "Risk"]}, index=idx),
+            "control": pd.DataFrame({"size": [50, 40, 10], "voice": ["Admin", "Innovator", "Risk"]}, index=idx),
+        }
+
+    def test_exhaustive_scenarios_match_direct_counts(self):
+        sizes = self._sizes()
+        flagged = flagged_clusters(sizes, {"hype": {0: ["Admin"]}, "control": {1: ["Admin", "Noise"]}})
+        self.assertEqual(flagged["options"].tolist(), [["Marketing", "Admin"], ["Innovator", "Admin", "Noise"]])
+        engine = SensitivityEngine(sizes, flagged)
+        choices, exhaustive = scenario_choices(engine.n_options)
+        self.assertTrue(exhaustive)
+        self.assertEqual(len(choices), 6)
+        optimism, governance = engine.evaluate(choices, batch=4)
+
+        # baseline: hype = 60 / (30 + 10 + 1), control = 40 / (50 + 10 + 1)
+        self.assertAlmostEqual(optimism[0, 0], 60 / 41)
+        self.assertAlmostEqual(optimism[0, 1], 40 / 61)
+        # hype cluster 0 -> Admin, control cluster 1 -> Noise
+        s = np.flatnonzero((choices == [1, 2]).all(axis=1))[0]
+        self.assertAlmostEqual(optimism[s, 0], 0.0)
+        self.assertAlmostEqual(governance[s, 1], 50.0)
+
+        summary = summarize(optimism, governance, engine.datasets)
+        self.assertEqual(summary.loc["hype", "rank_baseline"], 1)
+        self.assertAlmostEqual(summary.loc["hype", "index_max"], 60 / 41)
+        self.assertLess(summary.loc["hype", "rank_stability"], 1.0)
+
+    def test_sampled_scenarios_keep_baseline(self):
+        choices, exhaustive = scenario_choices([3] * 20, max_scenarios=1000, n_samples=500)
+        self.assertFalse(exhaustive)
+        self.assertEqual(choices.shape, (501, 20))
+        self.assertFalse(choices[0].any())
+        self.assertLess(choices.max(), 3)
+        # 6 ** 25 overflows int64; still sampled, not enumerated
+        choices, exhaustive = scenario_choices([6] * 25, n_samples=100)
+        self.assertEqual((exhaustive, choices.shape), (False, (101, 25)))
+
+
+class TestInstitutionSimilarity(unittest.TestCase):
+
+    def _index(self):
+        rng = np.random.default_rng(1)
+        names = [f"Uni {i}" for i in range(12)]
+        frames, stores, emb = {}, {}, {}
+        for name, n in [("hype", 150), ("control", 90)]:
+            df = pd.DataFrame({
+                "the_name": rng.choice(names, n),
+                "the_country": "UK",
+                "voice": rng.choice(["Admin", "Risk", "Marketing"], n),
+            })
+            df["the_rank"] = df["the_name"].str[4:].astype(int) * 100 + 10
+            df.loc[df["the_name"] == "Uni 0", "the_country"] = "Ireland"
+            df.loc[:4, "the_name"] = None  # rows without an institution are ignored
+            df["file_name"] = [f"{name}_{i}.html" for i in range(n)]
+            emb[name] = rng.normal(size=(n, 16)).astype(np.float32)
+            frames[name], stores[name] = df, EmbeddingStore.from_embeddings(emb[name], "float32")
+            stores[name].arrays["doc_ids"] = df["file_name"].to_numpy(dtype=str)
+        self._stores = stores
+        return InstitutionIndex.build(frames, stores, min_docs=1), frames, emb
+
+    def test_grouped_centroids_and_shares(self):
+        index, frames, emb = self._index()
+        df = pd.concat(frames.values(), ignore_index=True)
+        x = np.vstack(list(emb.values()))
+        rows = (df["the_name"] == "Uni 3").to_numpy()
+        mean = x[rows].mean(axis=0)
+        np.testing.assert_allclose(index.centroids[index.find("Uni 3")], mean / np.linalg.norm(mean), atol=1e-5)
+        self.assertEqual(index.institutions.loc["Uni 3", "n_docs"], rows.sum())
+        self.assertAlmostEqual(index.institutions.loc["Uni 3", "share_Risk"],
+                               (df.loc[rows, "voice"] == "Risk").mean())
+        self.assertEqual(index.institutions.loc["Uni 0", "the_country"], "Ireland")
+
+    def test_blocked_top_k_and_filtered_lookup(self):
+        index, _, _ = self._index()
+        idx, scores = index.top_k(k=4, block_size=5)
+        sims = index.centroids @ index.centroids.T
+        np.fill_diagonal(sims, -np.inf)
+        np.testing.assert_array_equal(idx, np.argsort(-sims, axis=1, kind="stable")[:, :4])
+        np.testing.assert_allclose(scores[:, 0], sims.max(axis=1), rtol=1e-5)
+
+        out = index.similar("Uni 5", k=3, countries=["UK"], max_rank=800)
+        self.assertEqual(len(out), 3)
+        self.assertNotIn("Uni 5", out.index)
+        self.assertNotIn("Uni 0", out.index)
+        self.assertTrue((out["the_rank"] <= 800).all())
+        with self.assertRaises(ValueError):
+            index.find("uni 1")  # Uni 1, Uni 10, Uni 11
+
+        nodes, edges = index.graph(k=2)
+        self.assertEqual(len(nodes), len(index))
+        self.assertTrue((edges["Source"] != edges["Target"]).all())
+
+    def test_store_rows_must_match_the_file(self):
+        _, frames, _ = self._index()
+        frames["hype"] = frames["hype"].iloc[::-1].reset_index(drop=True)  # same length, other row order
+        with self.assertRaises(ValueError):
+            InstitutionIndex.build(frames, self._stores, min_docs=1)
+
+
+class TestGarbageScorer(unittest.TestCase):
+
+    def _labelled(self, n=120):
+        rng = np.random.default_rng(3)
+        garbage = rng.random(n) < 0.4
+        words = "students research policy teaching assessment learning innovation campus".split()
+        texts = [" ".join(["cookie"] * 30) if g else " ".join(rng.choice(words, 80)) for g in garbage]
+        df = pd.DataFrame({
+            "content_text": texts,
+            "keywords_list": ["" if g else "generative ai; chatgpt" for g in garbage],
+            "top_unigrams": ["cookie:30" if g else "students:5; research:4" for g in garbage],
+            "keyword_presence": np.where(garbage, "no", "yes"),
+        })
+        return df, garbage.astype(int)
+
+    def test_fit_score_roundtrip_and_calibration(self):
+        df, labels = self._labelled()
+        scorer = GarbageScorer.fit(df, labels, min_term_docs=2)
+        self.assertIn("uni:cookie", scorer.vocab)
+        np.testing.assert_array_equal(scorer.is_garbage(df), labels.astype(bool))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            scorer.save(f"{tmp}/scorer.joblib")
+            np.testing.assert_allclose(GarbageScorer.load(f"{tmp}/scorer.joblib").score(df), scorer.score(df))
+
+        oof = cross_val_scores(df, labels, folds=3, min_term_docs=2)
+        summary = calibration_summary(oof, labels)
+        self.assertGreater(summary["auc"], 0.95)
+        self.assertLess(summary["brier"], 0.1)
+        with self.assertRaises(ValueError):
+            GarbageScorer.fit(df, np.zeros(len(df)))
+
+    def test_cached_embeddings_are_read_without_creating_the_cache(self):
+        df, labels = self._labelled(60)
+        hashes = content_hash(df).to_numpy()
+        with tempfile.TemporaryDirectory() as tmp:
+            emb_dir = cached_embedding_dir(tmp, "m")
+            os.makedirs(emb_dir)
+            np.savez(f"{emb_dir}/part.npz", hashes=hashes[:40].astype(str),
+                     vectors=np.eye(2, dtype=np.float32)[labels[:40]])
+            scorer = GarbageScorer.fit(df, labels, min_term_docs=2, embedding_cache=tmp, model_name="m")
+            self.assertIn("emb_1", scorer.feature_names)
+            self.assertNotIn("emb_2", scorer.feature_names)
+            oof = cross_val_scores(df, labels, folds=3, min_term_docs=2, embedding_cache=tmp, model_name="m")
+            self.assertEqual(len(oof), len(df))
+
+            missing = f"{tmp}/elsewhere"
+            scorer.embedding_cache = missing
+            self.assertEqual(len(scorer.score(df)), len(df))  # no cached vectors: zeros, same width
+            self.assertFalse(os.path.exists(missing))
+
+    def test_labels_and_rule_drift(self):
+        parsed = parse_labels(pd.Series(["1", "no", " Yes", "", None, "0.0", "maybe"]))
+        np.testing.assert_array_equal(parsed.to_numpy(), [1, 0, 1, np.nan, np.nan, 0, np.nan])
+
+        drift = rule_drift(np.array([1, 1, 0, 0, 1], bool), np.array([1, 0, 0, 0, 0], bool))
+        self.assertEqual((drift["learned_only"], drift["rules_only"]), (2, 0))
+        self.assertAlmostEqual(drift["agreement"], 0.6)
+        self.assertAlmostEqual(rule_drift(np.ones(4, bool), np.ones(4, bool))["kappa"], 1.0)
+
+
 if __name__ == '__main__':
     print("Running GANIS Smoke Tests...")
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,121 @@
+import time
+
+import numpy as np
+
+from phase5_voice_assignment_multi import CLUSTER_TOPIC_LABELS, CLUSTER_VOICES
+
+# Classify new documents with the models fitted by phase5_semantic_pipeline.py --save_models:
+#   text -> SentenceTransformer embedding -> UMAP.transform -> HDBSCAN approximate_predict
+#        -> cluster_id -> topic_label / voice (same maps as phase5_voice_assignment_multi.py,
+#           or a cluster map JSON from cluster_reconciliation.py)
+# The confidence is HDBSCAN's membership strength of the predicted cluster (0 for noise).
+
+
+def save_model_bundle(path, reducer, clusterer, model_name: str, prefix: str, backend: str = "torch"):
+    """Persist the fitted reducer / clusterer plus what is needed to reuse them."""
+    import joblib
+
+    joblib.dump({
+        "reducer": reducer,
+        "clusterer": clusterer,
+        "model_name": model_name,
+        "backend": backend,
+        "prefix": prefix,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }, path)
+
+
+def load_model_bundle(path) -> dict:
+    import joblib
+
+    return joblib.load(path)
+
+
+def document_text(doc: dict) -> str:
+    """Same text as phase 5 embeds: Title + content_text (or a plain 'text' field)."""
+    if doc.get("text"):
+        return str(doc["text"]).strip()
+    title = str(doc.get("Title") or doc.get("title") or "")
+    body = str(doc.get("content_text") or "")
+    return (title.strip() + "\n\n" + body.strip()).strip()
+
+
+def label_maps(prefix: str, clusters: dict = None) -> tuple:
+    """
+    (topic_map, voice_map) for a prefix, or from a loaded cluster map when given.
+    Raises like phase5_voice_assignment_multi.py when there is nothing to label with.
+    """
+    if clusters is not None:
+        from cluster_reconciliation import cluster_map_labels
+
+        topic_map, voice_map = cluster_map_labels(clusters)
+        if not voice_map:
+            raise ValueError("The cluster map has no clusters with a voice yet; label them first.")
+        return topic_map, voice_map
+    if prefix not in CLUSTER_VOICES:
+        raise ValueError(f"Unknown prefix '{prefix}'. Add it to CLUSTER_VOICES and CLUSTER_TOPIC_LABELS.")
+    if not CLUSTER_VOICES[prefix]:
+        raise ValueError(
+            f"No voices defined for '{prefix}' yet. Fill CLUSTER_VOICES['{prefix}'] in "
+            f"phase5_voice_assignment_multi.py or pass a cluster map (--cluster_map)."
+        )
+    return CLUSTER_TOPIC_LABELS.get(prefix, {}), CLUSTER_VOICES[prefix]
+
+
+class VoiceClassifier:
+    """Keeps the encoder, reducer, clusterer and cluster -> voice map in memory."""
+
+    def __init__(self, encoder, reducer, clusterer, prefix: str, batch_size: int = 32, model_name: str = None,
+                 clusters: dict = None):
+        self.topic_map, self.voice_map = label_maps(prefix, clusters)
+        self.encoder = encoder
+        self.reducer = reducer
+        self.clusterer = clusterer
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.model_name = model_name
+
+    @classmethod
+    def from_bundle(cls, path, prefix: str = None, batch_size: int = 32,
+                    cluster_map: str = None) -> "VoiceClassifier":
+        """cluster_map: optional cluster map JSON (cluster_reconciliation.py), used instead of the dicts."""
+        from encoder_backends import load_encoder
+
+        bundle = load_model_bundle(path)
+        prefix = prefix or bundle["prefix"]
+        clusters = None
+        if cluster_map:
+            from cluster_reconciliation import load_cluster_map
+
+            clusters = load_cluster_map(cluster_map)
+        label_maps(prefix, clusters)  # fail before loading the encoder
+        encoder = load_encoder(bundle["model_name"], bundle.get("backend", "torch"))
+        return cls(encoder, bundle["reducer"], bundle["clusterer"], prefix, batch_size,
+                   model_name=bundle["model_name"], clusters=clusters)
+
+    def predict_embeddings(self, embeddings):
+        """(cluster_ids, confidences) for already-encoded documents."""
+        import hdbscan
+
+        points = self.reducer.transform(np.asarray(embeddings, dtype=np.float32))
+        labels, strengths = hdbscan.approximate_predict(self.clusterer, points)
+        return np.asarray(labels), np.asarray(strengths)
+
+    def classify(self, documents) -> list:
+        """documents: list of dicts (Title / content_text or text). One result dict per document."""
+        if not documents:
+            return []
+        texts = [document_text(d) for d in documents]
+        embeddings = self.encoder.encode(texts, batch_size=self.batch_size, show_progress_bar=False)
+        labels, strengths = self.predict_embeddings(embeddings)
+
+        results = []
+        for cid, conf in zip(labels.tolist(), strengths.tolist()):
+            results.append({
+                "cluster_id": int(cid),
+                "topic_label": self.topic_map.get(cid),
+                # unmapped clusters are "Noise", as in phase5_voice_assignment_multi.py
+                "voice": self.voice_map.get(cid, "Noise"),
+                "confidence": round(float(conf), 4),
+            })
+        return results
@@ -0,0 +1,189 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_loader import load_table
+from phase6_ai_positioning_index import DATASETS, index_from_counts
+from snapshot_store import dataset_name
+from stratified_sampler import add_rank_band
+
+# Voice counts pre-aggregated once over every combination of the dimensions
+# below, stored column-wise in one .npz:
+#
+#   dim_<name>      int32 code per cell       dict_<name>   the distinct values (strings)
+#   counts          cells x voices (int32)    voices        voice names (incl. Noise)
+#
+# Any slice / roll-up is then a mask + group-sum over the cells; voice shares,
+# Governance_Coherence and AI_Optimism_Index come from index_from_counts, so
+# they match phase6_ai_positioning_index.py exactly.
+
+CUBE_PATH = "data/semantic/voice_cube.npz"
+DIMENSIONS = ["dataset", "the_country", "rank_band", "Labels", "the_name", "cluster_id"]
+MISSING = "<NA>"
+
+
+class VoiceCube:
+    def __init__(self, codes: dict, dictionaries: dict, counts: np.ndarray, voices: list):
+        self.codes = codes                  # dim -> int32 array (one per cell)
+        self.dictionaries = dictionaries    # dim -> array of values
+        self.counts = counts
+        self.voices = list(voices)
+
+    def __len__(self):
+        return len(self.counts)
+
+    @property
+    def n_docs(self) -> int:
+        return int(self.counts.sum())
+
+    # ---------- building ----------
+    @classmethod
+    def build(cls, frames: dict) -> "VoiceCube":
+        """frames: dataset name -> *_with_voice DataFrame (needs voice; the_rank gives rank_band)."""
+        if not frames:
+            raise ValueError("No datasets to build the voice cube from.")
+        parts = []
+        for name, df in frames.items():
+            if "voice" not in df.columns:
+                raise ValueError(f"'voice' column not found for dataset {name}")
+            df = add_rank_band(df)
+            part = pd.DataFrame({"dataset": name, "voice": df["voice"].astype(object).fillna("Noise").to_numpy()})
+            for dim in DIMENSIONS[1:]:
+                values = df[dim].astype(object) if dim in df.columns else pd.Series(None, index=df.index)
+                part[dim] = values.where(values.notna(), MISSING).astype(str).to_numpy()
+            parts.append(part)
+        docs = pd.concat(parts, ignore_index=True)
+
+        cells = docs.groupby(DIMENSIONS + ["voice"], sort=False).size().unstack("voice", fill_value=0)
+        keys = cells.index.to_frame(index=False)
+        codes, dictionaries = {}, {}
+        for dim in DIMENSIONS:
+            dim_codes, uniques = pd.factorize(keys[dim], sort=True)
+            codes[dim] = dim_codes.astype(np.int32)
+            dictionaries[dim] = np.asarray(uniques, dtype=str)
+        return cls(codes, dictionaries, cells.to_numpy(dtype=np.int32), list(cells.columns))
+
+    # ---------- persistence ----------
+    def save(self, path: str = CUBE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        arrays = {"counts": self.counts, "voices": np.asarray(self.voices, dtype=str)}
+        for dim in DIMENSIONS:
+            arrays[f"dim_{dim}"] = self.codes[dim]
+            arrays[f"dict_{dim}"] = self.dictionaries[dim]
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str = CUBE_PATH) -> "VoiceCube":
+        with np.load(path) as z:
+            codes = {dim: z[f"dim_{dim}"] for dim in DIMENSIONS}
+            dictionaries = {dim: z[f"dict_{dim}"] for dim in DIMENSIONS}
+            return cls(codes, dictionaries, z["counts"], z["voices"].tolist())
+
+    # ---------- slicing ----------
+    def _mask(self, where: dict) -> np.ndarray:
+        mask = np.ones(len(self), dtype=bool)
+        for dim, values in (where or {}).items():
+            if dim not in self.codes:
+                raise ValueError(f"Unknown dimension '{dim}'. Use one of {DIMENSIONS}.")
+            values = [values] if np.isscalar(values) else values
+            wanted = np.flatnonzero(np.isin(self.dictionaries[dim], [str(v) for v in values]))
+            mask &= np.isin(self.codes[dim], wanted)
+        return mask
+
+    def counts_by(self, by=(), where: dict = None) -> pd.DataFrame:
+        """Voice counts per combination of the `by` dimensions, over the cells matching `where`."""
+        by = [by] if isinstance(by, str) else list(by)
+        for dim in by:
+            if dim not in self.codes:
+                raise ValueError(f"Unknown dimension '{dim}'. Use one of {DIMENSIONS}.")
+        mask = self._mask(where)
+        counts = self.counts[mask]
+        if not by:
+            return pd.DataFrame([counts.sum(axis=0)], index=["all"], columns=self.voices)
+
+        shape = tuple(len(self.dictionaries[dim]) for dim in by)
+        flat = np.ravel_multi_index([self.codes[dim][mask] for dim in by], shape)
+        groups, inverse = np.unique(flat, return_inverse=True)
+        summed = np.zeros((len(groups), counts.shape[1]), dtype=np.int64)
+        np.add.at(summed, inverse, counts)
+
+        labels = np.unravel_index(groups, shape)
+        index = pd.MultiIndex.from_arrays(
+            [self.dictionaries[dim][codes] for dim, codes in zip(by, labels)], names=by
+        ) if len(by) > 1 else pd.Index(self.dictionaries[by[0]][labels[0]], name=by[0])
+        return pd.DataFrame(summed, index=index, columns=self.voices)
+
+    def rollup(self, by=(), where: dict = None, min_docs: int = 1) -> pd.DataFrame:
+        """
+        n_docs, voice shares (%), Governance_Coherence and AI_Optimism_Index per
+        combination of `by`, e.g. rollup(["the_country", "rank_band"], {"dataset": "hype_top50"}).
+        """
+        counts = self.counts_by(by, where)
+        out = index_from_counts(counts)
+        out.insert(0, "n_docs", counts.sum(axis=1))
+        return out[out["n_docs"] >= min_docs]
+
+
+def parse_where(items) -> dict:
+    """["the_country=UK", "rank_band=top50,ge1000"] -> {"the_country": ["UK"], ...}"""
+    where = {}
+    for item in items or []:
+        dim, sep, values = item.partition("=")
+        if not sep:
+            raise ValueError(f"Expected dim=value[,value...], got '{item}'.")
+        where[dim.strip()] = values.split(",")
+    return where
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Voice OLAP cube: build once, roll up any slice from the counts.")
+    parser.add_argument("--cube", default=CUBE_PATH, help=f"Cube file (default: {CUBE_PATH})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="Aggregate the *_with_voice.csv files into the cube")
+    p_build.add_argument("--files", nargs="*", default=None,
+                         help="*_with_voice.csv files (default: the four phase 6 datasets)")
+
+    p_query = sub.add_parser("query", help="Voice shares + indices per slice")
+    p_query.add_argument("--by", nargs="*", default=[], help=f"Dimensions to group by, from {DIMENSIONS}")
+    p_query.add_argument("--where", nargs="*", default=[], help="Filters, e.g. the_country=UK rank_band=top50,ge1000")
+    p_query.add_argument("--min_docs", type=int, default=1, help="Hide slices with fewer documents (default: 1)")
+    p_query.add_argument("--output", default=None, help="Optional CSV for the result")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        paths = {dataset_name(p): p for p in args.files} if args.files else DATASETS
+        frames = {}
+        for name, path in paths.items():
+            if not os.path.exists(path):
+                print(f"WARNING: File {path} not found. Skipping.")
+                continue
+            frames[name] = load_table(path, columns=DIMENSIONS + ["the_rank", "voice"])
+            print(f"[INFO] {name}: {len(frames[name])} rows")
+        if not frames:
+            print("ERROR: No datasets found.")
+            return
+        cube = VoiceCube.build(frames)
+        cube.save(args.cube)
+        print(f"✅ Saved voice cube ({len(cube)} cells, {cube.n_docs} docs, "
+              f"{os.path.getsize(args.cube) / 1e3:.1f} KB) to {args.cube}")
+        return
+
+    cube = VoiceCube.load(args.cube)
+    start = time.perf_counter()
+    out = cube.rollup(args.by, parse_where(args.where), args.min_docs)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"[INFO] {len(out)} slice(s) from {len(cube)} cells in {elapsed:.1f} ms")
+    with pd.option_context("display.max_columns", None, "display.width", 200, "display.max_rows", 200):
+        print(out.sort_values("AI_Optimism_Index", ascending=False).round(2))
+    if args.output:
+        out.to_csv(args.output)
+        print(f"[INFO] Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
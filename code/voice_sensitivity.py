@@ -0,0 +1,250 @@
+import argparse
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from cluster_reconciliation import cluster_labels_of
+from data_loader import load_table
+from phase5_voice_assignment_multi import AMBIGUOUS_VOICES, SCOPE_COLUMN
+from phase6_ai_positioning_index import ALL_VOICES, DATASETS, index_from_counts
+from snapshot_store import dataset_name
+
+# How much do the hand-picked cluster -> voice choices move the index?
+#
+# Every dataset is reduced to its cluster sizes. Voice counts are the baseline
+# counts of the unflagged clusters plus, per scenario, the size of each flagged
+# (AMBIGUOUS_VOICES) cluster added to the voice chosen for it. A scenario is one
+# choice per flagged cluster across all datasets at once, so the ranking of the
+# datasets can be compared scenario by scenario. All combinations are evaluated
+# when there are at most --max_scenarios of them, else a random sample (plus the
+# baseline); each batch is one (scenarios x datasets x voices) count array fed to
+# index_from_counts.
+
+OUTPUT = "data/semantic/voice_sensitivity.csv"
+CLUSTER_OUTPUT = "data/semantic/voice_sensitivity_clusters.csv"
+MAX_SCENARIOS = 1_000_000   # enumerate every combination up to this many
+N_SAMPLES = 200_000         # random scenarios beyond that
+BATCH = 50_000              # scenarios per count array
+VOICES = ALL_VOICES + ["Noise"]
+
+
+def cluster_sizes(df: pd.DataFrame, prefix: str) -> pd.DataFrame:
+    """size and baseline voice per cluster_id (voice from the file, else the phase 5 dicts; unmapped = Noise)."""
+    labels = cluster_labels_of(df, prefix)
+    sizes = df["cluster_id"].fillna(-1).astype(int).value_counts().rename("size")
+    out = labels[["voice"]].join(sizes, how="inner")
+    out["voice"] = out["voice"].fillna("Noise")
+    return out[["size", "voice"]]
+
+
+def flagged_clusters(sizes: dict, ambiguous: dict = None, all_voices: bool = False) -> pd.DataFrame:
+    """
+    One row per flagged cluster present in the data: dataset, cluster_id, size and
+    options (baseline voice first, then the alternatives).
+    """
+    ambiguous = AMBIGUOUS_VOICES if ambiguous is None else ambiguous
+    rows = []
+    for name, table in sizes.items():
+        for cid, alternatives in ambiguous.get(name, {}).items():
+            if cid not in table.index:
+                print(f"[WARN] {name}: flagged cluster {cid} not in the data. Skipping.")
+                continue
+            base = table.loc[cid, "voice"]
+            options = [base] + [v for v in (VOICES if all_voices else alternatives) if v != base]
+            rows.append({"dataset": name, "cluster_id": cid, "size": int(table.loc[cid, "size"]),
+                         "options": list(dict.fromkeys(options))})
+    return pd.DataFrame(rows, columns=["dataset", "cluster_id", "size", "options"])
+
+
+def scenario_choices(n_options, max_scenarios: int = MAX_SCENARIOS, n_samples: int = N_SAMPLES,
+                     seed: int = 42):
+    """
+    (scenarios x flagged clusters) option indices, row 0 = baseline (all 0).
+    Returns (choices, exhaustive).
+    """
+    n_options = np.asarray(n_options, dtype=np.int64)
+    total = math.prod(map(int, n_options))  # Python int: 6 ** 25 overflows int64
+    if total <= max_scenarios:
+        choices = np.stack(np.unravel_index(np.arange(total), n_options), axis=1) if len(n_options) \
+            else np.zeros((1, 0), dtype=np.int64)
+        return choices, True
+    rng = np.random.default_rng(seed)
+    sample = (rng.random((n_samples, len(n_options))) * n_options).astype(np.int64)
+    return np.vstack([np.zeros((1, len(n_options)), dtype=np.int64), sample]), False
+
+
+class SensitivityEngine:
+    """Baseline voice counts per dataset + the flagged clusters that can move between voices."""
+
+    def __init__(self, sizes: dict, flagged: pd.DataFrame):
+        self.datasets = list(sizes)
+        self.voices = list(dict.fromkeys(VOICES + [v for t in sizes.values() for v in t["voice"]]))
+        self.flagged = flagged.reset_index(drop=True)
+        voice_idx = {v: i for i, v in enumerate(self.voices)}
+
+        # counts of everything that is not flagged
+        self.base = np.zeros((len(self.datasets), len(self.voices)), dtype=np.int64)
+        flagged_keys = set(zip(self.flagged["dataset"], self.flagged["cluster_id"]))
+        for d, name in enumerate(self.datasets):
+            for cid, row in sizes[name].iterrows():
+                if (name, cid) not in flagged_keys:
+                    self.base[d, voice_idx[row["voice"]]] += row["size"]
+
+        self.dataset_of = np.array([self.datasets.index(n) for n in self.flagged["dataset"]], dtype=np.int64)
+        self.size_of = self.flagged["size"].to_numpy(dtype=np.int64)
+        self.option_voices = [np.array([voice_idx[v] for v in opts]) for opts in self.flagged["options"]]
+
+    @property
+    def n_options(self):
+        return [len(o) for o in self.option_voices]
+
+    def counts(self, choices: np.ndarray) -> np.ndarray:
+        """(scenarios x datasets x voices) voice counts for the given option choices."""
+        out = np.repeat(self.base[None, :, :], len(choices), axis=0)
+        rows = np.arange(len(choices))
+        for k in range(len(self.option_voices)):
+            out[rows, self.dataset_of[k], self.option_voices[k][choices[:, k]]] += self.size_of[k]
+        return out
+
+    def evaluate(self, choices: np.ndarray, batch: int = BATCH):
+        """(AI_Optimism_Index, Governance_Coherence), each scenarios x datasets."""
+        optimism, governance = [], []
+        for start in range(0, len(choices), batch):
+            counts = self.counts(choices[start:start + batch])
+            s, d, v = counts.shape
+            idx = index_from_counts(pd.DataFrame(counts.reshape(s * d, v), columns=self.voices))
+            optimism.append(idx["AI_Optimism_Index"].to_numpy().reshape(s, d))
+            governance.append(idx["Governance_Coherence"].to_numpy().reshape(s, d))
+        return np.vstack(optimism), np.vstack(governance)
+
+    def one_at_a_time(self) -> pd.DataFrame:
+        """Index range of each flagged cluster's own dataset when only that cluster changes voice."""
+        rows = []
+        for k, row in self.flagged.iterrows():
+            choices = np.zeros((len(self.option_voices[k]), len(self.flagged)), dtype=np.int64)
+            choices[:, k] = np.arange(len(self.option_voices[k]))
+            optimism, _ = self.evaluate(choices)
+            values = optimism[:, self.dataset_of[k]]
+            rows.append({
+                "dataset": row["dataset"], "cluster_id": row["cluster_id"], "size": row["size"],
+                "baseline_voice": row["options"][0],
+                **{f"index_if_{v}": round(float(x), 4) for v, x in zip(row["options"], values)},
+                "index_range": round(float(values.max() - values.min()), 4),
+            })
+        if not rows:
+            return pd.DataFrame()
+        out = pd.DataFrame(rows)
+        out = out[[c for c in out.columns if c != "index_range"] + ["index_range"]]
+        return out.sort_values("index_range", ascending=False)
+
+
+def optimism_ranks(optimism: np.ndarray) -> np.ndarray:
+    """Rank of each dataset per scenario (1 = most optimistic; ties share the better rank)."""
+    return (optimism[:, None, :] > optimism[:, :, None]).sum(axis=2) + 1
+
+
+def summarize(optimism: np.ndarray, governance: np.ndarray, datasets: list) -> pd.DataFrame:
+    """Baseline (scenario 0), range and rank stability per dataset."""
+    ranks = optimism_ranks(optimism)
+    out = pd.DataFrame(index=pd.Index(datasets, name="dataset"))
+    out["index_baseline"] = optimism[0]
+    out["index_min"] = optimism.min(axis=0)
+    out["index_p5"] = np.percentile(optimism, 5, axis=0)
+    out["index_p95"] = np.percentile(optimism, 95, axis=0)
+    out["index_max"] = optimism.max(axis=0)
+    out["governance_baseline"] = governance[0]
+    out["governance_min"] = governance.min(axis=0)
+    out["governance_max"] = governance.max(axis=0)
+    out["rank_baseline"] = ranks[0]
+    out["rank_stability"] = (ranks == ranks[0]).mean(axis=0)
+    out["rank_min"] = ranks.min(axis=0)
+    out["rank_max"] = ranks.max(axis=0)
+    return out
+
+
+def pairwise_order(optimism: np.ndarray, datasets: list) -> pd.DataFrame:
+    """Share of scenarios in which the row dataset is more optimistic than the column dataset."""
+    share = (optimism[:, :, None] > optimism[:, None, :]).mean(axis=0)
+    return pd.DataFrame(share, index=datasets, columns=datasets)
+
+
+def parse_flags(items) -> dict:
+    """["hype_top50:2=Marketing,Noise"] -> {"hype_top50": {2: ["Marketing", "Noise"]}}"""
+    flags = {}
+    for item in items or []:
+        key, sep, voices = item.partition("=")
+        name, colon, cid = key.partition(":")
+        if not (sep and colon):
+            raise ValueError(f"Expected dataset:cluster_id=Voice[,Voice...], got '{item}'.")
+        flags.setdefault(name.strip(), {})[int(cid)] = [v.strip() for v in voices.split(",") if v.strip()]
+    return flags
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sensitivity of the AI Optimism Index to ambiguous cluster voices.")
+    parser.add_argument("--files", nargs="*", default=None,
+                        help="*_with_voice.csv (or *_semantic.csv) files (default: the four phase 6 datasets)")
+    parser.add_argument("--flag", nargs="*", default=[],
+                        help="Extra / overriding ambiguous clusters, e.g. hype_top50:2=Marketing,Noise")
+    parser.add_argument("--all_voices", action="store_true",
+                        help="Let every flagged cluster take any voice, not just its listed alternatives")
+    parser.add_argument("--max_scenarios", type=int, default=MAX_SCENARIOS,
+                        help=f"Enumerate all combinations up to this many (default: {MAX_SCENARIOS})")
+    parser.add_argument("--samples", type=int, default=N_SAMPLES,
+                        help=f"Random scenarios when there are more (default: {N_SAMPLES})")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=OUTPUT, help=f"Default: {OUTPUT}")
+    args = parser.parse_args()
+
+    paths = {dataset_name(p): p for p in args.files} if args.files else DATASETS
+    sizes = {}
+    for name, path in paths.items():
+        if not os.path.exists(path):
+            semantic = path.replace("_with_voice.csv", "_semantic.csv")
+            if not os.path.exists(semantic):
+                print(f"WARNING: File {path} not found. Skipping.")
+                continue
+            path = semantic
+        df = load_table(path, columns=["cluster_id", "voice", SCOPE_COLUMN])
+        sizes[name] = cluster_sizes(df, name)
+        print(f"[INFO] {name}: {len(df)} docs in {len(sizes[name])} clusters from {path}")
+    if not sizes:
+        print("ERROR: No datasets found.")
+        return
+
+    ambiguous = {name: dict(AMBIGUOUS_VOICES.get(name, {})) for name in sizes}
+    for name, clusters in parse_flags(args.flag).items():
+        ambiguous.setdefault(name, {}).update(clusters)
+    flagged = flagged_clusters(sizes, ambiguous, args.all_voices)
+    engine = SensitivityEngine(sizes, flagged)
+
+    choices, exhaustive = scenario_choices(engine.n_options, args.max_scenarios, args.samples, args.seed)
+    how = "all combinations" if exhaustive else f"random sample of {math.prod(map(int, engine.n_options)):,} combinations"
+    print(f"[INFO] {len(flagged)} flagged cluster(s) -> {len(choices):,} scenarios ({how})")
+    optimism, governance = engine.evaluate(choices)
+
+    summary = summarize(optimism, governance, engine.datasets)
+    order = pairwise_order(optimism, engine.datasets)
+    per_cluster = engine.one_at_a_time()
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    summary.to_csv(args.output)
+    cluster_output = os.path.join(os.path.dirname(args.output), os.path.basename(CLUSTER_OUTPUT))
+    per_cluster.to_csv(cluster_output, index=False)
+
+    ranks = optimism_ranks(optimism)
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(summary.round(3))
+        print("\nShare of scenarios where the row dataset is more optimistic than the column dataset:")
+        print(order.round(3))
+        if len(per_cluster):
+            print("\nMost influential flagged clusters (index range when only that cluster changes):")
+            print(per_cluster.head(10).to_string(index=False))
+    print(f"\n[INFO] Full ranking unchanged in {(ranks == ranks[0]).all(axis=1).mean():.1%} of scenarios.")
+    print(f"✅ Saved sensitivity summary to {args.output} and per-cluster effects to {cluster_output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+
+import numpy as np
+
+from voice_classifier import VoiceClassifier
+
+# Local voice-classification service (stdlib asyncio HTTP, no web framework).
+#
+#   POST /classify   {"documents": [{"Title": ..., "content_text": ...}, ...]}
+#                    or a single document object; returns one result per document
+#   GET  /metrics    latency percentiles, throughput, batch sizes, queue depth
+#   GET  /health     {"status": "ok"}
+#
+# Concurrent requests are coalesced into micro-batches: the batcher waits at most
+# MAX_WAIT_MS after the first queued document, or until MAX_BATCH_SIZE documents,
+# then encodes + classifies them in one call (in a worker thread, so the event
+# loop keeps accepting requests meanwhile).
+
+HOST = "127.0.0.1"
+PORT = 8765
+MAX_BATCH_SIZE = 64
+MAX_WAIT_MS = 10
+LATENCY_WINDOW = 10000  # most recent requests kept for the percentiles
+MAX_BODY_BYTES = 50 * 1024 * 1024
+
+
+class MicroBatcher:
+    def __init__(self, classify, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.classify = classify
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+        self.batch_sizes = deque(maxlen=LATENCY_WINDOW)
+        self.batch_seconds = deque(maxlen=LATENCY_WINDOW)
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def submit(self, documents) -> list:
+        loop = asyncio.get_running_loop()
+        futures = []
+        for doc in documents:
+            fut = loop.create_future()
+            self.queue.put_nowait((doc, fut))
+            futures.append(fut)
+        return await asyncio.gather(*futures)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            docs = [doc for doc, _ in batch]
+            start = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(None, self.classify, docs)
+            except Exception as exc:  # report the failure to every waiting request
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(exc)
+                continue
+            self.batch_sizes.append(len(batch))
+            self.batch_seconds.append(time.perf_counter() - start)
+            for (_, fut), result in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(result)
+
+
+class Metrics:
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.documents = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, n_docs: int, seconds: float):
+        self.requests += 1
+        self.documents += n_docs
+        self.latencies.append(seconds)
+
+    def snapshot(self, batcher: MicroBatcher) -> dict:
+        uptime = time.time() - self.started
+        lat = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        sizes = np.array(batcher.batch_sizes) if batcher.batch_sizes else np.zeros(1)
+        return {
+            "uptime_s": round(uptime, 1),
+            "requests": self.requests,
+            "documents": self.documents,
+            "errors": self.errors,
+            "docs_per_s": round(self.documents / max(uptime, 1e-9), 2),
+            "latency_ms": {f"p{q}": round(float(np.percentile(lat, q)), 2) for q in (50, 90, 95, 99)},
+            "batches": len(batcher.batch_sizes),
+            "mean_batch_size": round(float(sizes.mean()), 2),
+            "mean_batch_ms": round(float(np.mean(batcher.batch_seconds or [0])) * 1000, 2),
+            "queue_depth": batcher.queue.qsize(),
+        }
+
+
+# ---------- minimal HTTP/1.1 ----------
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+async def read_request(reader):
+    """(method, path, headers, body) or None when the client closed the connection."""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    parts = request_line.decode("latin-1").split(" ", 2)
+    if len(parts) != 3:
+        raise HTTPError(400, "malformed request line")
+    method, path, _ = parts
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPError(400, "malformed content-length") from None
+    if length < 0:
+        raise HTTPError(400, "negative content-length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "payload too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, path.split("?", 1)[0], headers, body
+
+
+def write_response(writer, status: int, payload, keep_alive: bool):
+    body = json.dumps(payload).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+
+
+class VoiceService:
+    def __init__(self, classifier: VoiceClassifier, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.classifier = classifier
+        self.batcher = MicroBatcher(classifier.classify, max_batch_size, max_wait_ms)
+        self.metrics = Metrics()
+
+    async def route(self, method, path, body):
+        if path == "/health":
+            return 200, {"status": "ok", "prefix": self.classifier.prefix}
+        if path == "/metrics":
+            return 200, self.metrics.snapshot(self.batcher)
+        if path != "/classify":
+            return 404, {"error": f"unknown path {path}"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+
+        try:
+            payload = json.loads(body or b"{}")
+        except json.JSONDecodeError as exc:
+            return 400, {"error": f"invalid JSON: {exc}"}
+        single = isinstance(payload, dict) and "documents" not in payload
+        documents = [payload] if single else payload.get("documents") if isinstance(payload, dict) else payload
+        if not isinstance(documents, list) or not all(isinstance(d, dict) for d in documents):
+            return 400, {"error": "expected a document object or {'documents': [...]}"}
+
+        start = time.perf_counter()
+        results = await self.batcher.submit(documents)
+        self.metrics.record(len(documents), time.perf_counter() - start)
+        return 200, results[0] if single else {"results": results}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HTTPError as exc:
+                    write_response(writer, exc.status, {"error": str(exc)}, keep_alive=False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "keep-alive").lower() != "close"
+                try:
+                    status, payload = await self.route(method, path, body)
+                except Exception as exc:
+                    self.metrics.errors += 1
+                    status, payload = 500, {"error": str(exc)}
+                write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=HOST, port=PORT):
+        # the first single-document and multi-document calls JIT-compile different UMAP
+        # transform paths; pay for both before accepting traffic
+        loop = asyncio.get_running_loop()
+        for n in (1, self.batcher.max_batch_size):
+            await loop.run_in_executor(None, self.classifier.classify, [{"text": f"warm-up {i}"} for i in range(n)])
+        self.batcher.start()
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"[INFO] Voice service for '{self.classifier.prefix}' listening on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.batcher.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local voice-classification HTTP service with micro-batching.")
+    parser.add_argument("--models", required=True,
+                        help="Model bundle from phase5_semantic_pipeline.py --save_models "
+                             "(e.g. data/semantic/hype_top50_models.joblib)")
+    parser.add_argument("--prefix", default=None,
+                        help="Cluster -> voice map to use (default: the prefix stored in the bundle)")
+    parser.add_argument("--cluster_map", default=None,
+                        help="Cluster map JSON from cluster_reconciliation.py; used instead of the prefix's dicts")
+    parser.add_argument("--host", default=HOST, help=f"Bind address (default: {HOST})")
+    parser.add_argument("--port", type=int, default=PORT, help=f"Port (default: {PORT})")
+    parser.add_argument("--max_batch_size", type=int, default=MAX_BATCH_SIZE,
+                        help=f"Documents per micro-batch (default: {MAX_BATCH_SIZE})")
+    parser.add_argument("--max_wait_ms", type=float, default=MAX_WAIT_MS,
+                        help=f"Max wait to fill a micro-batch (default: {MAX_WAIT_MS})")
+    args = parser.parse_args()
+
+    print(f"[INFO] Loading models from {args.models} ...")
+    classifier = VoiceClassifier.from_bundle(args.models, prefix=args.prefix, batch_size=args.max_batch_size,
+                                             cluster_map=args.cluster_map)
+    service = VoiceService(classifier, args.max_batch_size, args.max_wait_ms)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\n[INFO] Stopped.")
+
+
+if __name__ == "__main__":
+    main()
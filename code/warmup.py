@@ -0,0 +1,47 @@
+import argparse
+import time
+
+import numpy as np
+
+from runtime_cache import CACHE_DIR, configure_caches
+
+# Prime the persistent caches so later runs start fast:
+#   1) compile (and cache) the UMAP / pynndescent / HDBSCAN numba kernels on a tiny random input
+#   2) download (and cache) the SentenceTransformer model, plus its ONNX export for --backend onnx*
+
+WARMUP_ROWS = 300
+WARMUP_DIM = 384
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm up the numba JIT and model caches used by phase 5.")
+    parser.add_argument("--cache_dir", default=CACHE_DIR, help=f"Cache directory (default: {CACHE_DIR})")
+    parser.add_argument("--model_name", default=MODEL_NAME, help=f"SentenceTransformer model (default: {MODEL_NAME})")
+    parser.add_argument("--backend", default="torch", help="Encoder backend to prepare: torch, onnx or onnx-int8 "
+                                                           "(the onnx ones are exported here; default: torch)")
+    parser.add_argument("--skip_model", action="store_true", help="Only warm up the numba kernels")
+    args = parser.parse_args()
+
+    for var, path in configure_caches(args.cache_dir).items():
+        print(f"[INFO] {var}={path}")
+
+    start = time.perf_counter()
+    from clustering import reduce_and_cluster
+
+    x = np.random.default_rng(0).normal(size=(WARMUP_ROWS, WARMUP_DIM)).astype(np.float32)
+    reduce_and_cluster(x)
+    print(f"[INFO] UMAP + HDBSCAN kernels ready in {time.perf_counter() - start:.1f}s")
+
+    if not args.skip_model:
+        start = time.perf_counter()
+        from encoder_backends import load_encoder
+
+        load_encoder(args.model_name, args.backend).encode(["warm-up"])
+        print(f"[INFO] Model {args.model_name} ({args.backend}) ready in {time.perf_counter() - start:.1f}s")
+
+    print("✅ Caches warmed up.")
+
+
+if __name__ == "__main__":
+    main()